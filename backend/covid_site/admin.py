@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from covid_site.models import (Age, County, GeneralData, Incidence,
+from covid_site.etl.jobs import requeue_jobs
+from covid_site.models import (Age, County, GeneralData, ImportJob, Incidence,
                                IncidenceCategory, PopulationByAge, Region,
                                Reinforcement, Sample, StatisticsByAgeAndSex,
                                StatisticsByRegion, StatisticsBySex, Symptoms,
@@ -82,6 +83,49 @@ class GeneralDataAdmin(admin.ModelAdmin):
     list_filter = list_display
 
 
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'file_name',
+        'status',
+        'chunks_done',
+        'rows_done',
+        'tables',
+        'duration',
+        'started_date',
+        'finished_date',
+        'inserted_date',
+    )
+
+    list_filter = (
+        'status',
+        'file_name',
+        'inserted_date',
+    )
+
+    readonly_fields = tuple(f.name for f in ImportJob._meta.fields)
+
+    actions = ('requeue',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Rows per table')
+    def tables(self, obj):
+        return ', '.join(
+            f'{table_name}: {stats.get("created", 0)} created, '
+            f'{stats.get("updated", 0)} updated, '
+            f'{stats.get("seconds", 0):.0f}s'
+            for table_name, stats in obj.table_stats.items()
+        )
+
+    @admin.action(description='Requeue selected jobs')
+    def requeue(self, request, queryset):
+        requeued = requeue_jobs(queryset)
+        self.message_user(request, f'{requeued} jobs requeued.')
+
+
 @admin.register(Incidence)
 class IncidenceAdmin(admin.ModelAdmin):
     list_display = (
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CovidSiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'covid_site'
+
+    def ready(self):
+        # Connects the receivers that invalidate the cached responses
+        from covid_site import cache  # noqa: F401
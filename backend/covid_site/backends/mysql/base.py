@@ -0,0 +1,143 @@
+from covid_site.pool import ConnectionPool, get_pool
+from django.db.backends.mysql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''The MySQL backend, with health checks of the persistent connections and
+        an optional pool of connections shared by the threads of each process.
+        It reads two additional settings of the database:
+
+        CONN_HEALTH_CHECKS (bool): whether a persistent connection is checked
+            before its first query of each request, being replaced if it's
+            broken, e.g. after the server closed it for being idle.
+        POOL (dict | None): the "SIZE", "MAX_OVERFLOW" and "TIMEOUT" of the
+            pool, see ConnectionPool, where a size of 0 disables it. With the
+            pool, the connections go back to it at the end of each request,
+            and CONN_MAX_AGE is the age after which the pool replaces them,
+            where 0 keeps them, as None does.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.connection_pool = None
+        self.connection_reused = False
+
+    def get_pool(self, conn_params: dict) -> ConnectionPool | None:
+        '''Returns the pool of the database, if it's enabled.'''
+
+        pool_settings = self.settings_dict.get('POOL') or dict()
+        if not pool_settings.get('SIZE'):
+            return None
+
+        def create_pool() -> ConnectionPool:
+            return ConnectionPool(
+                connect=lambda: connect(conn_params),
+                is_usable=is_usable,
+                size=pool_settings['SIZE'],
+                max_overflow=pool_settings.get('MAX_OVERFLOW', 0),
+                timeout=pool_settings.get('TIMEOUT', 30),
+                max_age=self.settings_dict['CONN_MAX_AGE'],
+                health_checks=self.settings_dict.get('CONN_HEALTH_CHECKS', False),
+            )
+
+        return get_pool(self.alias, conn_params, create_pool)
+
+    def get_new_connection(self, conn_params: dict):
+        self.connection_pool = self.get_pool(conn_params)
+        if self.connection_pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection, created = self.connection_pool.checkout()
+        self.connection_reused = not created
+
+        return connection
+
+    def connect(self):
+        try:
+            super().connect()
+        except Exception:
+            # The connection checked out of the pool is given back, instead of
+            # being left to the next request
+            if self.connection_pool is not None and self.connection is not None:
+                self.connection_pool.checkin(self.connection, reusable=False)
+                self.connection = None
+            raise
+
+        # A new connection, or one checked out of the pool, needs no check
+        self.health_check_done = True
+
+    def init_connection_state(self):
+        # The session of a reused connection was set when it was opened
+        if self.connection_reused:
+            self.connection_reused = False
+            return
+
+        super().init_connection_state()
+
+    def _close(self):
+        if self.connection_pool is None or self.connection is None:
+            return super()._close()
+
+        # The connections closed in the middle of a transaction are discarded,
+        # instead of handing over the transaction to the next request
+        self.connection_pool.checkin(
+            self.connection,
+            reusable=self.autocommit and not self.in_atomic_block and not self.errors_occurred,
+        )
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def close_if_health_check_failed(self) -> None:
+        '''Closes the persistent connection if it's broken, before its first
+            query of the request, so that a new one is opened instead of
+            failing the request.'''
+
+        if (
+            self.connection is None
+            or self.health_check_done
+            or self.in_atomic_block
+            or not self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+        ):
+            return
+
+        if not self.is_usable():
+            self.close()
+
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Called at the start and at the end of each request
+        self.health_check_done = False
+
+        # A thread only keeps a pooled connection during a request
+        if self.connection is not None and self.connection_pool is not None and not self.in_atomic_block:
+            self.close()
+            return
+
+        super().close_if_unusable_or_obsolete()
+
+
+def connect(conn_params: dict):
+    '''Opens a new raw connection.'''
+
+    connection = base.Database.connect(**conn_params)
+
+    # The same workaround of the MySQL backend of Django for mysqlclient < 2.1
+    if connection.encoders.get(bytes) is bytes:
+        connection.encoders.pop(bytes)
+
+    return connection
+
+
+def is_usable(connection) -> bool:
+    '''Returns whether a raw connection still works.'''
+
+    try:
+        connection.ping()
+    except base.Database.Error:
+        return False
+    else:
+        return True
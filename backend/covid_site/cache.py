@@ -0,0 +1,290 @@
+import functools
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+from covid_site.models import (Age, County, DataVersion, GeneralData,
+                               ImportJob, Incidence, IncidenceCategory,
+                               PopulationByAge, Region, Reinforcement, Sample,
+                               StatisticsByAgeAndSex, StatisticsByRegion,
+                               StatisticsBySex, Symptoms, SymptomsType,
+                               TotalDeaths, TransmissionRisk, Vaccines)
+from covid_site.signals import table_updated
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+# The Django owned tables, which hold no data of the API
+UNVERSIONED_MODELS = (DataVersion, ImportJob)
+
+# The data tables edited by django admin, whose saves and deletes bump their
+# versions. The ETL processes send table_updated once per table instead.
+ADMIN_MODELS = (
+    Age,
+    County,
+    GeneralData,
+    Incidence,
+    IncidenceCategory,
+    PopulationByAge,
+    Region,
+    Reinforcement,
+    Sample,
+    StatisticsByAgeAndSex,
+    StatisticsByRegion,
+    StatisticsBySex,
+    Symptoms,
+    SymptomsType,
+    TotalDeaths,
+    TransmissionRisk,
+    Vaccines,
+)
+
+# The versions of the tables, read from the database at most once per TTL
+_versions_lock = threading.Lock()
+_versions = {'expires': 0, 'versions': dict()}
+
+
+def get_table_versions() -> dict[str, tuple[int, datetime]]:
+    '''Returns the current version of each table. The versions are kept in the
+        database, so that the writes of the import workers are seen by all the
+        web processes, and cached in memory for API_CACHE_VERSION_TTL seconds.
+
+    Returns:
+        dict[str, tuple[int, datetime]]: the version and the date of the last
+            write of each table that was ever written.
+    '''
+
+    with _versions_lock:
+        if time.monotonic() >= _versions['expires']:
+            _versions['versions'] = {
+                table_name: (version, updated_date)
+                for table_name, version, updated_date in DataVersion.objects.
+                values_list('table_name', 'version', 'updated_date')
+            }
+            _versions['expires'] = time.monotonic() + settings.API_CACHE_VERSION_TTL
+
+        return _versions['versions']
+
+
+def bump_table_versions(table_names: list[str]) -> None:
+    '''Increments the version of the tables, which invalidates the cached
+        responses that depend on them.
+
+    Args:
+        table_names (list[str]): the names of the tables written.
+    '''
+
+    for table_name in table_names:
+        DataVersion.objects.get_or_create(table_name=table_name)
+        DataVersion.objects.\
+            filter(table_name=table_name).\
+            update(version=F('version') + 1, updated_date=timezone.now())
+
+    # This process sees its own writes right away
+    with _versions_lock:
+        _versions['expires'] = 0
+
+
+def bump_table_version_on_commit(table_name: str, using: str = None) -> None:
+    '''Bumps the version of the table once the current transaction is
+        committed, or right away outside of one. The tables written in the
+        same transaction are bumped together, once each, however many of their
+        rows were written.
+
+    Args:
+        table_name (str): the name of the table written.
+        using (str, optional): the alias of the database written. Defaults to
+            None, the default database.
+    '''
+
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, 'pending_version_bump', None)
+
+    # The callback of a rolled back transaction is dropped with it
+    if pending is None or all(entry[1] is not pending for entry in connection.run_on_commit):
+        pending = functools.partial(bump_table_versions, [table_name])
+        connection.pending_version_bump = pending
+        transaction.on_commit(pending, using=using)
+    elif table_name not in pending.args[0]:
+        pending.args[0].append(table_name)
+
+
+def get_tables_etag(table_names: tuple[str]) -> str:
+    '''Builds the entity tag of the data of the tables from their versions.'''
+
+    versions = get_table_versions()
+    raw_etag = repr([(t, versions.get(t, (0, None))[0]) for t in table_names])
+
+    return hashlib.md5(raw_etag.encode('utf-8')).hexdigest()
+
+
+def get_tables_last_modified(table_names: tuple[str]) -> datetime:
+    '''Returns the date of the last write of the tables, or None if they were
+        never written.'''
+
+    versions = get_table_versions()
+    dates = [versions[t][1] for t in table_names if t in versions]
+
+    return max(dates, default=None)
+
+
+def get_media_type(request: object, view: Callable) -> str:
+    '''Returns the media type that the API view negotiates for the request,
+        before running it, e.g. "application/json". Falls back to the Accept
+        header for the views that aren't API views.'''
+
+    view_class = getattr(view, 'cls', None)
+    if view_class is None:
+        return request.META.get('HTTP_ACCEPT', '')
+
+    api_view = view_class()
+    try:
+        _, media_type = api_view.get_content_negotiator().select_renderer(
+            Request(request), api_view.get_renderers())
+    except NotAcceptable:
+        return ''
+
+    return media_type
+
+
+def get_response_etag(
+    request: object,
+    table_names: tuple[str],
+    media_type: str,
+    variant: Callable = None,
+) -> str:
+    '''Builds the entity tag of the response from the versions of the tables,
+        the query parameters, the media type of the response and the value of
+        the variant of the view, if any.'''
+
+    params = sorted(request.GET.lists())
+    variant_value = repr(variant(request)) if variant is not None else ''
+    raw_etag = '|'.join((get_tables_etag(table_names), repr(params), media_type, variant_value))
+
+    return hashlib.md5(raw_etag.encode('utf-8')).hexdigest()
+
+
+def get_cache_key(request: object, table_names: tuple[str], variant: Callable = None) -> str:
+    '''Builds the key of the cached response from the endpoint, the query
+        parameters, the negotiated media type, the value of the variant of the
+        view and the versions of the tables read by the endpoint.'''
+
+    etag = get_response_etag(request, table_names, request.accepted_media_type, variant)
+    raw_key = '|'.join((request.path, etag))
+
+    return 'api:' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+
+
+def conditional_response(tables: tuple[models.Model], variant: Callable = None) -> Callable:
+    '''Adds the ETag and Last-Modified headers, derived from the versions of
+        the provided tables, to the responses of the decorated view. The ETag
+        also depends on the query parameters and on the negotiated media type,
+        and the responses vary by the Accept header. Requests whose
+        If-None-Match or If-Modified-Since headers match get a 304 response,
+        without running the view.
+
+    Args:
+        tables (tuple[models.Model]): the models read by the view.
+        variant (Callable, optional): the method that returns, from the
+            request, the value of anything else the response depends on, e.g.
+            the current year. Defaults to None.
+
+    Returns:
+        Callable: the decorator.
+    '''
+
+    table_names = tuple(m._meta.db_table for m in tables)
+
+    def decorator(view: Callable) -> Callable:
+
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: get_response_etag(
+                request, table_names, get_media_type(request, view), variant),
+            last_modified_func=lambda request, *args, **kwargs: get_tables_last_modified(table_names),
+        )(view)
+
+        @functools.wraps(view)
+        def wrapper(request: object, *args, **kwargs) -> HttpResponse:
+            response = conditional_view(request, *args, **kwargs)
+
+            # The browsers must check the validators before using their copy,
+            # also on the 304 responses
+            patch_cache_control(response, no_cache=True)
+            patch_vary_headers(response, ('Accept',))
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cached_response(tables: tuple[models.Model], variant: Callable = None) -> Callable:
+    '''Caches the data of the successful responses of the decorated view on the
+        "api" cache, until any of the provided tables is written or the value
+        of the variant changes.
+
+    Args:
+        tables (tuple[models.Model]): the models read by the view.
+        variant (Callable, optional): the method that returns, from the
+            request, the value of anything else the response depends on.
+            Defaults to None.
+
+    Returns:
+        Callable: the decorator.
+    '''
+
+    table_names = tuple(m._meta.db_table for m in tables)
+
+    def decorator(view: Callable) -> Callable:
+
+        @functools.wraps(view)
+        def wrapper(request: object, *args, **kwargs) -> Response:
+            cache = caches['api']
+            key = get_cache_key(request, table_names, variant)
+
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view(request, *args, **kwargs)
+
+            if response.status_code == 200:
+                cache.set(key, response.data)
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@receiver(table_updated)
+def invalidate_cached_responses(sender: models.Model, using: str = None, **kwargs) -> None:
+    '''Bumps the version of a data table once it's written, either by the ETL
+        processes or by django admin. The version is only bumped on commit, so
+        that the data of the rolled back imports is never cached.'''
+
+    if sender._meta.app_label != 'covid_site' or sender in UNVERSIONED_MODELS:
+        return
+
+    bump_table_version_on_commit(sender._meta.db_table, using=using)
+
+
+# The receivers are limited to the admin models, since any receiver of
+# post_delete turns the fast deletes of its models into deletes row by row
+for django_model in ADMIN_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=django_model)
+    post_delete.connect(invalidate_cached_responses, sender=django_model)
@@ -0,0 +1,129 @@
+from django.db import models
+from rest_framework import serializers
+
+from covid_site.fast_serializers import resolve_source
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+
+def is_columnar_supported() -> bool:
+    '''Checks if pyarrow, used to build the columnar formats, is installed.'''
+
+    return pa is not None
+
+
+def get_arrow_type(model_field: models.Field) -> object:
+    '''Returns the Arrow type of the column of a model field.'''
+
+    if model_field.is_relation:
+        model_field = model_field.target_field
+
+    # The order matters, e.g. a date time field is also a date field
+    arrow_types = (
+        (models.BooleanField, pa.bool_()),
+        (models.DateTimeField, pa.timestamp('us', tz='UTC')),
+        (models.DateField, pa.date32()),
+        (models.FloatField, pa.float64()),
+        (models.IntegerField, pa.int64()),
+        (models.AutoField, pa.int64()),
+        (models.BigAutoField, pa.int64()),
+    )
+
+    for field_class, arrow_type in arrow_types:
+        if isinstance(model_field, field_class):
+            return arrow_type
+
+    return pa.string()
+
+
+def get_columns(
+    serializer: serializers.ModelSerializer,
+    fields: tuple[str] = None,
+) -> list[tuple[str, str, object]]:
+    '''Returns the columns of the serializer that are columns of the database,
+        in the order of the serializer. The other fields, e.g. the ones from
+        methods of the model, are left out of the columnar formats.
+
+    Args:
+        serializer (serializers.ModelSerializer): the serializer of the rows.
+        fields (tuple[str], optional): the fields to keep. Defaults to None -
+            all the fields of the serializer.
+
+    Returns:
+        list[tuple[str, str, object]]: the name, the values_list lookup and the
+            Arrow type of each column.
+    '''
+
+    django_model = serializer.Meta.model
+
+    columns = list()
+    for name, field in serializer().fields.items():
+        if fields is not None and name not in fields:
+            continue
+
+        try:
+            lookup, model_field = resolve_source(django_model, field.source)
+        except TypeError:
+            continue
+
+        columns.append((name, lookup, get_arrow_type(model_field)))
+
+    return columns
+
+
+def build_table(queryset: models.QuerySet, columns: list[tuple[str, str, object]]) -> object:
+    '''Reads the columns of the queryset with values_list, transposed straight
+        into Arrow arrays, without building a dictionary per row.
+
+    Args:
+        queryset (models.QuerySet): the query of the rows.
+        columns (list[tuple[str, str, object]]): the columns to read.
+
+    Returns:
+        pyarrow.Table: the table with the columns.
+    '''
+
+    rows = queryset.values_list(*(lookup for _, lookup, _ in columns))
+    values = list(zip(*rows)) or [tuple() for _ in columns]
+
+    return pa.table(
+        [pa.array(v, type=arrow_type) for v, (_, _, arrow_type) in zip(values, columns)],
+        names=[name for name, _, _ in columns],
+    )
+
+
+def table_from_records(records: list[dict]) -> object:
+    '''Builds the table from a list of dictionaries, e.g. the data of the
+        responses that are not built from a queryset.'''
+
+    if isinstance(records, dict):
+        records = [records]
+
+    return pa.Table.from_pylist(list(records))
+
+
+def to_arrow_stream(table: object) -> bytes:
+    '''Encodes the table in the Arrow IPC streaming format.'''
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(table: object) -> bytes:
+    '''Encodes the table in the Parquet format.'''
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+
+    return sink.getvalue().to_pybytes()
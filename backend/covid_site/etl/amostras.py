@@ -39,14 +39,7 @@ def amostras_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
             df=df,
             django_model=Sample,
             specific_etl_method=generate_sample_records,
-            delete_if_all_none=(
-                'total',
-                'new',
-                'pcr',
-                'pcr_new',
-                'antigen',
-                'antigen_new',
-            )
+            drop_if_all_none=True,
         )
 
         status = ETLProcessStatus(
@@ -0,0 +1,310 @@
+import contextlib
+import operator
+import tempfile
+import time
+from contextvars import ContextVar
+from typing import Iterator
+
+import pandas as pd
+from covid_site.etl.tools import get_cols_to_update, get_filter_fields
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+# Whether the ETL processes of the current context load the tables in bulk
+FULL_RELOAD = ContextVar('full_reload', default=False)
+
+BULK_LOAD_VENDORS = ('mysql', 'postgresql')
+
+# The comparison of each database where NULL matches NULL
+NULL_SAFE_OPERATORS = {
+    'mysql': '<=>',
+    'postgresql': 'IS NOT DISTINCT FROM',
+    'sqlite': 'IS',
+}
+
+
+@contextlib.contextmanager
+def full_reload() -> Iterator[None]:
+    '''Makes the ETL processes run inside the block load the tables with the
+        native bulk load of the database, instead of comparing the records
+        with the stored ones. Meant for the first import and for reloads of
+        the whole history.'''
+
+    token = FULL_RELOAD.set(True)
+    try:
+        yield
+    finally:
+        FULL_RELOAD.reset(token)
+
+
+def is_bulk_load_supported() -> bool:
+    '''Checks if the database has a native bulk load.'''
+
+    return connection.vendor in BULK_LOAD_VENDORS
+
+
+def get_load_fields(django_model: models.Model) -> tuple[models.Field]:
+    '''Returns the fields written by the bulk load, i.e. all but the id.'''
+
+    return tuple(f for f in django_model._meta.concrete_fields if not f.primary_key)
+
+
+def get_tsv_column(field: models.Field, values: pd.Series) -> pd.Series:
+    '''Converts the values of a field to the text format shared by LOAD DATA
+        and COPY, where the missing values are NULL.
+
+    Args:
+        field (models.Field): the field of the values.
+        values (pd.Series): the values of the field, of object dtype.
+
+    Returns:
+        pd.Series: the text values of the field.
+    '''
+
+    missing = values.isna()
+
+    # The foreign keys hold the values of the fields they point to
+    if field.is_relation:
+        field = field.target_field
+
+    if isinstance(field, models.DateTimeField):
+        text = values.map(lambda v: str(connection.ops.adapt_datetimefield_value(v)), na_action='ignore')
+    elif isinstance(field, models.DateField):
+        # The dates of the source files are read as timestamps
+        dates = pd.to_datetime(values)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_convert(timezone.get_default_timezone_name())
+        text = dates.dt.strftime('%Y-%m-%d')
+    elif isinstance(field, (models.BooleanField, models.IntegerField)):
+        # The integer columns with missing values are read as floats
+        text = values.map(lambda v: str(int(v)), na_action='ignore')
+    else:
+        text = values.map(str, na_action='ignore')
+
+    if isinstance(field, (models.CharField, models.TextField)):
+        text = text.\
+            str.replace('\\', '\\\\', regex=False).\
+            str.replace('\t', '\\t', regex=False).\
+            str.replace('\n', '\\n', regex=False).\
+            str.replace('\r', '\\r', regex=False)
+
+    return text.where(~missing, '\\N')
+
+
+def write_tsv(
+        django_model: models.Model,
+        records: list[object],
+        file: object,
+) -> int:
+    '''Writes the records to the file as tab separated values, keeping only the
+        last record of each natural key. The values of the records are read
+        into a DataFrame and converted by column, instead of being prepared
+        one by one by their model fields.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        records (list[object]): the list of records to write.
+        file (object): the text file to write to.
+
+    Returns:
+        int: the amount of rows written.
+    '''
+
+    filter_attnames = tuple(f.attname for f in get_filter_fields(django_model))
+    load_fields = get_load_fields(django_model)
+    get_values = operator.attrgetter(*(f.attname for f in load_fields))
+
+    # If the same key shows up more than once, the last record wins
+    df = pd.DataFrame(
+        [get_values(obj) for obj in records],
+        columns=[f.attname for f in load_fields],
+        dtype=object,
+    ).drop_duplicates(subset=list(filter_attnames), keep='last')
+
+    now = str(connection.ops.adapt_datetimefield_value(timezone.now()))
+
+    columns = list()
+    for f in load_fields:
+        if f.name in ('inserted_date', 'updated_date'):
+            columns.append([now] * len(df))
+        else:
+            columns.append(get_tsv_column(f, df[f.attname]).tolist())
+
+    for row in zip(*columns):
+        file.write('\t'.join(row) + '\n')
+
+    file.flush()
+
+    return len(df)
+
+
+def get_keys_condition(django_model: models.Model, table: str, other_table: str) -> str:
+    '''Builds the condition that matches the natural keys of the rows of two
+        tables. The nullable columns are compared with the NULL-safe operator
+        of the database, since the unique indexes never match a NULL, e.g. the
+        age_end of the 80+ age.
+
+    Args:
+        django_model (models.Model): the model of the tables.
+        table (str): the quoted name of the first table.
+        other_table (str): the quoted name of the second table.
+
+    Returns:
+        str: the SQL condition.
+    '''
+
+    qn = connection.ops.quote_name
+
+    conditions = list()
+    for f in get_filter_fields(django_model):
+        comparison = NULL_SAFE_OPERATORS[connection.vendor] if f.null else '='
+        conditions.append(f'{table}.{qn(f.column)} {comparison} {other_table}.{qn(f.column)}')
+
+    return ' AND '.join(conditions)
+
+
+@contextlib.contextmanager
+def staging_table(django_model: models.Model) -> Iterator[str]:
+    '''Creates an empty temporary table with the columns loaded into the
+        table of the model, which is dropped at the end of the block.
+
+    Args:
+        django_model (models.Model): the model of the table.
+
+    Yields:
+        str: the quoted name of the staging table.
+    '''
+
+    qn = connection.ops.quote_name
+    table = qn(django_model._meta.db_table)
+    staging = qn(f'{django_model._meta.db_table}_staging')
+    columns = ', '.join(qn(f.column) for f in get_load_fields(django_model))
+
+    # The temporary tables of MySQL outlive the rollback of a failed load
+    temporary = 'TEMPORARY ' if connection.vendor == 'mysql' else ''
+
+    with connection.cursor() as cursor:
+        if temporary:
+            cursor.execute(f'DROP TEMPORARY TABLE IF EXISTS {staging}')
+        cursor.execute(f'CREATE TEMPORARY TABLE {staging} AS SELECT {columns} FROM {table} LIMIT 0')
+
+    yield staging
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP {temporary}TABLE {staging}')
+
+
+def merge_staging_table(django_model: models.Model, staging: str) -> dict[str, int]:
+    '''Merges the staging table into the table of the model: the stored rows
+        of the natural keys of the staging table are updated and the other
+        rows inserted. Unlike an upsert, the keys are matched with a NULL-safe
+        comparison, so reloading the same rows never duplicates them, and no
+        unique index of the natural keys is needed.
+
+    Args:
+        django_model (models.Model): the model of the table.
+        staging (str): the quoted name of the staging table.
+
+    Returns:
+        dict[str, int]: the amount of created, updated and unchanged records.
+    '''
+
+    qn = connection.ops.quote_name
+    table = qn(django_model._meta.db_table)
+
+    columns = ', '.join(qn(f.column) for f in get_load_fields(django_model))
+    staging_columns = ', '.join(f'{staging}.{qn(f.column)}' for f in get_load_fields(django_model))
+    update_columns = [
+        django_model._meta.get_field(c).column
+        for c in (*get_cols_to_update(django_model), 'updated_date')
+    ]
+    condition = get_keys_condition(django_model, table, staging)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            updates = ', '.join(f'{table}.{qn(c)} = {staging}.{qn(c)}' for c in update_columns)
+            cursor.execute(f'UPDATE {table} INNER JOIN {staging} ON {condition} SET {updates}')
+        else:
+            updates = ', '.join(f'{qn(c)} = {staging}.{qn(c)}' for c in update_columns)
+            cursor.execute(f'UPDATE {table} SET {updates} FROM {staging} WHERE {condition}')
+        updated = cursor.rowcount
+
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {staging_columns} FROM {staging} '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {condition})'
+        )
+        created = cursor.rowcount
+
+    return {'created': created, 'updated': updated, 'unchanged': 0}
+
+
+def mysql_load_staging_table(django_model: models.Model, staging: str, file_name: str) -> None:
+    '''Loads the file into the staging table with LOAD DATA LOCAL INFILE.'''
+
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(f.column) for f in get_load_fields(django_model))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'LOAD DATA LOCAL INFILE %s INTO TABLE {staging} '
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({columns})",
+            [file_name],
+        )
+
+
+def postgresql_load_staging_table(django_model: models.Model, staging: str, file: object) -> None:
+    '''Loads the file into the staging table with COPY.'''
+
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(f.column) for f in get_load_fields(django_model))
+
+    with connection.cursor() as cursor:
+        file.seek(0)
+        cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN', file)
+
+
+@transaction.atomic
+def bulk_load(django_model: models.Model, records: list[object]) -> dict[str, int]:
+    '''Writes the records to a temporary TSV file, loads it into a staging
+        table with the native bulk load of the database and merges the staging
+        table into the table. The records are not compared with the stored
+        ones, so all the existing records are counted as updated.
+
+    Args:
+        django_model (models.Model): the model to load.
+        records (list[object]): the list of records to load.
+
+    Returns:
+        dict[str, int]: the amount of created, updated and unchanged records.
+    '''
+
+    result = {'created': 0, 'updated': 0, 'unchanged': 0}
+
+    if not records:
+        print('Canceling bulk load because there are no new records.')
+        return result
+
+    start_time = time.time()
+    table_name = django_model._meta.verbose_name
+    print(f'\nStarting bulk load for {table_name} table..')
+
+    with tempfile.NamedTemporaryFile(mode='w+', suffix='.tsv', encoding='utf-8') as file:
+        rows = write_tsv(django_model=django_model, records=records, file=file)
+        print(f'Written {rows} rows to the TSV file: {(time.time() - start_time):.0f}.')
+
+        with staging_table(django_model) as staging:
+            if connection.vendor == 'mysql':
+                mysql_load_staging_table(django_model=django_model, staging=staging, file_name=file.name)
+            else:
+                postgresql_load_staging_table(django_model=django_model, staging=staging, file=file)
+
+            result = merge_staging_table(django_model=django_model, staging=staging)
+
+    print(f'created_records: {result["created"]}')
+    print(f'updated_records: {result["updated"]}')
+
+    spent = time.time() - start_time
+    print(f'Loaded {table_name} table! Spent: {spent:.0f} seconds on it.')
+
+    return result
@@ -1,8 +1,15 @@
+import functools
 from datetime import datetime
 
 import pandas as pd
-from covid_site.etl.tools import ETLProcessStatus, run_etl
-from covid_site.models import County, TotalDeaths
+from covid_site.etl.dimensions import COUNTIES_BY_NAME
+from covid_site.etl.rollups import (generate_county_year_deaths_records,
+                                    generate_region_deaths_since_records,
+                                    generate_region_year_deaths_records)
+from covid_site.etl.tools import (ETLProcessStatus, records_from_frame,
+                                  run_etl)
+from covid_site.models import (CountyYearDeaths, RegionDeathsSince,
+                               RegionYearDeaths, TotalDeaths)
 from django.db import transaction
 
 NEW_COLUMN_NAMES = {
@@ -43,6 +50,33 @@ def dados_sico_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
             specific_etl_method=generate_total_deaths_records,
         )
 
+        # The totals are summed again only on the years of the file
+        weeks = [c for c in df.columns if c != 'county']
+        years = sorted(set(get_weeks_dates(weeks)['date_start'].dt.year))
+
+        run_etl(
+            df=df,
+            django_model=CountyYearDeaths,
+            specific_etl_method=functools.partial(
+                generate_county_year_deaths_records, years=years),
+            drop_if_all_none=True,
+        )
+
+        run_etl(
+            df=df,
+            django_model=RegionYearDeaths,
+            specific_etl_method=functools.partial(
+                generate_region_year_deaths_records, years=years),
+            drop_if_all_none=True,
+        )
+
+        run_etl(
+            df=df,
+            django_model=RegionDeathsSince,
+            specific_etl_method=generate_region_deaths_since_records,
+            drop_if_all_none=True,
+        )
+
         status = ETLProcessStatus(
             succeeded=True,
             message='Tables updated with success.',
@@ -73,63 +107,65 @@ def extract_week_date(date: str, day: int) -> datetime:
     return datetime.strptime(date + f'-{day}', 'Semana %V-%G-%u')
 
 
-@transaction.atomic
-def generate_total_deaths_records(df: pd.DataFrame) -> list[TotalDeaths]:
-    '''Generates records for the Total Deaths table according to the provided
-        DataFrame.
+def get_weeks_dates(weeks: list[str]) -> pd.DataFrame:
+    '''Builds the table with the first and the last day of each week of the
+        file. The weeks that cross the turn of the year are clipped to the year
+        of the file, which is the year of the last day of its first week.
 
     Args:
-        df (pd.DataFrame): the DataFrame from which to extract the data.
+        weeks (list[str]): the weeks of the file, e.g. "Semana 53-2020".
 
     Returns:
-        list[TotalDeaths]: list of objects to be inserted / updated.
+        pd.DataFrame: the table with the week, date_start and date_end columns.
     '''
 
-    counties = County.objects.all()
+    weeks_dates = pd.DataFrame({
+        'week': weeks,
+        'date_start': [extract_week_date(date=w, day=1) for w in weeks],
+        'date_end': [extract_week_date(date=w, day=7) for w in weeks],
+    })
 
-    # Remove the "county" column
-    weeks = list(df.columns)[1:]
+    main_year = weeks_dates['date_end'].iloc[0].year
 
-    main_year = extract_week_date(date=weeks[0], day=1).year
-    if main_year != extract_week_date(date=weeks[0], day=7):
-        main_year += 1
+    weeks_dates['date_start'] = weeks_dates['date_start'].clip(
+        lower=datetime(main_year, 1, 1))
+    weeks_dates['date_end'] = weeks_dates['date_end'].clip(
+        upper=datetime(main_year, 12, 31))
 
-    records = list()
-    for row in df.to_dict(orient='records'):
+    return weeks_dates
 
-        county_name = row['county']
 
-        if county_name in IGNORE_COUNTIES:
-            continue
+@transaction.atomic
+def generate_total_deaths_records(df: pd.DataFrame) -> list[TotalDeaths]:
+    '''Generates records for the Total Deaths table according to the provided
+        DataFrame.
+
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+
+    Returns:
+        list[TotalDeaths]: list of objects to be inserted / updated.
+    '''
 
-        if county_name in RIGHT_COUNTY_NAME:
-            county_name = RIGHT_COUNTY_NAME[county_name]
+    weeks = [c for c in df.columns if c != 'county']
+    weeks_dates = get_weeks_dates(weeks)
 
-        county = counties.filter(county_name=county_name).first()
+    counties = df[~df['county'].isin(IGNORE_COUNTIES)]
+    counties = counties.assign(county=counties['county'].replace(RIGHT_COUNTY_NAME))
 
-        for week in weeks:
+    counties_ids = dict()
+    for county_name in counties['county'].unique():
+        county = COUNTIES_BY_NAME.get(county_name)
 
-            date_start = extract_week_date(date=week, day=1)
-            date_end = extract_week_date(date=week, day=7)
+        if county is None:
+            raise ValueError(f'The county {county_name} does not exist.')
 
-            if week == weeks[0]:
-                day = 1
-                while date_start.year != main_year:
-                    day += 1
-                    date_start = extract_week_date(date=week, day=day)
-            elif week == weeks[-1]:
-                day = 7
-                while date_end.year != main_year:
-                    day -= 1
-                    date_end = extract_week_date(date=week, day=day)
+        counties_ids[county_name] = county.id
 
-            obj = TotalDeaths(
-                county=county,
-                date_start=date_start,
-                date_end=date_end,
-                deaths=row[week],
-            )
+    total_deaths = counties.\
+        melt(id_vars='county', value_vars=weeks, var_name='week', value_name='deaths').\
+        merge(weeks_dates, on='week')
 
-            records.append(obj)
+    total_deaths['county_id'] = total_deaths.pop('county').map(counties_ids)
 
-    return records
+    return records_from_frame(TotalDeaths, total_deaths.drop(columns='week'))
@@ -1,9 +1,26 @@
+import re
+
 import pandas as pd
-from covid_site.etl.tools import ETLProcessStatus, get_table_cols, run_etl
-from covid_site.models import (Age, GeneralData, Region, StatisticsByAgeAndSex,
-                               StatisticsByRegion, StatisticsBySex, Symptoms,
-                               SymptomsType)
-from django.db import transaction
+from covid_site.etl.dimensions import AGES, REGIONS_BY_SHORT_NAME, SYMPTOMS_TYPES
+from covid_site.etl.rollups import generate_region_deaths_since_records
+from covid_site.etl.snapshots import \
+    generate_latest_statistics_by_region_records
+from covid_site.etl.tools import (ETLProcessStatus, ETLStage,
+                                  get_stale_records, get_table_cols,
+                                  records_from_frame, run_etl_graph,
+                                  unpivot_columns)
+from covid_site.models import (Age, GeneralData, LatestStatisticsByRegion,
+                               RegionDeathsSince, StatisticsByAgeAndSex,
+                               StatisticsByAgeAndSexCombined,
+                               StatisticsByRegion, StatisticsBySex,
+                               StatisticsBySexCombined, Symptoms, SymptomsType)
+from django.db import models, transaction
+
+# The sexes of the columns of the file and their names on the combined tables
+SEXES = {
+    'm': 'male',
+    'f': 'female',
+}
 
 NEW_COLUMN_NAMES = {
     'data': 'reference_date',
@@ -139,54 +156,66 @@ def data_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
         for c, f in date_columns_formats.items():
             df[c] = pd.to_datetime(df[c], format=f, utc=True)
 
-        run_etl(
-            df=df,
-            django_model=GeneralData,
-            specific_etl_method=generate_general_data_records,
-        )
-
-        run_etl(
-            df=df,
-            django_model=StatisticsBySex,
-            specific_etl_method=generate_statistics_by_sex_records,
-            delete_if_all_none=(
-                'confirmed',
-                'confirmed_unknown',
-                'deaths',
-            ),
-        )
-
-        run_etl(
-            df=df,
-            django_model=Age,
-            specific_etl_method=generate_age_records,
-        )
-
-        run_etl(
+        run_etl_graph(
             df=df,
-            django_model=StatisticsByAgeAndSex,
-            specific_etl_method=generate_statistics_by_age_and_sex_records,
-            delete_if_all_none=('confirmed', 'deaths'),
-        )
-
-        run_etl(
-            df=df,
-            django_model=SymptomsType,
-            specific_etl_method=generate_symptoms_type_records,
-        )
-
-        run_etl(
-            df=df,
-            django_model=Symptoms,
-            specific_etl_method=generate_symptoms_records,
-            delete_if_all_none=('quantity',),
-        )
-
-        run_etl(
-            df=df,
-            django_model=StatisticsByRegion,
-            specific_etl_method=generate_statistics_by_region_records,
-            delete_if_all_none=('confirmed', 'deaths', 'recovered'),
+            stages=[
+                ETLStage(
+                    django_model=GeneralData,
+                    specific_etl_method=generate_general_data_records,
+                ),
+                ETLStage(
+                    django_model=StatisticsBySex,
+                    specific_etl_method=generate_statistics_by_sex_records,
+                    drop_if_all_none=True,
+                ),
+                ETLStage(
+                    django_model=StatisticsBySexCombined,
+                    specific_etl_method=generate_statistics_by_sex_combined_records,
+                    drop_if_all_none=True,
+                ),
+                ETLStage(
+                    django_model=Age,
+                    specific_etl_method=generate_age_records,
+                ),
+                ETLStage(
+                    django_model=StatisticsByAgeAndSex,
+                    specific_etl_method=generate_statistics_by_age_and_sex_records,
+                    drop_if_all_none=True,
+                    depends_on=(Age,),
+                ),
+                ETLStage(
+                    django_model=StatisticsByAgeAndSexCombined,
+                    specific_etl_method=generate_statistics_by_age_and_sex_combined_records,
+                    drop_if_all_none=True,
+                    depends_on=(Age,),
+                ),
+                ETLStage(
+                    django_model=SymptomsType,
+                    specific_etl_method=generate_symptoms_type_records,
+                ),
+                ETLStage(
+                    django_model=Symptoms,
+                    specific_etl_method=generate_symptoms_records,
+                    drop_if_all_none=True,
+                    depends_on=(SymptomsType,),
+                ),
+                ETLStage(
+                    django_model=StatisticsByRegion,
+                    specific_etl_method=generate_statistics_by_region_records,
+                    drop_if_all_none=True,
+                ),
+                ETLStage(
+                    django_model=LatestStatisticsByRegion,
+                    specific_etl_method=generate_latest_statistics_by_region_records,
+                    depends_on=(StatisticsByRegion,),
+                ),
+                ETLStage(
+                    django_model=RegionDeathsSince,
+                    specific_etl_method=generate_region_deaths_since_records,
+                    drop_if_all_none=True,
+                    depends_on=(StatisticsByRegion,),
+                ),
+            ],
         )
 
         status = ETLProcessStatus(
@@ -205,6 +234,93 @@ def data_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
     return status
 
 
+def unpivot_statistics_by_sex(df: pd.DataFrame) -> pd.DataFrame:
+    '''Reshapes the statistics by sex of the DataFrame to one row per day and
+        sex.'''
+
+    return unpivot_columns(
+        df=df,
+        id_columns=('reference_date',),
+        pattern=r'(?P<measure>confirmed|confirmed_unknown|deaths)_(?P<sex>m|f)',
+    )
+
+
+def unpivot_statistics_by_age_and_sex(df: pd.DataFrame) -> pd.DataFrame:
+    '''Reshapes the statistics by age and sex of the DataFrame to one row per
+        day, age and sex, with the id of the age.'''
+
+    age_ids = {
+        f'{age.age_start}_{age.age_end if age.age_end is not None else "plus"}': age.id
+        for age in AGES.all()
+    }
+
+    statistics = unpivot_columns(
+        df=df,
+        id_columns=('reference_date',),
+        pattern=r'(?P<measure>confirmed|deaths)_(?P<age>\d+_(\d+|plus))_(?P<sex>m|f)',
+    )
+
+    statistics['age_id'] = statistics.pop('age').map(age_ids)
+
+    return statistics
+
+
+def get_stale_combined_records(
+    django_model: models.Model,
+    df: pd.DataFrame,
+    records: list[models.Model],
+) -> list[models.Model]:
+    '''Returns the empty records of the keys of a combined table, in the range
+        of dates of the DataFrame, that are no longer produced, e.g. of an age
+        group removed from the file, so that they are deleted.
+
+    Args:
+        django_model (models.Model): the model of the combined table.
+        df (pd.DataFrame): the DataFrame from which the records were
+            generated.
+        records (list[models.Model]): the records generated.
+
+    Returns:
+        list[models.Model]: the empty records of the keys to delete.
+    '''
+
+    if df.empty:
+        return list()
+
+    dates = df['reference_date'].dt.date
+
+    return get_stale_records(django_model, records, reference_date__range=(dates.min(), dates.max()))
+
+
+def pivot_sexes(statistics: pd.DataFrame, id_columns: tuple[str]) -> pd.DataFrame:
+    '''Reshapes the statistics with one row per sex to one row with the male
+        and female columns, e.g. male_confirmed and female_confirmed. Like the
+        join of the male and female rows, only the rows with some value for
+        both sexes are kept, since the rows without values are not stored.
+
+    Args:
+        statistics (pd.DataFrame): the statistics with the sex column.
+        id_columns (tuple[str]): the columns that identify each row, besides
+            the sex.
+
+    Returns:
+        pd.DataFrame: the statistics with the columns of each sex.
+    '''
+
+    measures = [c for c in statistics.columns if c not in id_columns + ('sex',)]
+    wide = statistics.pivot(index=list(id_columns), columns='sex', values=measures)
+
+    has_values = pd.concat(
+        [wide.xs(sex, axis=1, level='sex').notna().any(axis=1) for sex in SEXES],
+        axis=1,
+    ).all(axis=1)
+
+    wide = wide[has_values]
+    wide.columns = [f'{SEXES[sex]}_{measure}' for measure, sex in wide.columns]
+
+    return wide.reset_index()
+
+
 @transaction.atomic
 def generate_general_data_records(df: pd.DataFrame) -> list[GeneralData]:
     '''Generates records for the General Data table according to the provided
@@ -219,11 +335,7 @@ def generate_general_data_records(df: pd.DataFrame) -> list[GeneralData]:
 
     table_columns = get_table_cols(GeneralData)
 
-    records = list()
-    for row in df[table_columns].to_dict(orient='records'):
-        records.append(GeneralData(**row))
-
-    return records
+    return records_from_frame(GeneralData, df[table_columns])
 
 
 @transaction.atomic
@@ -238,21 +350,33 @@ def generate_statistics_by_sex_records(df: pd.DataFrame) -> list[StatisticsBySex
         list[StatisticsBySex]: list of objects to be inserted / updated.
     '''
 
-    records = list()
-    for row in df.to_dict(orient='records'):
+    statistics = unpivot_statistics_by_sex(df)
 
-        for sex in ['m', 'f']:
-            obj = StatisticsBySex(
-                reference_date=row['reference_date'],
-                sex=sex,
-                confirmed=row[f'confirmed_{sex}'],
-                confirmed_unknown=row[f'confirmed_unknown_{sex}'],
-                deaths=row[f'deaths_{sex}'],
-            )
+    return records_from_frame(StatisticsBySex, statistics)
 
-            records.append(obj)
 
-    return records
+@transaction.atomic
+def generate_statistics_by_sex_combined_records(df: pd.DataFrame) -> list[StatisticsBySexCombined]:
+    '''Generates records for the Statistics by Sex Combined table, with the
+        male and female statistics of each day on the same row, according to
+        the provided DataFrame.
+
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+
+    Returns:
+        list[StatisticsBySexCombined]: list of objects to be inserted /
+            updated.
+    '''
+
+    statistics = pivot_sexes(
+        statistics=unpivot_statistics_by_sex(df),
+        id_columns=('reference_date',),
+    )
+
+    records = records_from_frame(StatisticsBySexCombined, statistics)
+
+    return records + get_stale_combined_records(StatisticsBySexCombined, df, records)
 
 
 @transaction.atomic
@@ -298,42 +422,33 @@ def generate_statistics_by_age_and_sex_records(df: pd.DataFrame) -> list[Statist
         list[StatisticsByAgeAndSex]: list of objects to be inserted / updated.
     '''
 
-    age_ranges = Age.objects.all()
+    statistics = unpivot_statistics_by_age_and_sex(df)
 
-    ages = [
-        ('0', '9'),
-        ('10', '19'),
-        ('20', '29'),
-        ('30', '39'),
-        ('40', '49'),
-        ('50', '59'),
-        ('60', '69'),
-        ('70', '79'),
-        ('80', None),
-    ]
+    return records_from_frame(StatisticsByAgeAndSex, statistics)
 
-    ages = [age_ranges.filter(
-        age_start=age[0], age_end=age[1]).first() for age in ages]
 
-    records = list()
-    for row in df.to_dict(orient='records'):
+@transaction.atomic
+def generate_statistics_by_age_and_sex_combined_records(df: pd.DataFrame) -> list[StatisticsByAgeAndSexCombined]:
+    '''Generates records for the Statistics by Age and Sex Combined table, with
+        the male and female statistics of each day and age on the same row,
+        according to the provided DataFrame.
 
-        for age in ages:
-            range_end = age.age_end if age.age_end is not None else 'plus'
-            col_filter = f'{age.age_start}_{range_end}'
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+
+    Returns:
+        list[StatisticsByAgeAndSexCombined]: list of objects to be inserted /
+            updated.
+    '''
 
-            for sex in ['m', 'f']:
-                obj = StatisticsByAgeAndSex(
-                    reference_date=row['reference_date'],
-                    age=age,
-                    sex=sex,
-                    confirmed=row[f'confirmed_{col_filter}_{sex}'],
-                    deaths=row[f'deaths_{col_filter}_{sex}'],
-                )
+    statistics = pivot_sexes(
+        statistics=unpivot_statistics_by_age_and_sex(df),
+        id_columns=('reference_date', 'age_id'),
+    )
 
-                records.append(obj)
+    records = records_from_frame(StatisticsByAgeAndSexCombined, statistics)
 
-    return records
+    return records + get_stale_combined_records(StatisticsByAgeAndSexCombined, df, records)
 
 
 @transaction.atomic
@@ -377,23 +492,22 @@ def generate_symptoms_records(df: pd.DataFrame) -> list[Symptoms]:
         list[Symptoms]: list of objects to be inserted / updated.
     '''
 
-    symptoms_types = SymptomsType.objects.all()
-
-    records = list()
-    for row in df.to_dict(orient='records'):
-
-        for symptoms_type in symptoms_types.iterator():
-            column = '_'.join(['symptoms'] + symptoms_type.type.split())
+    symptoms_types_ids = {
+        '_'.join(symptoms_type.type.split()): symptoms_type.id
+        for symptoms_type in SYMPTOMS_TYPES.all()
+    }
 
-            obj = Symptoms(
-                reference_date=row['reference_date'],
-                symptoms_type=symptoms_type,
-                quantity=row[column],
-            )
+    symptoms = unpivot_columns(
+        df=df,
+        id_columns=('reference_date',),
+        pattern=r'symptoms_(?P<symptoms_type>.+)',
+        value_name='quantity',
+    )
 
-            records.append(obj)
+    symptoms['symptoms_type_id'] = symptoms.pop(
+        'symptoms_type').map(symptoms_types_ids)
 
-    return records
+    return records_from_frame(Symptoms, symptoms)
 
 
 @transaction.atomic
@@ -408,22 +522,19 @@ def generate_statistics_by_region_records(df: pd.DataFrame) -> list[StatisticsBy
         list[StatisticsByRegion]: list of objects to be inserted / updated.
     '''
 
-    regions = Region.objects.exclude(short_name__in=['national', 'continent'])
-
-    records = list()
-    for row in df.to_dict(orient='records'):
+    regions_ids = {
+        region.short_name: region.id
+        for region in REGIONS_BY_SHORT_NAME.all()
+        if region.short_name not in ('national', 'continent')
+    }
 
-        for region in regions.iterator():
-            region_short_name = region.short_name
+    regions_pattern = '|'.join(re.escape(r) for r in regions_ids.keys())
+    statistics = unpivot_columns(
+        df=df,
+        id_columns=('reference_date',),
+        pattern=rf'(?P<measure>confirmed|deaths|recovered)_(?P<region>{regions_pattern})',
+    )
 
-            obj = StatisticsByRegion(
-                reference_date=row['reference_date'],
-                region=region,
-                confirmed=row[f'confirmed_{region_short_name}'],
-                deaths=row[f'deaths_{region_short_name}'],
-                recovered=row[f'recovered_{region_short_name}'],
-            )
+    statistics['region_id'] = statistics.pop('region').map(regions_ids)
 
-            records.append(obj)
-
-    return records
+    return records_from_frame(StatisticsByRegion, statistics)
@@ -1,10 +1,15 @@
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 from covid_site.etl.data import generate_age_records
-from covid_site.etl.tools import ETLProcessStatus, run_etl
-from covid_site.models import (Age, County, Incidence, IncidenceCategory,
-                               PopulationByAge, Region)
+from covid_site.etl.dimensions import (AGES, COUNTIES_BY_DICOFRE,
+                                       INCIDENCE_CATEGORIES, REGIONS_BY_NAME)
+from covid_site.etl.snapshots import generate_latest_incidence_records
+from covid_site.etl.tools import (ETLProcessStatus, records_from_frame,
+                                  run_etl)
+from covid_site.models import (Age, County, Incidence, LatestIncidence,
+                               PopulationByAge)
 from django.db import transaction
 
 NEW_COLUMN_NAMES = {
@@ -79,7 +84,7 @@ def data_concelhos_new_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
             df=df,
             django_model=PopulationByAge,
             specific_etl_method=generate_population_by_age_records,
-            delete_if_all_none=('people',),
+            drop_if_all_none=True,
         )
 
         run_etl(
@@ -88,6 +93,12 @@ def data_concelhos_new_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
             specific_etl_method=generate_incidence_records,
         )
 
+        run_etl(
+            df=df,
+            django_model=LatestIncidence,
+            specific_etl_method=generate_latest_incidence_records,
+        )
+
         status = ETLProcessStatus(
             succeeded=True,
             message='Tables updated with success.',
@@ -136,8 +147,6 @@ def generate_county_records(df: pd.DataFrame) -> list[County]:
         list[County]: list of objects to be inserted / updated.
     '''
 
-    regions = Region.objects.all()
-
     records = dict()
     for row in df.to_dict(orient='records'):
 
@@ -147,7 +156,7 @@ def generate_county_records(df: pd.DataFrame) -> list[County]:
                 dicofre=row['dicofre'],
                 district=row['district'],
                 county_name=row['county_name'],
-                region=regions.filter(name=row['ars']).first(),
+                region=REGIONS_BY_NAME.get(row['ars']),
                 area=row['area'],
                 population=row['population'],
                 population_density=row['population_density'],
@@ -184,8 +193,6 @@ def generate_population_by_age_records(df: pd.DataFrame) -> list[PopulationByAge
     '''
 
     records = defaultdict(dict)
-    counties = County.objects.all()
-    age_ranges = Age.objects.all()
 
     ages = [
         ('65', '69'),
@@ -199,8 +206,7 @@ def generate_population_by_age_records(df: pd.DataFrame) -> list[PopulationByAge
         ('85', None),
     ]
 
-    ages = [age_ranges.filter(
-        age_start=age[0], age_end=age[1]).first() for age in ages]
+    ages = [AGES.get(*age) for age in ages]
 
     for row in df.to_dict(orient='records'):
 
@@ -212,7 +218,7 @@ def generate_population_by_age_records(df: pd.DataFrame) -> list[PopulationByAge
 
                 obj = PopulationByAge(
                     age=age,
-                    county=counties.filter(dicofre=row['dicofre']).first(),
+                    county=COUNTIES_BY_DICOFRE.get(row['dicofre']),
                     people=row[f'population_{col_filter}'],
                 )
 
@@ -230,10 +236,45 @@ def generate_population_by_age_records(df: pd.DataFrame) -> list[PopulationByAge
     return filtered_records
 
 
+def classify_incidence(incidence: pd.Series) -> pd.Series:
+    '''Classifies the incidence values into the incidence categories, picking
+        the category with the highest lower limit below each value. The values
+        above the upper limit of the highest category are kept in it.
+
+    Args:
+        incidence (pd.Series): the incidence values.
+
+    Returns:
+        pd.Series: the id of the category of each value. Missing values, and
+            the ones below the lowest category, have no category.
+    '''
+
+    categories = sorted(
+        INCIDENCE_CATEGORIES.all(),
+        key=lambda c: c.category_lower_limit,
+    )
+
+    if not categories:
+        raise ValueError('There are no incidence categories to classify the incidence.')
+
+    lower_limits = np.array([c.category_lower_limit for c in categories])
+    categories_ids = np.array([c.id for c in categories])
+
+    values = pd.to_numeric(incidence, errors='coerce').to_numpy(dtype=float)
+    positions = np.searchsorted(lower_limits, values, side='right') - 1
+
+    in_range = ~np.isnan(values) & (positions >= 0)
+
+    incidence_category = pd.Series(pd.NA, index=incidence.index, dtype='Int64')
+    incidence_category[in_range] = categories_ids[positions[in_range]]
+
+    return incidence_category
+
+
 @transaction.atomic
 def generate_incidence_records(df: pd.DataFrame) -> list[Incidence]:
     '''Generates records for the Incidence table according to the provided
-        DataFrame.
+        DataFrame. The rows whose incidence has no category are skipped.
 
     Args:
         df (pd.DataFrame): the DataFrame from which to extract the data.
@@ -242,26 +283,25 @@ def generate_incidence_records(df: pd.DataFrame) -> list[Incidence]:
         list[Incidence]: list of objects to be inserted / updated.
     '''
 
-    counties = County.objects.all()
-    categories = IncidenceCategory.objects.all()
+    incidence = df[[
+        'reference_date',
+        'incidence',
+        'cases_14',
+        'confirmed_1',
+        'confirmed_14',
+    ]].copy()
 
-    records = list()
-    for row in df.to_dict(orient='records'):
+    incidence['incidence_category_id'] = classify_incidence(df['incidence'])
 
-        category = categories.filter(
-            category_lower_limit__lte=row['incidence'],
-        ).order_by('-category_lower_limit').first()
-
-        obj = Incidence(
-            reference_date=row['reference_date'],
-            county=counties.filter(dicofre=row['dicofre']).first(),
-            incidence_category=category,
-            incidence=row['incidence'],
-            cases_14=row['cases_14'],
-            confirmed_1=row['confirmed_1'],
-            confirmed_14=row['confirmed_14'],
-        )
+    counties_ids = {
+        dicofre: COUNTIES_BY_DICOFRE.get(dicofre).id
+        for dicofre in df['dicofre'].unique()
+    }
+    incidence['county_id'] = df['dicofre'].map(counties_ids)
 
-        records.append(obj)
+    unclassified = incidence['incidence_category_id'].isna()
+    if unclassified.any():
+        print(f'Skipping {unclassified.sum()} rows whose incidence has no category.')
+        incidence = incidence[~unclassified]
 
-    return records
+    return records_from_frame(Incidence, incidence)
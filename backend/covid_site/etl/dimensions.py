@@ -0,0 +1,137 @@
+import threading
+import unicodedata
+from typing import Callable
+
+from covid_site.etl.tools import normalize_values
+from covid_site.models import (Age, County, IncidenceCategory, Region,
+                               SymptomsType)
+from covid_site.signals import table_updated
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def normalize_name(name: str) -> str:
+    '''Normalizes a name the way the case and accent insensitive collation of
+        the database compares them, e.g. "Açores" and "ACORES" are the same.
+
+    Args:
+        name (str): the name to normalize.
+
+    Returns:
+        str: the normalized name.
+    '''
+
+    decomposed = unicodedata.normalize('NFKD', name)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().rstrip()
+
+
+class DimensionCache:
+    '''In-process index of a small dimension table by its natural key, used to
+        avoid querying the table for every row during the ETL processes. The
+        table is loaded once, on the first lookup, and loaded again after it
+        is written.'''
+
+    def __init__(
+        self,
+        django_model: models.Model,
+        key_columns: tuple[str],
+        normalize: Callable = None,
+    ):
+        '''The constructor of the class.
+
+        Args:
+            django_model (models.Model): the model of the dimension table.
+            key_columns (tuple[str]): the fields used as key of the index.
+            normalize (Callable, optional): the method to apply to the string
+                values of the key. Defaults to None.
+        '''
+
+        self.django_model = django_model
+        self.key_fields = tuple(django_model._meta.get_field(c) for c in key_columns)
+        self.normalize = normalize
+        self._lock = threading.Lock()
+        self._index = None
+
+    def get_key(self, values: tuple) -> tuple:
+        '''Builds the key of the index from the raw values of the key fields.'''
+
+        key = normalize_values(self.key_fields, values)
+        if self.normalize is not None:
+            key = tuple(self.normalize(v) if isinstance(v, str) else v for v in key)
+
+        return key
+
+    def get_index(self) -> dict[tuple, models.Model]:
+        '''Returns the index of the table, loading it if needed.'''
+
+        with self._lock:
+            if self._index is None:
+                self._index = {
+                    self.get_key(tuple(getattr(obj, f.attname) for f in self.key_fields)): obj
+                    for obj in self.django_model.objects.all()
+                }
+
+            return self._index
+
+    def get(self, *values) -> models.Model:
+        '''Returns the record with the provided key values, or None.'''
+
+        return self.get_index().get(self.get_key(values))
+
+    def all(self) -> list[models.Model]:
+        '''Returns all the records of the table.'''
+
+        return list(self.get_index().values())
+
+    def invalidate(self) -> None:
+        '''Drops the index, so that it's loaded again on the next lookup.'''
+
+        with self._lock:
+            self._index = None
+
+
+AGES = DimensionCache(Age, ('age_start', 'age_end'))
+COUNTIES_BY_DICOFRE = DimensionCache(County, ('dicofre',))
+COUNTIES_BY_NAME = DimensionCache(County, ('county_name',), normalize_name)
+INCIDENCE_CATEGORIES = DimensionCache(IncidenceCategory, ('category_lower_limit',))
+REGIONS_BY_NAME = DimensionCache(Region, ('name',), normalize_name)
+REGIONS_BY_SHORT_NAME = DimensionCache(Region, ('short_name',))
+SYMPTOMS_TYPES = DimensionCache(SymptomsType, ('type',))
+
+DIMENSION_CACHES = (
+    AGES,
+    COUNTIES_BY_DICOFRE,
+    COUNTIES_BY_NAME,
+    INCIDENCE_CATEGORIES,
+    REGIONS_BY_NAME,
+    REGIONS_BY_SHORT_NAME,
+    SYMPTOMS_TYPES,
+)
+
+
+def clear_dimension_caches() -> None:
+    '''Drops all the indexes, e.g. before an ETL run or after a rollback.'''
+
+    for cache in DIMENSION_CACHES:
+        cache.invalidate()
+
+
+@receiver(table_updated)
+@receiver(post_save, sender=Age)
+@receiver(post_delete, sender=Age)
+@receiver(post_save, sender=County)
+@receiver(post_delete, sender=County)
+@receiver(post_save, sender=IncidenceCategory)
+@receiver(post_delete, sender=IncidenceCategory)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=SymptomsType)
+@receiver(post_delete, sender=SymptomsType)
+def invalidate_dimension_caches(sender: models.Model, **kwargs) -> None:
+    '''Drops the indexes of a dimension table once it's written, either by the
+        ETL processes or by django admin.'''
+
+    for cache in DIMENSION_CACHES:
+        if cache.django_model is sender:
+            cache.invalidate()
@@ -0,0 +1,145 @@
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+from covid_site.etl.amostras import amostras_csv_etl
+from covid_site.etl.dados_sico import dados_sico_csv_etl
+from covid_site.etl.dimensions import clear_dimension_caches
+from covid_site.etl.data import data_csv_etl
+from covid_site.etl.data_concelhos_new import data_concelhos_new_csv_etl
+from covid_site.etl.rt import rt_csv_etl
+from covid_site.etl.tools import ETLProcessStatus
+from covid_site.etl.vacinas import vacinas_csv_etl
+from covid_site.partitions import maintain_partitions
+from covid_site.routers import use_primary
+from django.conf import settings
+from django.db import transaction
+
+# The list of acceptable files on the CSV import functionality
+ACCEPTABLE_FILES = [
+    'amostras.csv',
+    'data_concelhos_new.csv',
+    'data.csv',
+    'rt.csv',
+    'vacinas.csv',
+    # Actually for SICO files the pattern needs to match, not the whole name
+    'Dados_SICO.csv'
+]
+
+CSV_ETL_METHODS = {
+    'amostras': amostras_csv_etl,
+    'data_concelhos_new': data_concelhos_new_csv_etl,
+    'data': data_csv_etl,
+    'rt': rt_csv_etl,
+    'vacinas': vacinas_csv_etl,
+}
+
+
+def is_acceptable_file(file_name: str) -> bool:
+    '''Checks if the file name matches any mapped source file.'''
+
+    return file_name in ACCEPTABLE_FILES or 'Dados_SICO' in file_name
+
+
+def get_csv_etl_method(file_name: str) -> Callable:
+    '''Returns the ETL method to use for the provided file name.
+
+    Args:
+        file_name (str): the name of the uploaded file.
+
+    Returns:
+        Callable: the ETL method of the file.
+    '''
+
+    file_name = file_name.split('.')[0]
+
+    if 'Dados_SICO' in file_name:
+        return dados_sico_csv_etl
+
+    return CSV_ETL_METHODS[file_name]
+
+
+def read_csv_chunks(csv_file: object, chunk_size: int) -> Iterator[pd.DataFrame]:
+    '''Reads the CSV file in chunks of fixed size, converting the missing
+        values of each chunk to None.
+
+    Args:
+        csv_file (object): the path or file-like object of the CSV file.
+        chunk_size (int): the amount of rows of each chunk.
+
+    Yields:
+        Iterator[pd.DataFrame]: the chunks of the file.
+    '''
+
+    for chunk in pd.read_csv(csv_file, delimiter=',', chunksize=chunk_size):
+        yield chunk.fillna(np.nan).replace([np.nan], [None])
+
+
+@use_primary()
+def ingest_csv(
+    csv_file: object,
+    file_name: str,
+    chunk_size: int = None,
+    start_chunk: int = 0,
+    start_rows: int = 0,
+    on_chunk: Callable = None,
+) -> ETLProcessStatus:
+    '''Runs the ETL process of the file chunk by chunk, so that the memory used
+        is bounded by the chunk size. Each chunk is committed on its own, so a
+        failed import can be resumed from the first chunk not committed. The
+        reads go to the primary database, so that each chunk is compared with
+        the records written by the previous ones.
+
+    Args:
+        csv_file (object): the path or file-like object of the CSV file.
+        file_name (str): the name of the uploaded file.
+        chunk_size (int, optional): the amount of rows of each chunk. Defaults
+            to None - uses the ETL_CHUNK_SIZE setting.
+        start_chunk (int, optional): the amount of chunks to skip, already
+            committed by a previous run. Defaults to 0.
+        start_rows (int, optional): the amount of rows of the skipped chunks.
+            Defaults to 0.
+        on_chunk (Callable, optional): the method to call with the amount of
+            chunks and rows committed, after each commit. Defaults to None.
+
+    Returns:
+        ETLProcessStatus: the status of the ETL process, containing the error
+            (if any).
+    '''
+
+    etl_method = get_csv_etl_method(file_name)
+    chunk_size = chunk_size or settings.ETL_CHUNK_SIZE
+
+    # The partitions of the new dates are added before the first transaction,
+    # since adding them commits it
+    maintain_partitions()
+
+    # The dimension tables may have been changed by another process
+    clear_dimension_caches()
+
+    rows = start_rows
+    for i, chunk in enumerate(read_csv_chunks(csv_file, chunk_size)):
+        if i < start_chunk:
+            continue
+
+        print(f'Starting chunk {i} of {file_name} ({len(chunk)} rows)..')
+
+        with transaction.atomic():
+            status = etl_method(df=chunk)
+
+            if not status.succeeded:
+                transaction.set_rollback(True)
+
+        if not status.succeeded:
+            # The indexes may have records that were rolled back
+            clear_dimension_caches()
+            return status
+
+        rows += len(chunk)
+        if on_chunk is not None:
+            on_chunk(i + 1, rows)
+
+    return ETLProcessStatus(
+        succeeded=True,
+        message='Tables updated with success.',
+    )
@@ -0,0 +1,213 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from covid_site.etl.ingest import ingest_csv
+from covid_site.models import ImportJob
+from covid_site.signals import table_updated
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+
+def enqueue_import(csv_file: object) -> ImportJob:
+    '''Persists the uploaded file to the local disk and creates the import job
+        that will be picked up by the workers.
+
+    Args:
+        csv_file (object): the file uploaded on django admin.
+
+    Returns:
+        ImportJob: the job created.
+    '''
+
+    upload_dir = Path(settings.ETL_UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+
+    file_path = upload_dir / f'{uuid.uuid4().hex}_{Path(csv_file.name).name}'
+    with open(file_path, 'wb') as f:
+        for data in csv_file.chunks():
+            f.write(data)
+
+    return ImportJob.objects.create(
+        file_name=csv_file.name,
+        file_path=str(file_path),
+    )
+
+
+def claim_next_job() -> ImportJob:
+    '''Claims the oldest pending job. The claim is a conditional update, so
+        only one worker gets each job.
+
+    Returns:
+        ImportJob: the job claimed, or None if there are no pending jobs.
+    '''
+
+    pending_ids = ImportJob.objects.\
+        filter(status=ImportJob.PENDING).\
+        order_by('id').\
+        values_list('id', flat=True)[:10]
+
+    for job_id in pending_ids:
+        claimed = ImportJob.objects.\
+            filter(id=job_id, status=ImportJob.PENDING).\
+            update(status=ImportJob.RUNNING, started_date=timezone.now())
+
+        if claimed:
+            return ImportJob.objects.get(id=job_id)
+
+    return None
+
+
+def requeue_jobs(queryset: QuerySet) -> int:
+    '''Puts the failed jobs back in the queue, and the running ones started
+        more than ETL_JOB_TIMEOUT seconds ago, whose workers are assumed to
+        have died. They resume from the first chunk not committed.
+
+    Args:
+        queryset (QuerySet): the jobs to requeue.
+
+    Returns:
+        int: the amount of jobs requeued.
+    '''
+
+    timeout_date = timezone.now() - timedelta(seconds=settings.ETL_JOB_TIMEOUT)
+
+    return queryset.\
+        filter(Q(status=ImportJob.FAILED) | Q(status=ImportJob.RUNNING, started_date__lt=timeout_date)).\
+        update(
+            status=ImportJob.PENDING,
+            message='',
+            started_date=None,
+            finished_date=None,
+            updated_date=timezone.now(),
+        )
+
+
+def merge_table_stats(table_stats: dict, new_stats: dict) -> dict:
+    '''Adds the amounts of the new table statistics to the existing ones.'''
+
+    for table_name, stats in new_stats.items():
+        table = table_stats.setdefault(table_name, dict())
+        for k, v in stats.items():
+            table[k] = table.get(k, 0) + v
+
+    return table_stats
+
+
+def run_job(job: ImportJob) -> None:
+    '''Runs the ETL process of the job, resuming from the first chunk not
+        committed, and keeps its progress and statistics up to date.
+
+    Args:
+        job (ImportJob): the job to run.
+    '''
+
+    print(f'Starting {job}..')
+
+    # The statistics of the chunk being processed, only kept once committed
+    lock = threading.Lock()
+    chunk_stats = dict()
+
+    def on_table_updated(sender, result, seconds, **kwargs):
+        with lock:
+            merge_table_stats(
+                chunk_stats,
+                {sender._meta.db_table: dict(result, seconds=seconds)},
+            )
+
+    def on_chunk(chunks: int, rows: int):
+        with lock:
+            merge_table_stats(job.table_stats, chunk_stats)
+            chunk_stats.clear()
+
+        job.chunks_done = chunks
+        job.rows_done = rows
+        ImportJob.objects.filter(id=job.id).update(
+            chunks_done=job.chunks_done,
+            rows_done=job.rows_done,
+            table_stats=job.table_stats,
+            updated_date=timezone.now(),
+        )
+
+    table_updated.connect(on_table_updated, weak=False)
+
+    try:
+        status = ingest_csv(
+            csv_file=job.file_path,
+            file_name=job.file_name,
+            start_chunk=job.chunks_done,
+            start_rows=job.rows_done,
+            on_chunk=on_chunk,
+        )
+    except Exception as e:
+        print(e)
+        job.status = ImportJob.FAILED
+        job.message = str(e)
+    else:
+        if status.succeeded:
+            job.status = ImportJob.SUCCEEDED
+            job.message = status.message
+            Path(job.file_path).unlink(missing_ok=True)
+        else:
+            job.status = ImportJob.FAILED
+            job.message = str(status.exception)
+    finally:
+        table_updated.disconnect(on_table_updated)
+
+    job.finished_date = timezone.now()
+    job.save(update_fields=('status', 'message', 'finished_date', 'updated_date'))
+
+    print(f'Finished {job}: {job.status}.')
+
+
+def work(poll_interval: float) -> None:
+    '''Keeps claiming and running the pending jobs, waiting for new ones when
+        there are none.
+
+    Args:
+        poll_interval (float): the seconds to wait between checks for new jobs.
+    '''
+
+    # The connections inherited from the parent process can't be shared
+    connections.close_all()
+
+    while True:
+        job = claim_next_job()
+
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+
+
+def run_workers(processes: int, poll_interval: float) -> None:
+    '''Starts the pool of worker processes and waits for them.
+
+    Args:
+        processes (int): the amount of worker processes.
+        poll_interval (float): the seconds to wait between checks for new jobs.
+    '''
+
+    if processes <= 1:
+        work(poll_interval)
+        return
+
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    workers = [
+        context.Process(target=work, args=(poll_interval,), daemon=True)
+        for _ in range(processes)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
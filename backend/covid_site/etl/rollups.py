@@ -0,0 +1,155 @@
+from datetime import date
+
+import pandas as pd
+from covid_site.etl.tools import get_stale_records
+from covid_site.models import (CountyYearDeaths, RegionDeathsSince,
+                               RegionYearDeaths, StatisticsByRegion,
+                               TotalDeaths)
+from django.db import models, transaction
+from django.db.models import Min, Sum
+
+
+def sum_deaths(key: str, **filters) -> dict[int, int]:
+    '''Sums the deaths of the Total Deaths table by the provided key, e.g. the
+        county or its region, only on the rows that match the filters.'''
+
+    deaths = TotalDeaths.objects.\
+        filter(**filters).\
+        values_list(key).\
+        annotate(Sum('deaths')).\
+        order_by()
+
+    return dict(deaths)
+
+
+def get_year_deaths_records(
+    django_model: models.Model,
+    key: str,
+    field: str,
+    years: list[int],
+) -> list[models.Model]:
+    '''Builds the yearly totals of the deaths of each key, reading only the
+        weeks of the provided years. The weeks never cross the turn of the
+        year, so each week is counted in the year of its first day. The
+        stored totals of the years that are no longer produced are returned
+        empty, to be deleted.
+
+    Args:
+        django_model (models.Model): the model of the totals.
+        key (str): the lookup of the key on the Total Deaths table, e.g.
+            "county__region_id".
+        field (str): the field of the key on the model, e.g. "region_id".
+        years (list[int]): the years to sum.
+
+    Returns:
+        list[models.Model]: list of objects to be inserted / updated.
+    '''
+
+    records = list()
+    for year in years:
+        deaths = sum_deaths(
+            key=key,
+            date_start__range=(date(year, 1, 1), date(year, 12, 31)),
+        )
+
+        year_records = [
+            django_model(**{field: k}, year=year, deaths=v)
+            for k, v in deaths.items()
+        ]
+
+        records.extend(year_records)
+        records.extend(get_stale_records(django_model, year_records, year=year))
+
+    return records
+
+
+@transaction.atomic
+def generate_county_year_deaths_records(df: pd.DataFrame, years: list[int]) -> list[CountyYearDeaths]:
+    '''Generates records for the County Year Deaths table, with the deaths of
+        each county on each of the provided years.
+
+    Args:
+        df (pd.DataFrame): the DataFrame that was imported.
+        years (list[int]): the years to sum.
+
+    Returns:
+        list[CountyYearDeaths]: list of objects to be inserted / updated.
+    '''
+
+    return get_year_deaths_records(
+        django_model=CountyYearDeaths,
+        key='county_id',
+        field='county_id',
+        years=years,
+    )
+
+
+@transaction.atomic
+def generate_region_year_deaths_records(df: pd.DataFrame, years: list[int]) -> list[RegionYearDeaths]:
+    '''Generates records for the Region Year Deaths table, with the deaths of
+        each region on each of the provided years.
+
+    Args:
+        df (pd.DataFrame): the DataFrame that was imported.
+        years (list[int]): the years to sum.
+
+    Returns:
+        list[RegionYearDeaths]: list of objects to be inserted / updated.
+    '''
+
+    return get_year_deaths_records(
+        django_model=RegionYearDeaths,
+        key='county__region_id',
+        field='region_id',
+        years=years,
+    )
+
+
+@transaction.atomic
+def generate_region_deaths_since_records(df: pd.DataFrame) -> list[RegionDeathsSince]:
+    '''Generates records for the Region Deaths Since table, with the deaths of
+        each region since the first day of the Statistics by Region table. It
+        depends on both tables, so it's refreshed by the ETL process of each,
+        after the Region Year Deaths table: the totals of the years after the
+        first day are read from it, and only the weeks of the year of the
+        first day from the Total Deaths table. The stored totals of the
+        regions that are no longer produced are returned empty, to be deleted.
+
+    Args:
+        df (pd.DataFrame): the DataFrame that was imported.
+
+    Returns:
+        list[RegionDeathsSince]: list of objects to be inserted / updated.
+    '''
+
+    date_start = StatisticsByRegion.objects.\
+        aggregate(Min('reference_date'))['reference_date__min']
+
+    if date_start is None:
+        return get_stale_records(RegionDeathsSince, list())
+
+    deaths = sum_deaths(
+        key='county__region_id',
+        date_start__range=(date_start, date(date_start.year, 12, 31)),
+    )
+
+    year_deaths = RegionYearDeaths.objects.\
+        filter(year__gt=date_start.year).\
+        values_list('region_id').\
+        annotate(Sum('deaths')).\
+        order_by()
+
+    for region_id, region_deaths in year_deaths:
+        deaths[region_id] = deaths.get(region_id, 0) + region_deaths
+
+    records = list()
+    for region_id, region_deaths in deaths.items():
+        obj = RegionDeathsSince(
+            region_id=region_id,
+            date_start=date_start,
+            deaths=region_deaths,
+        )
+
+        records.append(obj)
+
+    return records + get_stale_records(RegionDeathsSince, records)
@@ -1,6 +1,7 @@
 import pandas as pd
+from covid_site.etl.dimensions import REGIONS_BY_SHORT_NAME
 from covid_site.etl.tools import ETLProcessStatus, run_etl
-from covid_site.models import Region, TransmissionRisk
+from covid_site.models import TransmissionRisk
 from django.db import transaction
 
 NEW_COLUMN_NAMES = {
@@ -59,11 +60,7 @@ def rt_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
             df=df,
             django_model=TransmissionRisk,
             specific_etl_method=generate_transmission_risk_records,
-            delete_if_all_none=(
-                'transmission_risk',
-                'limit_lower',
-                'limit_upper'
-            ),
+            drop_if_all_none=True,
         )
 
         status = ETLProcessStatus(
@@ -94,12 +91,12 @@ def generate_transmission_risk_records(df: pd.DataFrame) -> list[TransmissionRis
         list[TransmissionRisk]: list of objects to be inserted / updated.
     '''
 
-    regions = Region.objects.all()
+    regions = REGIONS_BY_SHORT_NAME.all()
 
     records = list()
     for row in df.to_dict(orient='records'):
 
-        for region in regions.iterator():
+        for region in regions:
             region_short_name = region.short_name
 
             if region_short_name not in ('foreign',):
@@ -0,0 +1,156 @@
+from collections import defaultdict
+
+import pandas as pd
+from covid_site.models import (Incidence, LatestIncidence,
+                               LatestStatisticsByRegion, StatisticsByRegion)
+from covid_site.partitions import get_latest_date
+from django.db import models, transaction
+from django.db.models import Max
+
+
+def get_latest_rows(
+    df: pd.DataFrame,
+    source_model: models.Model,
+    snapshot_model: models.Model,
+    key: str,
+    fields: tuple[str],
+) -> list[dict]:
+    '''Returns the latest row of each key whose latest row may have changed
+        with the import of the DataFrame, i.e. the keys with rows in its range
+        of dates, leaving out the ones whose snapshot is already newer. Only
+        that range of the source table is read, never its whole history.
+
+    Args:
+        df (pd.DataFrame): the DataFrame that was imported.
+        source_model (models.Model): the model with the history of each key.
+        snapshot_model (models.Model): the model with the latest row of each
+            key.
+        key (str): the field of the key, e.g. "county".
+        fields (tuple[str]): the fields of the source model to read.
+
+    Returns:
+        list[dict]: the values of the latest row of each key.
+    '''
+
+    dates = df['reference_date'].dt.date
+    date_range = (dates.min(), dates.max())
+    key_attname = source_model._meta.get_field(key).attname
+
+    latest_dates = dict(
+        source_model.objects.
+        filter(reference_date__range=date_range).
+        values_list(key_attname).
+        annotate(Max('reference_date')).
+        order_by()
+    )
+
+    # The snapshots in the range whose rows were all removed go back to the
+    # latest row before the range
+    missing_keys = snapshot_model.objects.\
+        filter(reference_date__range=date_range).\
+        exclude(**{f'{key_attname}__in': latest_dates.keys()}).\
+        values_list(key_attname, flat=True)
+
+    for missing_key in missing_keys:
+        latest_date = get_latest_date(source_model, **{key_attname: missing_key})
+
+        if latest_date is not None:
+            latest_dates[missing_key] = latest_date
+
+    newer_keys = snapshot_model.objects.\
+        filter(reference_date__gt=date_range[1]).\
+        values_list(key_attname, flat=True)
+
+    for newer_key in newer_keys:
+        latest_dates.pop(newer_key, None)
+
+    # Most of the keys share the same latest date, so the rows are read with a
+    # query per date
+    keys_by_date = defaultdict(list)
+    for k, latest_date in latest_dates.items():
+        keys_by_date[latest_date].append(k)
+
+    rows = list()
+    for latest_date, keys in keys_by_date.items():
+        rows.extend(
+            source_model.objects.
+            filter(reference_date=latest_date, **{f'{key_attname}__in': keys}).
+            values(key_attname, 'reference_date', *fields)
+        )
+
+    return rows
+
+
+@transaction.atomic
+def generate_latest_incidence_records(df: pd.DataFrame) -> list[LatestIncidence]:
+    '''Generates records for the Latest Incidence table, with the latest row of
+        the Incidence table of each county, according to the provided
+        DataFrame.
+
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+
+    Returns:
+        list[LatestIncidence]: list of objects to be inserted / updated.
+    '''
+
+    rows = get_latest_rows(
+        df=df,
+        source_model=Incidence,
+        snapshot_model=LatestIncidence,
+        key='county',
+        fields=(
+            'incidence_category_id',
+            'incidence',
+            'cases_14',
+            'confirmed_1',
+            'confirmed_14',
+        ),
+    )
+
+    return [LatestIncidence(**row) for row in rows]
+
+
+@transaction.atomic
+def generate_latest_statistics_by_region_records(df: pd.DataFrame) -> list[LatestStatisticsByRegion]:
+    '''Generates records for the Latest Statistics by Region table, with the
+        latest row of the Statistics by Region table of each region, according
+        to the provided DataFrame.
+
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+
+    Returns:
+        list[LatestStatisticsByRegion]: list of objects to be inserted /
+            updated.
+    '''
+
+    rows = get_latest_rows(
+        df=df,
+        source_model=StatisticsByRegion,
+        snapshot_model=LatestStatisticsByRegion,
+        key='region',
+        fields=(
+            'confirmed',
+            'deaths',
+            'recovered',
+            'inserted_date',
+            'updated_date',
+        ),
+    )
+
+    records = list()
+    for row in rows:
+        obj = LatestStatisticsByRegion(
+            region_id=row['region_id'],
+            reference_date=row['reference_date'],
+            confirmed=row['confirmed'],
+            deaths=row['deaths'],
+            recovered=row['recovered'],
+            source_inserted_date=row['inserted_date'],
+            source_updated_date=row['updated_date'],
+        )
+
+        records.append(obj)
+
+    return records
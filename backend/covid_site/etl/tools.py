@@ -1,8 +1,13 @@
+import re
 import time
 from typing import Callable
 
 import pandas as pd
+from covid_site.partitions import get_partition_filter
+from covid_site.signals import table_updated
 from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 
 
 class ETLProcessStatus:
@@ -12,6 +17,23 @@ class ETLProcessStatus:
         self.exception = exception
 
 
+class ETLStage:
+    def __init__(
+        self,
+        django_model: models.Model,
+        specific_etl_method: Callable,
+        drop_if_all_none: bool = False,
+        depends_on: tuple[models.Model] = tuple(),
+    ):
+        '''A step of an ETL graph, with the arguments of run_etl and the models
+            whose stages must run before this one.'''
+
+        self.django_model = django_model
+        self.specific_etl_method = specific_etl_method
+        self.drop_if_all_none = drop_if_all_none
+        self.depends_on = depends_on
+
+
 def fields_to_dict(django_model_instance: object):
     '''Returns a dictionary of the fields in the given model instance.'''
 
@@ -37,85 +59,461 @@ def get_table_cols(django_model: models.Model):
     return (f.name for f in django_model._meta.fields if f.name not in columns_to_ignore)
 
 
+def unpivot_columns(
+        df: pd.DataFrame,
+        id_columns: tuple[str],
+        pattern: str,
+        value_name: str = 'value',
+) -> pd.DataFrame:
+    '''Reshapes the columns whose names fully match the regex pattern from the
+        wide to the long format. Every named group of the pattern becomes a
+        column of the result, except for the "measure" group, whose values
+        become the value columns. If the pattern has no "measure" group, the
+        values are kept in a single column named after value_name.
+
+    Args:
+        df (pd.DataFrame): the DataFrame to reshape.
+        id_columns (tuple[str]): the columns that identify each row.
+        pattern (str): the regex pattern with named groups to match the columns.
+        value_name (str, optional): the name of the value column when the
+            pattern has no "measure" group. Defaults to 'value'.
+
+    Returns:
+        pd.DataFrame: the reshaped DataFrame.
+    '''
+
+    regex = re.compile(pattern)
+
+    matched_columns = dict()
+    for c in df.columns:
+        match = regex.fullmatch(c)
+        if match:
+            matched_columns[c] = match.groupdict()
+
+    groups = pd.DataFrame(matched_columns.values())
+    wide_df = df.set_index(list(id_columns))[list(matched_columns.keys())]
+
+    if len(groups.columns) > 1:
+        wide_df.columns = pd.MultiIndex.from_frame(groups)
+    else:
+        wide_df.columns = pd.Index(groups.iloc[:, 0], name=groups.columns[0])
+
+    levels = [n for n in wide_df.columns.names if n != 'measure']
+    long_df = wide_df.stack(level=levels, dropna=False)
+
+    if isinstance(long_df, pd.Series):
+        long_df = long_df.rename(value_name)
+    else:
+        long_df.columns.name = None
+
+    return long_df.reset_index()
+
+
+def records_from_frame(django_model: models.Model, df: pd.DataFrame) -> list[object]:
+    '''Builds the model instances from the rows of the DataFrame, whose columns
+        must be named after the fields (or their attnames) of the model. Missing
+        values are converted to None.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        df (pd.DataFrame): the DataFrame with the values of the records.
+
+    Returns:
+        list[object]: list of objects to be inserted / updated.
+    '''
+
+    df = df.astype(object).where(df.notna(), None)
+    return [django_model(**row) for row in df.to_dict(orient='records')]
+
+
+def get_filter_fields(django_model: models.Model) -> tuple[models.Field]:
+    '''Returns the fields used as filter on the ETL process for the given model.'''
+
+    return tuple(django_model._meta.get_field(c) for c in django_model.filter_columns())
+
+
+def get_update_fields(django_model: models.Model) -> tuple[models.Field]:
+    '''Returns the fields to update in the given model.'''
+
+    return tuple(django_model._meta.get_field(c) for c in get_cols_to_update(django_model))
+
+
+def normalize_values(fields: tuple[models.Field], values: tuple) -> tuple:
+    '''Converts each value to the Python type of the corresponding field, so
+        that the values of the provided records can be compared with the ones
+        loaded from the database.
+
+    Args:
+        fields (tuple[models.Field]): the fields of the values.
+        values (tuple): the raw values of the fields.
+
+    Returns:
+        tuple: the normalized values.
+    '''
+
+    return tuple(
+        None if v is None else f.to_python(v)
+        for f, v in zip(fields, values)
+    )
+
+
+def get_keys_filter(filter_fields: tuple[models.Field], keys: list[tuple], max_values: int) -> Q:
+    '''Builds the filter of the columns of the natural keys other than the
+        first one, so that the rows of the first values that don't match the
+        keys are left out, e.g. the history of a county: the range of the date
+        columns, and the values of the other ones, unless there are more than
+        max_values of them.
+
+    Args:
+        filter_fields (tuple[models.Field]): the fields of the natural keys.
+        keys (list[tuple]): the natural keys to look for.
+        max_values (int): the maximum amount of values of a column to filter.
+
+    Returns:
+        Q: the filter of the columns.
+    '''
+
+    query = Q()
+    for i, field in enumerate(filter_fields[1:], start=1):
+        values = {k[i] for k in keys}
+        not_null_values = [v for v in values if v is not None]
+
+        if not not_null_values:
+            column_query = Q(**{f'{field.attname}__isnull': True})
+        elif isinstance(field, models.DateField):
+            column_query = Q(**{f'{field.attname}__range': (min(not_null_values), max(not_null_values))})
+        elif len(not_null_values) <= max_values:
+            column_query = Q(**{f'{field.attname}__in': not_null_values})
+        else:
+            continue
+
+        if None in values and not_null_values:
+            column_query |= Q(**{f'{field.attname}__isnull': True})
+
+        query &= column_query
+
+    return query
+
+
+def get_existing_records(
+        django_model: models.Model,
+        keys: set[tuple],
+        batch_size: int = 1000,
+) -> dict[tuple, tuple]:
+    '''Loads the stored records that match the provided natural keys. Instead
+        of one query per record, it runs one query per batch of distinct values
+        of the first filter column, narrowed by the other filter columns.
+
+    Args:
+        django_model (models.Model): the model to query.
+        keys (set[tuple]): the natural keys to look for.
+        batch_size (int, optional): the amount of distinct values to use on
+            each query. Defaults to 1000.
+
+    Returns:
+        dict[tuple, tuple]: the index of the existing records, from natural
+            key to a tuple with the id and the normalized values of the
+            columns to update.
+    '''
+
+    filter_fields = get_filter_fields(django_model)
+    update_fields = get_update_fields(django_model)
+    filter_attnames = tuple(f.attname for f in filter_fields)
+    update_attnames = tuple(f.attname for f in update_fields)
+
+    keys_by_first_value = dict()
+    for k in keys:
+        keys_by_first_value.setdefault(k[0], list()).append(k)
+    first_values = list(keys_by_first_value.keys())
+
+    index = dict()
+    for i in range(0, len(first_values), batch_size):
+        batch = first_values[i:i + batch_size]
+
+        query = Q(**{f'{filter_attnames[0]}__in': [v for v in batch if v is not None]})
+        if None in batch:
+            query |= Q(**{f'{filter_attnames[0]}__isnull': True})
+
+        # The date range of the keys also limits the reads to their partitions
+        batch_keys = [k for v in batch for k in keys_by_first_value[v]]
+        query &= get_keys_filter(filter_fields, batch_keys, batch_size)
+
+        rows = django_model.objects.\
+            filter(query).\
+            values_list('id', *filter_attnames, *update_attnames)
+
+        for row in rows.iterator(chunk_size=batch_size):
+            key = normalize_values(filter_fields, row[1:len(filter_fields) + 1])
+            if key in keys:
+                values = normalize_values(update_fields, row[len(filter_fields) + 1:])
+                index[key] = (row[0], values)
+
+    return index
+
+
+def classify_records(
+        django_model: models.Model,
+        records: list[object],
+        batch_size: int = 1000,
+) -> tuple[list[dict], list[dict], list[dict]]:
+    '''Compares the provided records with the stored ones, column by column,
+        and splits them into new, changed and unchanged records.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        records (list[object]): the list of records to classify.
+        batch_size (int, optional): the amount of distinct values to use on
+            each query to the database. Defaults to 1000.
+
+    Returns:
+        tuple[list[dict], list[dict], list[dict]]: the new, changed and
+            unchanged records, as dictionaries of fields. The changed and the
+            unchanged ones have the id of the stored record.
+    '''
+
+    filter_fields = get_filter_fields(django_model)
+    update_fields = get_update_fields(django_model)
+
+    # If the same key shows up more than once, the last record wins
+    records_by_key = dict()
+    for obj in records:
+        dict_object = fields_to_dict(obj)
+        key = normalize_values(
+            filter_fields,
+            tuple(dict_object[f.attname] for f in filter_fields),
+        )
+        records_by_key[key] = dict_object
+
+    existing_records = get_existing_records(
+        django_model=django_model,
+        keys=set(records_by_key.keys()),
+        batch_size=batch_size,
+    )
+
+    new_records = []
+    changed_records = []
+    unchanged_records = []
+
+    for key, dict_object in records_by_key.items():
+        if key not in existing_records:
+            dict_object.pop('id')
+            new_records.append(dict_object)
+            continue
+
+        stored_id, stored_values = existing_records[key]
+        dict_object['id'] = stored_id
+
+        values = normalize_values(
+            update_fields,
+            tuple(dict_object[f.attname] for f in update_fields),
+        )
+
+        if values == stored_values:
+            unchanged_records.append(dict_object)
+        else:
+            changed_records.append(dict_object)
+
+    return new_records, changed_records, unchanged_records
+
+
 @transaction.atomic
 def bulk_update_or_create(
         django_model: models.Model,
         records: list[object],
         batch_size: int = 1000,
-) -> None:
+) -> dict[str, int]:
     '''Filter the records provided to check which needs to be update and which
         needs to be created, and then performs the necessary bulk operations.
+        Records whose values are equal to the stored ones are left untouched.
 
     Args:
         django_model (models.Model): the model do update.
         records (list[object]): the list of records to filter.
         batch_size (int, optional): the amount records to update/create each
             time. Defaults to 1000.
+
+    Returns:
+        dict[str, int]: the amount of created, updated and unchanged records.
     '''
 
+    result = {'created': 0, 'updated': 0, 'unchanged': 0}
+
     if not records:
         print('Canceling bulk update or create because there are no new records.')
-        return
+        return result
 
     start_time = time.time()
     table_name = django_model._meta.verbose_name
     print(f'\nStarting bulk operations for {table_name} table..')
 
-    records_to_create = []
-    records_to_update = []
-
     print(f'Starting to filter now: {(time.time() - start_time):.0f}.')
-
-    for obj in records:
-        dict_object = fields_to_dict(obj)
-
-        _filter = {k: v for k, v in dict_object.items(
-        ) if k in django_model.filter_columns()}
-
-        queried_obj = django_model.objects.filter(**_filter).first()
-
-        if queried_obj is not None:
-            dict_object['id'] = queried_obj.id
-            records_to_update.append(dict_object)
-        else:
-            dict_object.pop('id')
-            records_to_create.append(dict_object)
+    records_to_create, records_to_update, unchanged_records = classify_records(
+        django_model=django_model,
+        records=records,
+        batch_size=batch_size,
+    )
+    result['unchanged'] = len(unchanged_records)
+    print(f'unchanged_records: {result["unchanged"]}')
 
     print(f'Starting to insert now: {(time.time() - start_time):.0f}.')
     created_records = django_model.objects.bulk_create(
         objs=[django_model(**o) for o in records_to_create],
         batch_size=batch_size,
     )
-    print(f'created_records: {len(created_records)}')
+    result['created'] = len(created_records)
+    print(f'created_records: {result["created"]}')
 
     print(f'Starting to update now: {(time.time() - start_time):.0f}.')
-    updated_records = django_model.objects.bulk_update(
-        objs=[django_model(**o) for o in records_to_update],
-        fields=get_cols_to_update(django_model),
-        batch_size=batch_size,
-    )
-    print(f'updated_records: {updated_records}')
+    update_fields = tuple(get_cols_to_update(django_model))
+
+    if records_to_update and update_fields:
+        # bulk_update does not handle the auto_now fields by itself
+        now = timezone.now()
+        for o in records_to_update:
+            o['updated_date'] = now
+
+        # The records are only looked for in the partitions of their dates
+        queryset = django_model.objects.filter(get_partition_filter(django_model, records_to_update))
+
+        result['updated'] = queryset.bulk_update(
+            objs=[django_model(**o) for o in records_to_update],
+            fields=update_fields + ('updated_date',),
+            batch_size=batch_size,
+        )
+    print(f'updated_records: {result["updated"]}')
 
     spent = time.time() - start_time
     print(f'Updated {table_name} table! Spent: {spent:.0f} seconds on it.')
 
+    return result
+
+
+def split_empty_records(django_model: models.Model, records: list[object]) -> tuple[list[object], list[dict]]:
+    '''Splits the records into the ones with values and the empty ones, whose
+        columns to update are all None, e.g. the days of the source files
+        before a metric was published.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        records (list[object]): the list of records to split.
+
+    Returns:
+        tuple[list[object], list[dict]]: the records with values, and the
+            natural keys of the empty ones, by column.
+    '''
+
+    filter_fields = get_filter_fields(django_model)
+    update_attnames = tuple(f.attname for f in get_update_fields(django_model))
+
+    # If the same key shows up more than once, the last record wins
+    records_by_key = dict()
+    for obj in records:
+        key = normalize_values(filter_fields, tuple(getattr(obj, f.attname) for f in filter_fields))
+        records_by_key[key] = obj
+
+    records_with_values = list()
+    empty_keys = list()
+    for key, obj in records_by_key.items():
+        if all(getattr(obj, a) is None for a in update_attnames):
+            empty_keys.append(dict(zip((f.attname for f in filter_fields), key)))
+        else:
+            records_with_values.append(obj)
+
+    return records_with_values, empty_keys
+
+
+def delete_stored_records(django_model: models.Model, keys: list[dict], batch_size: int = 1000) -> int:
+    '''Deletes the stored records of the provided natural keys, e.g. the ones
+        whose values were removed from the source file, looking them up by
+        their keys instead of scanning the table.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        keys (list[dict]): the natural keys of the records, by column.
+        batch_size (int, optional): the amount of distinct values to use on
+            each query. Defaults to 1000.
+
+    Returns:
+        int: the amount of records deleted.
+    '''
+
+    if not keys:
+        return 0
+
+    filter_attnames = tuple(f.attname for f in get_filter_fields(django_model))
+    existing_records = get_existing_records(
+        django_model=django_model,
+        keys={tuple(k[a] for a in filter_attnames) for k in keys},
+        batch_size=batch_size,
+    )
+
+    ids = [stored_id for stored_id, _ in existing_records.values()]
+
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        deleted += django_model.objects.filter(id__in=ids[i:i + batch_size]).delete()[0]
+
+    return deleted
+
+
+def get_stale_records(django_model: models.Model, records: list[object], **filters) -> list[object]:
+    '''Builds the empty records of the stored keys that match the filters but
+        are not among the provided records, e.g. the keys of a refreshed range
+        of dates that are no longer produced. Once added to the records of a
+        stage with drop_if_all_none, their stored records are deleted.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        records (list[object]): the records produced for the filters.
+        **filters: the filters of the stored keys that were refreshed.
+
+    Returns:
+        list[object]: the empty records of the keys no longer produced.
+    '''
+
+    filter_fields = get_filter_fields(django_model)
+    filter_attnames = tuple(f.attname for f in filter_fields)
+
+    produced_keys = {
+        normalize_values(filter_fields, tuple(getattr(obj, a) for a in filter_attnames))
+        for obj in records
+    }
+
+    stored_keys = django_model.objects.\
+        filter(**filters).\
+        values_list(*filter_attnames)
+
+    return [
+        django_model(**dict(zip(filter_attnames, key)))
+        for key in stored_keys
+        if normalize_values(filter_fields, key) not in produced_keys
+    ]
+
 
 @transaction.atomic
 def run_etl(
     df: pd.DataFrame,
     django_model: models.Model,
     specific_etl_method: Callable,
-    delete_if_all_none: tuple[str] = tuple(),
-) -> None:
+    drop_if_all_none: bool = False,
+) -> dict[str, int]:
     '''Runs the specified ETL process, performing the necessary bulk operations.
+        On a full reload, the records are loaded with the native bulk load of
+        the database instead. Once the table is written, the table_updated
+        signal is sent with the amount of records affected, unless none of
+        them changed.
 
     Args:
         df (pd.DataFrame): the DataFrame from which to extract the data.
         django_model (models.Model): the model to update.
         specific_etl_method (Callable): the method to be called.
-        delete_if_all_none (tuple[str], optional): the filter to use when its
-            necessary to clean the table after the insert of nullable records.
-            Defaults to tuple() - no record will be deleted.
+        drop_if_all_none (bool, optional): whether the records whose columns
+            to update are all None are dropped instead of being stored, and
+            the stored records of their keys deleted. Defaults to False.
+
+    Returns:
+        dict[str, int]: the amount of created, updated, unchanged and deleted
+            records.
     '''
 
     start_time = time.time()
@@ -123,14 +521,57 @@ def run_etl(
     info = f'Starting update of {table_name} table..'
     print(info)
 
+    # The bulk load module depends on this one
+    from covid_site.etl.bulk_load import (FULL_RELOAD, bulk_load,
+                                          is_bulk_load_supported)
+
     records = specific_etl_method(df=df)
 
-    bulk_update_or_create(django_model=django_model, records=records)
+    empty_records = list()
+    if drop_if_all_none:
+        records, empty_records = split_empty_records(django_model, records)
+
+    if FULL_RELOAD.get() and is_bulk_load_supported():
+        result = bulk_load(django_model=django_model, records=records)
+    else:
+        result = bulk_update_or_create(django_model=django_model, records=records)
 
-    if delete_if_all_none:
-        django_model.objects.filter(
-            **{k: None for k in delete_if_all_none}
-        ).delete()
+    result['deleted'] = delete_stored_records(django_model, empty_records)
 
     spent = time.time() - start_time
     print(f'Updated {table_name} table! Spent: {spent:.0f} seconds on it.')
+
+    # A re-import of the same data keeps the versions and caches of the table
+    if result['created'] or result['updated'] or result['deleted']:
+        table_updated.send(sender=django_model, result=result, seconds=spent)
+
+    return result
+
+
+def run_etl_graph(df: pd.DataFrame, stages: list[ETLStage]) -> None:
+    '''Runs the ETL stages one after the other, on the connection of the
+        caller, so that they are committed or rolled back together with its
+        transaction, e.g. of a chunk of the file.
+
+    Args:
+        df (pd.DataFrame): the DataFrame from which to extract the data.
+        stages (list[ETLStage]): the stages to run, where every stage comes
+            after the ones it depends on.
+    '''
+
+    done_models = set()
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in done_models:
+                raise ValueError(
+                    f'The {stage.django_model._meta.verbose_name} stage must '
+                    f'come after the {dependency._meta.verbose_name} stage.'
+                )
+
+        run_etl(
+            df=df,
+            django_model=stage.django_model,
+            specific_etl_method=stage.specific_etl_method,
+            drop_if_all_none=stage.drop_if_all_none,
+        )
+        done_models.add(stage.django_model)
@@ -1,6 +1,8 @@
 import pandas as pd
 from covid_site.etl.data import generate_age_records
-from covid_site.etl.tools import ETLProcessStatus, get_table_cols, run_etl
+from covid_site.etl.dimensions import AGES
+from covid_site.etl.tools import (ETLProcessStatus, ETLStage, get_table_cols,
+                                  run_etl_graph)
 from covid_site.models import Age, Reinforcement, Vaccines
 from django.db import transaction
 
@@ -74,26 +76,24 @@ def vacinas_csv_etl(df: pd.DataFrame) -> ETLProcessStatus:
         for c, f in date_columns_formats.items():
             df[c] = pd.to_datetime(df[c], format=f, utc=True)
 
-        run_etl(
+        run_etl_graph(
             df=df,
-            django_model=Vaccines,
-            specific_etl_method=generate_vaccines_records,
-        )
-
-        run_etl(
-            df=df,
-            django_model=Age,
-            specific_etl_method=generate_age_records,
-        )
-
-        run_etl(
-            df=df,
-            django_model=Reinforcement,
-            specific_etl_method=generate_reinforcement_records,
-            delete_if_all_none=(
-                'total',
-                'new',
-            ),
+            stages=[
+                ETLStage(
+                    django_model=Vaccines,
+                    specific_etl_method=generate_vaccines_records,
+                ),
+                ETLStage(
+                    django_model=Age,
+                    specific_etl_method=generate_age_records,
+                ),
+                ETLStage(
+                    django_model=Reinforcement,
+                    specific_etl_method=generate_reinforcement_records,
+                    drop_if_all_none=True,
+                    depends_on=(Age,),
+                ),
+            ],
         )
 
         status = ETLProcessStatus(
@@ -147,8 +147,6 @@ def generate_reinforcement_records(df: pd.DataFrame) -> list[Reinforcement]:
         list[Reinforcement]: list of objects to be inserted / updated.
     '''
 
-    age_ranges = Age.objects.all()
-
     ages = [
         ('18', '29'),
         ('30', '39'),
@@ -160,8 +158,7 @@ def generate_reinforcement_records(df: pd.DataFrame) -> list[Reinforcement]:
         ('80', None),
     ]
 
-    ages = [age_ranges.filter(
-        age_start=age[0], age_end=age[1]).first() for age in ages]
+    ages = [AGES.get(*age) for age in ages]
 
     records = list()
     for row in df.to_dict(orient='records'):
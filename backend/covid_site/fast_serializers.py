@@ -0,0 +1,228 @@
+import functools
+from datetime import date, datetime
+from typing import Callable, Iterator
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# The DRF fields whose representation is just the value as a primitive type
+PRIMITIVE_CONVERTERS = (
+    (serializers.BooleanField, bool),
+    (serializers.IntegerField, int),
+    (serializers.FloatField, float),
+    (serializers.CharField, str),
+    (serializers.PrimaryKeyRelatedField, None),
+    (serializers.ReadOnlyField, None),
+)
+
+
+def get_date_converter(field: serializers.DateField) -> Callable:
+    '''Builds the converter of the values of a DRF date field.'''
+
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+
+    if output_format is None:
+        return None
+
+    if output_format.lower() == ISO_8601:
+        return date.isoformat
+
+    return lambda value: value.strftime(output_format)
+
+
+def get_datetime_converter(field: serializers.DateTimeField) -> Callable:
+    '''Builds the converter of the values of a DRF date time field, which is
+        converted to the timezone of the field before being formatted.'''
+
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = getattr(field, 'timezone', field.default_timezone())
+
+    if output_format is None:
+        return None
+
+    def enforce_timezone(value: datetime) -> datetime:
+        if field_timezone is not None:
+            if timezone.is_aware(value):
+                return value.astimezone(field_timezone)
+            return timezone.make_aware(value, field_timezone)
+
+        if timezone.is_aware(value):
+            return timezone.make_naive(value, timezone.utc)
+
+        return value
+
+    if output_format.lower() == ISO_8601:
+        def convert(value: datetime) -> str:
+            value = enforce_timezone(value).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+
+        return convert
+
+    return lambda value: enforce_timezone(value).strftime(output_format)
+
+
+def get_converter(field: serializers.Field) -> Callable:
+    '''Builds the converter of the values of a DRF field to the ones of its
+        representation, or raises a TypeError if the field isn't supported.'''
+
+    if isinstance(field, serializers.DateTimeField):
+        return get_datetime_converter(field)
+
+    if isinstance(field, serializers.DateField):
+        return get_date_converter(field)
+
+    for field_class, converter in PRIMITIVE_CONVERTERS:
+        if isinstance(field, field_class):
+            return converter
+
+    raise TypeError(f'The {field.__class__.__name__} field is not supported.')
+
+
+def resolve_source(django_model: models.Model, source: str) -> tuple[str, models.Field]:
+    '''Converts the source of a DRF field to the lookup of the column to read
+        with values_list, or raises a TypeError if it's not a column.
+
+    Args:
+        django_model (models.Model): the model of the serializer.
+        source (str): the source of the field, e.g. "region.name".
+
+    Returns:
+        tuple[str, models.Field]: the lookup and the model field of the column.
+    '''
+
+    names = source.split('.')
+
+    lookup = list()
+    for i, name in enumerate(names):
+        try:
+            model_field = django_model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise TypeError(f'The {source} source is not a field.')
+
+        is_last = i == len(names) - 1
+
+        if model_field.is_relation and not is_last:
+            lookup.append(name)
+            django_model = model_field.related_model
+        elif model_field.is_relation:
+            # The related field of DRF only shows the primary key
+            lookup.append(model_field.attname)
+        elif is_last:
+            lookup.append(name)
+        else:
+            raise TypeError(f'The {source} source is not a field.')
+
+    return '__'.join(lookup), model_field
+
+
+class FastSerializer:
+    '''Read-only version of a DRF model serializer, compiled from its fields,
+        that represents the tuples of values_list instead of model instances.
+        It skips the per field machinery of DRF, but represents each value the
+        same way, including the DATE_FORMAT and DATETIME_FORMAT formats.'''
+
+    def __init__(
+        self,
+        serializer: serializers.ModelSerializer,
+        fields: tuple[str] = None,
+    ):
+        '''The constructor of the class. Raises a TypeError if any of the
+            fields can't be read with values_list.
+
+        Args:
+            serializer (serializers.ModelSerializer): the serializer to compile.
+            fields (tuple[str], optional): the fields to represent. Defaults
+                to None - all the fields of the serializer.
+        '''
+
+        django_model = serializer.Meta.model
+        serializer_fields = serializer().fields
+
+        # The fields keep the order of the serializer, like on DRF
+        fields = tuple(
+            f for f in serializer_fields.keys()
+            if fields is None or f in fields
+        )
+
+        self.names = fields
+        self.lookups = tuple(
+            resolve_source(django_model, serializer_fields[f].source)[0]
+            for f in fields
+        )
+        self.converters = tuple(
+            (i, converter)
+            for i, converter in enumerate(get_converter(serializer_fields[f]) for f in fields)
+            if converter is not None
+        )
+
+    def to_representation(self, row: tuple) -> dict:
+        '''Represents a row of values_list, read with the lookups of the
+            serializer, as a dictionary.'''
+
+        values = list(row[:len(self.names)])
+
+        for i, converter in self.converters:
+            if values[i] is not None:
+                values[i] = converter(values[i])
+
+        return dict(zip(self.names, values))
+
+    def iter_rows(self, rows: Iterator[tuple]) -> Iterator[dict]:
+        '''Represents each row of values_list as a dictionary.'''
+
+        for row in rows:
+            yield self.to_representation(row)
+
+
+@functools.lru_cache(maxsize=None)
+def get_serializer_fields(serializer: serializers.ModelSerializer) -> tuple[str]:
+    '''Returns the names of the fields of the serializer, in their order.'''
+
+    return tuple(serializer().fields.keys())
+
+
+@functools.lru_cache(maxsize=128)
+def compile_serializer(
+    serializer: serializers.ModelSerializer,
+    fields: tuple[str] = None,
+) -> FastSerializer:
+    '''Compiles the serializer, once per set of fields, or returns None if it
+        has fields that can't be read with values_list.'''
+
+    try:
+        return FastSerializer(serializer=serializer, fields=fields)
+    except TypeError:
+        return None
+
+
+def get_fast_serializer(
+    serializer: serializers.ModelSerializer,
+    fields: tuple[str] = None,
+) -> FastSerializer:
+    '''Returns the compiled version of the serializer, or None if it has fields
+        that can't be read with values_list, e.g. methods of the model. The
+        fields are normalized to the order of the serializer, without
+        duplicates, so that the fields requested by the clients in any order
+        share the same compiled serializer.
+
+    Args:
+        serializer (serializers.ModelSerializer): the serializer to compile.
+        fields (tuple[str], optional): the fields to represent. Defaults to
+            None - all the fields of the serializer.
+
+    Returns:
+        FastSerializer: the compiled serializer.
+    '''
+
+    if fields is not None:
+        fields = tuple(f for f in get_serializer_fields(serializer) if f in fields)
+
+        if fields == get_serializer_fields(serializer):
+            fields = None
+
+    return compile_serializer(serializer, fields)
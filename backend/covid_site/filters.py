@@ -0,0 +1,145 @@
+from django.core import exceptions
+from django.db import models
+from rest_framework.exceptions import ValidationError
+
+# The operators of the columns that are only compared for equality, e.g. the
+# foreign keys, and of the columns that can also be filtered by a range
+EQUALITY_OPERATORS = ('exact', 'in')
+RANGE_OPERATORS = ('exact', 'in', 'gt', 'gte', 'lt', 'lte')
+
+# The maximum amount of comma separated values of the "in" operator
+MAX_IN_VALUES = 100
+
+
+def get_index_columns(django_model: models.Model) -> list[tuple[str]]:
+    '''Returns the names of the fields of each index of the model, in the
+        order of its columns, i.e. of the primary key, the unique fields, the
+        foreign keys, the unique together constraints and the indexes.'''
+
+    index_columns = [
+        (f.name,) for f in django_model._meta.concrete_fields
+        if f.primary_key or f.unique or f.db_index or f.is_relation
+    ]
+
+    index_columns += [tuple(fields) for fields in django_model._meta.unique_together]
+    index_columns += [tuple(f.lstrip('-') for f in index.fields) for index in django_model._meta.indexes]
+
+    return index_columns
+
+
+def get_indexed_fields(django_model: models.Model) -> set[str]:
+    '''Returns the names of the fields of the model that lead an index, which
+        can be searched on their own. The other columns of a composite index
+        are only searched along with the columns before them, e.g. the sex of
+        the (reference_date, sex) constraint.'''
+
+    return {columns[0] for columns in get_index_columns(django_model)}
+
+
+class FilterSchema:
+    '''The filters accepted by a raw API endpoint, declared as the operators
+        of each field of the model. The query parameters are "<field>" for
+        the "exact" operator and "<field>__<operator>" for the others, e.g.
+        "reference_date__gte=2021-01-01" or "county__in=1,2". Only the columns
+        of the model itself can be filtered, without joins, and only if they
+        are columns of an index, along with the columns before them in the
+        index, so the filtered queries never scan the whole table.'''
+
+    def __init__(self, django_model: models.Model, fields: dict[str, tuple[str]]) -> None:
+        '''The constructor of the class. Raises an ImproperlyConfigured if a
+            field isn't a column of an index or an operator isn't supported.
+
+        Args:
+            django_model (models.Model): the model to filter.
+            fields (dict[str, tuple[str]]): the operators of each field.
+        '''
+
+        self.index_columns = get_index_columns(django_model)
+        indexed_fields = {f for columns in self.index_columns for f in columns}
+
+        self.params = dict()
+        for field_name, operators in fields.items():
+            if field_name not in indexed_fields:
+                raise exceptions.ImproperlyConfigured(
+                    f'The {field_name} field of {django_model.__name__} is not indexed.')
+
+            unknown_operators = set(operators) - set(RANGE_OPERATORS)
+            if unknown_operators:
+                raise exceptions.ImproperlyConfigured(
+                    f'Unknown operators: {", ".join(sorted(unknown_operators))}.')
+
+            model_field = django_model._meta.get_field(field_name)
+            for operator in operators:
+                param = field_name if operator == 'exact' else f'{field_name}__{operator}'
+                self.params[param] = (f'{model_field.name}__{operator}', model_field)
+
+    def to_python(self, param: str, model_field: models.Field, value: str) -> object:
+        '''Converts a value of a query parameter to the type of the column.'''
+
+        if model_field.is_relation:
+            model_field = model_field.target_field
+
+        try:
+            return model_field.to_python(value)
+        except exceptions.ValidationError:
+            raise ValidationError({param: f'Invalid value: {value}.'})
+
+    def check_index_prefixes(self, field_names: set[str]) -> None:
+        '''Raises a ValidationError if any of the filtered fields can't be
+            searched through an index, i.e. if every index of the field has
+            a column before it that isn't filtered.
+
+        Args:
+            field_names (set[str]): the names of the filtered fields.
+        '''
+
+        for field_name in sorted(field_names):
+            prefixes = [
+                columns[:columns.index(field_name)]
+                for columns in self.index_columns
+                if field_name in columns
+            ]
+
+            if not any(set(prefix) <= field_names for prefix in prefixes):
+                missing_fields = min(prefixes, key=len)
+                raise ValidationError({
+                    'filters': f'The {field_name} filter must be combined with '
+                    f'the {", ".join(missing_fields)} filter.'
+                })
+
+    def get_filters(self, query_params: dict[str, str]) -> dict[str, object]:
+        '''Converts the query parameters to the filters of the query, or raises
+            a ValidationError if any of them isn't declared or is invalid.
+
+        Args:
+            query_params (dict[str, str]): the query parameters to convert,
+                without the reserved ones.
+
+        Returns:
+            dict[str, object]: the lookups and values to filter the query.
+        '''
+
+        unknown_params = [p for p in query_params if p not in self.params]
+        if unknown_params:
+            raise ValidationError({
+                'filters': f'Unknown filters: {", ".join(unknown_params)}. '
+                f'The available filters are: {", ".join(self.params) or "none"}.'
+            })
+
+        filters = dict()
+        for param, value in query_params.items():
+            lookup, model_field = self.params[param]
+
+            if lookup.endswith('__in'):
+                values = [v.strip() for v in value.split(',') if v.strip()]
+                if not 0 < len(values) <= MAX_IN_VALUES:
+                    raise ValidationError(
+                        {param: f'Between 1 and {MAX_IN_VALUES} values are accepted.'})
+
+                filters[lookup] = [self.to_python(param, model_field, v) for v in values]
+            else:
+                filters[lookup] = self.to_python(param, model_field, value)
+
+        self.check_index_prefixes({self.params[p][1].name for p in query_params})
+
+        return filters
@@ -3,4 +3,8 @@ from django import forms
 
 class CsvUploadForm(forms.Form):
     csv_file = forms.FileField()
-    csv_file.widget.attrs.update({'class': 'btn btn-high btn-success'})
+    csv_file.widget.attrs.update({
+        'class': 'btn btn-high btn-success',
+        # e.g. the Dados_SICO files of several years at once
+        'multiple': True,
+    })
@@ -0,0 +1,505 @@
+import re
+from datetime import date, datetime
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models
+from django.db.migrations import Migration, RunSQL
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import RequestFactory, override_settings
+from django.urls import URLPattern, get_resolver
+
+from covid_site.cache import UNVERSIONED_MODELS
+from covid_site.filters import get_indexed_fields
+
+# The quoted or unquoted name of a table, alias or column
+IDENTIFIER = r'[`"]?(\w+)[`"]?'
+
+# The words that may follow a table instead of its alias
+TABLE_KEYWORDS = r'(?:ON|WHERE|INNER|LEFT|RIGHT|CROSS|JOIN|ORDER|GROUP|LIMIT|USING|UNION|HAVING)\b'
+
+TABLE_REGEX = re.compile(
+    rf'\b(?:FROM|JOIN)\s+{IDENTIFIER}(?:\s+(?:AS\s+)?(?![`"]?{TABLE_KEYWORDS}){IDENTIFIER})?',
+    re.IGNORECASE,
+)
+COLUMN_REGEX = re.compile(rf'(?:{IDENTIFIER}\.)?[`"]?\b(\w+)\b[`"]?(?!\s*\()')
+
+EQUALITY_REGEX = re.compile(r'\s*(?:=|<=>|IN\b|IS\b)', re.IGNORECASE)
+RANGE_REGEX = re.compile(r'\s*(?:<=|>=|<|>|BETWEEN\b|LIKE\b)', re.IGNORECASE)
+DIRECTION_REGEX = re.compile(r'\s*(ASC|DESC)\b', re.IGNORECASE)
+
+# The clauses of a query
+CLAUSE_REGEX = re.compile(r'\b(FROM|WHERE|GROUP BY|HAVING|ORDER BY|LIMIT)\b', re.IGNORECASE)
+
+# The values of the filters of the raw API endpoints on empty tables
+SAMPLE_VALUES = {
+    models.DateField: date(2021, 1, 1),
+    models.DateTimeField: datetime(2021, 1, 1),
+    models.CharField: 'a',
+}
+
+
+class QueryShape:
+    def __init__(self, name: str, sql: str, params: tuple):
+        '''A query sent by an API endpoint, named after its request.'''
+
+        self.name = name
+        self.sql = sql
+        self.params = params
+
+
+class IndexProposal:
+    def __init__(self, table: str, columns: tuple[str]):
+        '''An index that would avoid a full scan, or a sort, of a table, with
+            the columns as "<column>" or "<column> DESC".'''
+
+        self.table = table
+        self.columns = columns
+
+    @property
+    def name(self) -> str:
+        schema_editor = connection.schema_editor()
+        column_names = [c.split()[0] for c in self.columns]
+
+        return schema_editor._create_index_name(self.table, column_names, suffix='_idx')
+
+    @property
+    def sql(self) -> str:
+        return f'CREATE INDEX {self.name} ON {self.table} ({", ".join(self.columns)});'
+
+    @property
+    def reverse_sql(self) -> str:
+        return connection.schema_editor().sql_delete_index % {
+            'name': self.name,
+            'table': self.table,
+        } + ';'
+
+
+def get_data_tables() -> dict[str, models.Model]:
+    '''Returns the models of the data tables of the app by their tables.'''
+
+    return {
+        m._meta.db_table: m
+        for m in apps.get_app_config('covid_site').get_models()
+        if m not in UNVERSIONED_MODELS
+    }
+
+
+def get_api_patterns() -> list[URLPattern]:
+    '''Returns the URL patterns of the API endpoints.'''
+
+    return [
+        p for p in get_resolver().url_patterns
+        if isinstance(p, URLPattern) and str(p.pattern).startswith('^api/')
+    ]
+
+
+def record_queries(view: Callable, path: str, params: dict) -> tuple[object, list[tuple[str, tuple]]]:
+    '''Requests the endpoint, returning the response and the queries sent to
+        the data tables. The responses aren't cached, so every request reaches
+        the database.'''
+
+    queries = list()
+
+    def recorder(execute, sql, sql_params, many, context):
+        queries.append((sql, tuple(sql_params or ())))
+        return execute(sql, sql_params, many, context)
+
+    request = RequestFactory().get(path, params, HTTP_HOST='localhost')
+    caches = {
+        **settings.CACHES,
+        'api': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }
+
+    with override_settings(CACHES=caches):
+        with connection.execute_wrapper(recorder):
+            response = view(request)
+
+    data_tables = get_data_tables()
+    data_queries = [
+        (sql, sql_params) for sql, sql_params in queries
+        if sql.lstrip().upper().startswith('SELECT')
+        and get_tables(sql).get(get_driving_alias(sql)) in data_tables
+    ]
+
+    return response, data_queries
+
+
+def get_sample_value(django_model: models.Model, field: models.Field) -> str:
+    '''Returns a value of the field to filter by, the one of the first row or,
+        on empty tables, a value of its type.'''
+
+    value = django_model.objects.\
+        exclude(**{f'{field.attname}__isnull': True}).\
+        values_list(field.attname, flat=True).\
+        first()
+
+    if value is None:
+        value = next((v for t, v in SAMPLE_VALUES.items() if isinstance(field, t)), 1)
+
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value)
+
+
+def collect_query_shapes() -> list[QueryShape]:
+    '''Collects the queries of the API endpoints: the ones of each endpoint
+        without query parameters, the ones of its first pages and the ones of
+        each filter it accepts. The filters are found by trying every indexed
+        field of the table of the endpoint with the "exact" and "gte"
+        operators, since the endpoints reject the undeclared filters. The
+        endpoints that ignore the query parameters send the same queries,
+        which are only kept once.
+
+    Returns:
+        list[QueryShape]: the queries, in the order they were sent.
+    '''
+
+    data_tables = get_data_tables()
+    shapes = dict()
+
+    def add_shapes(view: Callable, path: str, params: dict) -> tuple[object, list[tuple[str, tuple]]]:
+        response, queries = record_queries(view, path, params)
+        if response.status_code != 200:
+            return response, list()
+
+        query_string = '&'.join(f'{k}={v}' for k, v in params.items())
+        name = f'{path}?{query_string}' if query_string else path
+
+        for sql, sql_params in queries:
+            shapes.setdefault((sql, sql_params), QueryShape(name, sql, sql_params))
+
+        return response, queries
+
+    for pattern in get_api_patterns():
+        path = '/' + str(pattern.pattern).strip('^$')
+        _, queries = add_shapes(pattern.callback, path, dict())
+        if not queries:
+            continue
+
+        response, _ = add_shapes(pattern.callback, path, {'limit': 1})
+        next_url = response.data.get('next') if isinstance(response.data, dict) else None
+        if next_url:
+            cursor = parse_qs(urlparse(next_url).query)['cursor'][0]
+            add_shapes(pattern.callback, path, {'limit': 1, 'cursor': cursor})
+
+        django_model = data_tables[get_tables(queries[0][0])[get_driving_alias(queries[0][0])]]
+        indexed_fields = get_indexed_fields(django_model)
+
+        for field in django_model._meta.concrete_fields:
+            if field.primary_key or field.name not in indexed_fields:
+                continue
+
+            value = get_sample_value(django_model, field)
+            add_shapes(pattern.callback, path, {field.name: value})
+            add_shapes(pattern.callback, path, {f'{field.name}__gte': value})
+
+    return list(shapes.values())
+
+
+def get_tables(sql: str) -> dict[str, str]:
+    '''Returns the tables of the query by their aliases, and by their names.'''
+
+    tables = dict()
+    for table, alias in TABLE_REGEX.findall(sql):
+        tables[table] = table
+        if alias:
+            tables[alias] = table
+
+    return tables
+
+
+def get_driving_alias(sql: str) -> str:
+    '''Returns the alias of the first table of the query.'''
+
+    match = TABLE_REGEX.search(sql)
+    if match is None:
+        return None
+
+    return match.group(2) or match.group(1)
+
+
+def split_clauses(sql: str) -> dict[str, str]:
+    '''Splits the outer query into its FROM, WHERE, ORDER BY, etc. clauses,
+        ignoring the keywords inside parentheses, e.g. of subqueries.'''
+
+    depth = 0
+    boundaries = list()
+    for i, char in enumerate(sql):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            match = CLAUSE_REGEX.match(sql, i)
+            if match and (i == 0 or not sql[i - 1].isalnum() and sql[i - 1] != '_'):
+                boundaries.append((i, match.group(1).upper()))
+
+    clauses = dict()
+    ends = [i for i, _ in boundaries[1:]] + [len(sql)]
+    for (start, clause), end in zip(boundaries, ends):
+        clauses.setdefault(clause, sql[start + len(clause):end])
+
+    return clauses
+
+
+def get_column_refs(text: str, tables: dict[str, str], columns: dict[str, set[str]]):
+    '''Yields the table, column and the text after each reference to a column
+        of the tables. The unqualified columns are only considered when they
+        belong to a single table.'''
+
+    for match in COLUMN_REGEX.finditer(text):
+        qualifier, column = match.group(1), match.group(2)
+
+        if qualifier is not None:
+            table = tables.get(qualifier)
+            if table is None or column not in columns.get(table, set()):
+                continue
+        else:
+            owners = {t for t in set(tables.values()) if column in columns.get(t, set())}
+            if len(owners) != 1:
+                continue
+            table = owners.pop()
+
+        yield table, column, text[match.end():]
+
+
+def get_predicate_columns(sql: str, columns: dict[str, set[str]]) -> dict[str, dict[str, list]]:
+    '''Returns the columns of each table of the query used by its predicates:
+        the ones compared for equality, either on the WHERE clause or on the
+        join, the ones compared with a range, and the ones of the ordering.
+
+    Args:
+        sql (str): the query.
+        columns (dict[str, set[str]]): the columns of each table.
+
+    Returns:
+        dict[str, dict[str, list]]: the "equality", "range" and "order"
+            columns of each table, where the order columns are tuples with the
+            column and its direction.
+    '''
+
+    tables = get_tables(sql)
+    clauses = split_clauses(sql)
+    predicates = {
+        t: {'equality': list(), 'range': list(), 'order': list()}
+        for t in set(tables.values())
+    }
+
+    def add(table: str, kind: str, column: object) -> None:
+        if column not in predicates[table][kind]:
+            predicates[table][kind].append(column)
+
+    # The columns of the joined table on its join condition, which are always
+    # compared for equality
+    for join in re.split(r'\bJOIN\b', clauses.get('FROM', ''), flags=re.IGNORECASE)[1:]:
+        match = TABLE_REGEX.match('JOIN ' + join)
+        joined_alias = match.group(2) or match.group(1)
+        join_condition = re.split(r'\bON\b', join, maxsplit=1, flags=re.IGNORECASE)[1:]
+
+        for table, column, _ in get_column_refs(''.join(join_condition), tables, columns):
+            if tables.get(joined_alias) == table:
+                add(table, 'equality', column)
+
+    for table, column, after in get_column_refs(clauses.get('WHERE', ''), tables, columns):
+        if EQUALITY_REGEX.match(after):
+            add(table, 'equality', column)
+        elif RANGE_REGEX.match(after):
+            add(table, 'range', column)
+
+    for table, column, after in get_column_refs(clauses.get('ORDER BY', ''), tables, columns):
+        direction = DIRECTION_REGEX.match(after)
+        add(table, 'order', (column, direction.group(1).upper() if direction else 'ASC'))
+
+    return predicates
+
+
+def propose_index(predicates: dict[str, list], limited: bool) -> tuple[str]:
+    '''Proposes the columns of the index of a table from its predicates: the
+        equality columns, followed by the range column or, without it, by the
+        ordering columns, so that the rows are read in order. The ordering
+        alone is only considered on the queries with a limit, since the other
+        ones read all the rows anyway.
+
+    Args:
+        predicates (dict[str, list]): the predicates of the table.
+        limited (bool): whether the query has a limit.
+
+    Returns:
+        tuple[str]: the columns of the index, as "<column>" or
+            "<column> DESC".
+    '''
+
+    # The columns also compared with a range, e.g. on the filter of the next
+    # page, can't be followed by other columns
+    index_columns = [c for c in predicates['equality'] if c not in predicates['range']]
+
+    if predicates['range']:
+        index_columns.append(predicates['range'][0])
+    elif limited or index_columns:
+        order = [(c, d) for c, d in predicates['order'] if c not in index_columns]
+
+        # An index in the same direction of all the columns is read backwards
+        if len({d for _, d in order}) == 1:
+            order = [(c, 'ASC') for c, _ in order]
+
+        index_columns.extend(c if d == 'ASC' else f'{c} DESC' for c, d in order)
+
+    return tuple(index_columns)
+
+
+def get_table_indexes(table: str) -> list[tuple[list[str], bool]]:
+    '''Returns the columns of each index of the table and whether it's
+        unique.'''
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+
+    return [
+        (c['columns'], c['unique'] or c['primary_key']) for c in constraints.values()
+        if c['columns'] and (c['index'] or c['unique'] or c['primary_key'])
+    ]
+
+
+def is_covered(table: str, predicates: dict[str, list], index_columns: tuple[str]) -> bool:
+    '''Returns whether an index of the table starts with the columns, or
+        whether the equality columns match a unique index, so that a single
+        row is read.'''
+
+    column_names = [c.split()[0] for c in index_columns]
+
+    return any(
+        list(columns[:len(column_names)]) == column_names
+        or unique and set(columns) <= set(predicates['equality'])
+        for columns, unique in get_table_indexes(table)
+    )
+
+
+def explain(shape: QueryShape) -> list[dict]:
+    '''Returns the access of each table of the query plan: the alias of the
+        table, whether it's fully scanned or sorted, and the estimated rows.'''
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN {shape.sql}', shape.params)
+            names = [c[0] for c in cursor.description]
+            plan = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+            return [
+                {
+                    'alias': step['table'],
+                    'full_scan': step['type'] in ('ALL', 'index'),
+                    'sorted': 'filesort' in (step['Extra'] or ''),
+                    'rows': step['rows'],
+                }
+                for step in plan if step['table']
+            ]
+
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {shape.sql}', shape.params)
+            details = [row[-1] for row in cursor.fetchall()]
+
+            accesses = list()
+            for detail in details:
+                match = re.match(r'(SCAN|SEARCH)(?: TABLE)? (\w+)(?: AS (\w+))?', detail)
+                if match is not None:
+                    accesses.append({
+                        'alias': match.group(3) or match.group(2),
+                        'full_scan': match.group(1) == 'SCAN' and 'INDEX' not in detail,
+                        'sorted': False,
+                        'rows': None,
+                    })
+                elif 'TEMP B-TREE FOR ORDER BY' in detail and accesses:
+                    accesses[0]['sorted'] = True
+
+            return accesses
+
+    raise NotImplementedError(f'The query plans of {connection.vendor} are not supported.')
+
+
+def advise(shape: QueryShape) -> tuple[list[dict], list[IndexProposal]]:
+    '''Explains the query and proposes the indexes that avoid its full scans
+        and sorts, leaving out the ones already covered by an index.
+
+    Args:
+        shape (QueryShape): the query.
+
+    Returns:
+        tuple[list[dict], list[IndexProposal]]: the full scans and sorts of
+            the plan, with their tables and whether the query reads all their
+            rows, and the proposed indexes.
+    '''
+
+    data_tables = get_data_tables()
+    columns = {
+        t: {f.column for f in m._meta.concrete_fields}
+        for t, m in data_tables.items()
+    }
+
+    tables = get_tables(shape.sql)
+    predicates = get_predicate_columns(shape.sql, columns)
+    limited = 'LIMIT' in split_clauses(shape.sql)
+
+    issues = list()
+    proposals = list()
+    for access in explain(shape):
+        table = tables.get(access['alias'])
+        if table is None or not (access['full_scan'] or access['sorted']):
+            continue
+
+        index_columns = propose_index(predicates[table], limited) if table in data_tables else tuple()
+
+        access['table'] = table
+        access['unfiltered'] = not (limited or predicates[table]['equality'] or predicates[table]['range'])
+        issues.append(access)
+
+        if index_columns and not is_covered(table, predicates[table], index_columns):
+            proposals.append(IndexProposal(table, index_columns))
+
+    return issues, proposals
+
+
+def merge_proposals(proposals: list[IndexProposal]) -> list[IndexProposal]:
+    '''Merges the proposed indexes of the queries, leaving out the ones whose
+        columns start another proposed index of the same table.'''
+
+    merged = list()
+    for proposal in sorted(proposals, key=lambda p: -len(p.columns)):
+        if not any(
+            m.table == proposal.table and m.columns[:len(proposal.columns)] == proposal.columns
+            for m in merged
+        ):
+            merged.append(proposal)
+
+    return sorted(merged, key=lambda p: (p.table, p.columns))
+
+
+def write_index_migration(proposals: list[IndexProposal], name: str) -> str:
+    '''Writes a migration of the app that creates the proposed indexes. The
+        tables aren't managed by Django, so the indexes are created with SQL.
+
+    Args:
+        proposals (list[IndexProposal]): the indexes.
+        name (str): the name of the migration, without its number.
+
+    Returns:
+        str: the name of the migration.
+    '''
+
+    leaf_nodes = MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes('covid_site')
+    number = max(MigrationAutodetector.parse_number(n) or 0 for _, n in leaf_nodes) + 1
+
+    migration = Migration(f'{number:04d}_{name}', 'covid_site')
+    migration.dependencies = leaf_nodes
+    migration.operations = [
+        RunSQL(sql=p.sql, reverse_sql=p.reverse_sql)
+        for p in proposals
+    ]
+
+    writer = MigrationWriter(migration)
+    with open(writer.path, 'w', encoding='utf-8') as migration_file:
+        migration_file.write(writer.as_string())
+
+    return migration.name
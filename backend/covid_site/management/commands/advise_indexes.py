@@ -0,0 +1,72 @@
+from covid_site.indexes import (advise, collect_query_shapes, merge_proposals,
+                                write_index_migration)
+from covid_site.routers import use_primary
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Explains the queries of the API endpoints, including the filters ' \
+        'and pages of the raw API endpoints, reporting the full scans and ' \
+        'sorts of the tables and the indexes that would avoid them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--write',
+            action='store_true',
+            help='Writes a migration that creates the proposed indexes.',
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Writes the migration and applies it.',
+        )
+        parser.add_argument(
+            '--name',
+            default='advised_indexes',
+            help='The name of the migration, without its number.',
+        )
+
+    # The queries are recorded and explained on the primary database
+    @use_primary()
+    def handle(self, *args, **options):
+        if connection.vendor not in ('mysql', 'sqlite'):
+            raise CommandError(f'The query plans of {connection.vendor} are not supported.')
+
+        shapes = collect_query_shapes()
+
+        proposals = list()
+        for shape in shapes:
+            issues, shape_proposals = advise(shape)
+            if not issues:
+                continue
+
+            self.stdout.write(shape.name)
+            for issue in issues:
+                kind = 'full scan' if issue['full_scan'] else 'sort'
+                rows = f' (~{issue["rows"]} rows)' if issue['rows'] is not None else ''
+                unfiltered = ', all the rows are read' if issue['unfiltered'] else ''
+                self.stdout.write(f'    {kind} of {issue["table"]}{rows}{unfiltered}')
+
+            for proposal in shape_proposals:
+                self.stdout.write(f'    proposed index: {proposal.table} ({", ".join(proposal.columns)})')
+
+            proposals.extend(shape_proposals)
+
+        proposals = merge_proposals(proposals)
+
+        self.stdout.write(
+            f'{len(shapes)} queries explained, {len(proposals)} indexes proposed.')
+
+        for proposal in proposals:
+            self.stdout.write(f'    {proposal.sql}')
+
+        if not proposals or not (options['write'] or options['apply']):
+            return
+
+        migration_name = write_index_migration(proposals, options['name'])
+        self.stdout.write(self.style.SUCCESS(f'Migration {migration_name} written.'))
+
+        if options['apply']:
+            call_command('migrate', 'covid_site', migration_name)
@@ -0,0 +1,67 @@
+from covid_site.etl.tools import get_update_fields
+from covid_site.models import (PopulationByAge, Reinforcement, Sample,
+                               StatisticsByAgeAndSex,
+                               StatisticsByAgeAndSexCombined,
+                               StatisticsByRegion, StatisticsBySex,
+                               StatisticsBySexCombined, Symptoms,
+                               TransmissionRisk)
+from covid_site.routers import use_primary
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# The tables whose ETL processes drop the records without values
+TABLES = (
+    PopulationByAge,
+    Reinforcement,
+    Sample,
+    StatisticsByAgeAndSex,
+    StatisticsByAgeAndSexCombined,
+    StatisticsByRegion,
+    StatisticsBySex,
+    StatisticsBySexCombined,
+    Symptoms,
+    TransmissionRisk,
+)
+
+
+class Command(BaseCommand):
+    help = 'Deletes the stored records whose values are all empty, which the ' \
+        'ETL processes used to insert and delete again on every import, and ' \
+        'now drop before storing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='The amount of records deleted on each transaction.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only counts the records to delete.',
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for django_model in TABLES:
+            ids = list(
+                django_model.objects.
+                filter(**{f.attname: None for f in get_update_fields(django_model)}).
+                values_list('id', flat=True)
+            )
+
+            if options['dry_run'] or not ids:
+                self.stdout.write(f'{django_model._meta.db_table}: {len(ids)} empty records.')
+                continue
+
+            # Short transactions, so that the table is never locked for long.
+            # The versions of the table are bumped by the deletes
+            for i in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    django_model.objects.filter(id__in=ids[i:i + batch_size]).delete()
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{django_model._meta.db_table}: {len(ids)} empty records deleted.'))
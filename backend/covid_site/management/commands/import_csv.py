@@ -0,0 +1,56 @@
+import contextlib
+from pathlib import Path
+
+from covid_site.etl.bulk_load import full_reload, is_bulk_load_supported
+from covid_site.etl.ingest import ingest_csv, is_acceptable_file
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Runs the ETL process of the CSV files, e.g. to load the whole history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'csv_files',
+            nargs='+',
+            help='The paths of the CSV files, named like the acceptable files.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='The amount of rows of each chunk.',
+        )
+        parser.add_argument(
+            '--full-reload',
+            action='store_true',
+            help='Loads the tables with the native bulk load of the database '
+            '(LOAD DATA LOCAL INFILE / COPY), without comparing the records '
+            'with the stored ones.',
+        )
+
+    def handle(self, *args, **options):
+        for csv_file in options['csv_files']:
+            if not is_acceptable_file(Path(csv_file).name):
+                raise CommandError(
+                    f'The {csv_file} file does not match any mapped source file!')
+
+        if options['full_reload'] and not is_bulk_load_supported():
+            self.stderr.write(
+                'The database has no native bulk load, using the regular ETL process.')
+
+        for csv_file in options['csv_files']:
+            self.stdout.write(f'Importing {csv_file}..')
+
+            mode = full_reload() if options['full_reload'] else contextlib.nullcontext()
+            with mode:
+                status = ingest_csv(
+                    csv_file=csv_file,
+                    file_name=Path(csv_file).name,
+                    chunk_size=options['chunk_size'],
+                )
+
+            if not status.succeeded:
+                raise CommandError(f'{status.message} {status.exception}')
+
+            self.stdout.write(self.style.SUCCESS(f'{csv_file}: {status.message}'))
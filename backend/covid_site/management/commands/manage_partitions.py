@@ -0,0 +1,102 @@
+from datetime import date
+
+from covid_site.cache import bump_table_versions
+from covid_site.partitions import (PARTITION_SCHEMES, execute_statements,
+                                   get_archive_sql, get_convert_sql,
+                                   get_partitions, is_partitioning_supported,
+                                   maintain_partitions)
+from covid_site.routers import use_primary
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Adds the partitions of the next months or years to the partitioned ' \
+        'fact tables and reports their partitions. Optionally partitions the ' \
+        'tables not partitioned yet, and archives the oldest partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Partitions the tables not partitioned yet. The tables are '
+            'rebuilt and lose their foreign keys, which MySQL does not support '
+            'on partitioned tables.',
+        )
+        parser.add_argument(
+            '--archive-before',
+            type=date.fromisoformat,
+            default=None,
+            help='Moves the partitions whose dates are all before the date '
+            '(YYYY-MM-DD) to tables of their own, e.g. "incidence_p202001". '
+            'Their rows are no longer served by the API.',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=None,
+            help='The amount of months or years to create ahead of the current '
+            'one. Defaults to the PARTITIONS_AHEAD setting.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Prints the statements without running them.',
+        )
+
+    @use_primary()
+    def handle(self, *args, **options):
+        if not is_partitioning_supported():
+            raise CommandError('The partitioning of the tables is only supported on MySQL.')
+
+        if options['convert']:
+            for scheme in PARTITION_SCHEMES.values():
+                if get_partitions(scheme):
+                    continue
+
+                try:
+                    statements = get_convert_sql(scheme, options['ahead'])
+                except ValueError as e:
+                    raise CommandError(e)
+
+                self.run(statements, options['dry_run'])
+
+        self.run(
+            maintain_partitions(options['ahead'], dry_run=True),
+            options['dry_run'],
+        )
+
+        if options['archive_before'] is not None:
+            archived_tables = list()
+
+            for scheme in PARTITION_SCHEMES.values():
+                statements = get_archive_sql(scheme, get_partitions(scheme), options['archive_before'])
+                if statements:
+                    self.run(statements, options['dry_run'])
+                    archived_tables.append(scheme.table)
+
+            # The cached responses may include the archived rows
+            if archived_tables and not options['dry_run']:
+                bump_table_versions(archived_tables)
+
+        for scheme in PARTITION_SCHEMES.values():
+            partitions = get_partitions(scheme)
+
+            if not partitions:
+                self.stdout.write(f'{scheme.table}: not partitioned.')
+                continue
+
+            bounds = [p.upper_bound for p in partitions if p.upper_bound is not None]
+            self.stdout.write(
+                f'{scheme.table}: {len(partitions)} partitions by {scheme.interval} of '
+                f'{scheme.column}, up to {max(bounds, default=None)}, '
+                f'~{sum(p.rows for p in partitions)} rows.')
+
+    def run(self, statements: list[str], dry_run: bool) -> None:
+        '''Prints the statements, running them unless it's a dry run.'''
+
+        if dry_run:
+            for statement in statements:
+                self.stdout.write(f'{statement};')
+            return
+
+        execute_statements(statements)
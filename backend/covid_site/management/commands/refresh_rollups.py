@@ -0,0 +1,45 @@
+import functools
+
+import pandas as pd
+from covid_site.etl.rollups import (generate_county_year_deaths_records,
+                                    generate_region_deaths_since_records,
+                                    generate_region_year_deaths_records)
+from covid_site.etl.tools import run_etl
+from covid_site.models import (CountyYearDeaths, RegionDeathsSince,
+                               RegionYearDeaths, TotalDeaths)
+from covid_site.routers import use_primary
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Sums the deaths rollup tables again from the whole Total Deaths ' \
+        'table, e.g. after they are first created. The ETL processes keep ' \
+        'them updated.'
+
+    @use_primary()
+    def handle(self, *args, **options):
+        # Also the years left only on the rollups, whose totals are deleted
+        years = sorted(
+            {d.year for d in TotalDeaths.objects.dates('date_start', 'year')}
+            | set(CountyYearDeaths.objects.values_list('year', flat=True))
+            | set(RegionYearDeaths.objects.values_list('year', flat=True))
+        )
+
+        rollups = (
+            (CountyYearDeaths, functools.partial(generate_county_year_deaths_records, years=years)),
+            (RegionYearDeaths, functools.partial(generate_region_year_deaths_records, years=years)),
+            (RegionDeathsSince, generate_region_deaths_since_records),
+        )
+
+        for django_model, specific_etl_method in rollups:
+            result = run_etl(
+                df=pd.DataFrame(),
+                django_model=django_model,
+                specific_etl_method=specific_etl_method,
+                drop_if_all_none=True,
+            )
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{django_model._meta.db_table}: {result["created"]} created, '
+                f'{result["updated"]} updated, {result["unchanged"]} unchanged, '
+                f'{result["deleted"]} deleted.'))
@@ -0,0 +1,51 @@
+import pandas as pd
+from covid_site.etl.snapshots import (
+    generate_latest_incidence_records,
+    generate_latest_statistics_by_region_records)
+from covid_site.etl.tools import run_etl
+from covid_site.models import (Incidence, LatestIncidence,
+                               LatestStatisticsByRegion, StatisticsByRegion)
+from covid_site.routers import use_primary
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+# The snapshot tables, with the table of their history and their ETL method
+SNAPSHOTS = (
+    (LatestIncidence, Incidence, generate_latest_incidence_records),
+    (LatestStatisticsByRegion, StatisticsByRegion, generate_latest_statistics_by_region_records),
+)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the latest snapshot tables from the whole history, e.g. ' \
+        'after they are first created. The ETL processes keep them updated.'
+
+    @use_primary()
+    def handle(self, *args, **options):
+        for snapshot_model, source_model, specific_etl_method in SNAPSHOTS:
+            dates = source_model.objects.aggregate(
+                Min('reference_date'),
+                Max('reference_date'),
+            )
+
+            if dates['reference_date__min'] is None:
+                self.stdout.write(f'The {source_model._meta.db_table} table is empty.')
+                continue
+
+            # The snapshot is refreshed as if the whole history was imported
+            df = pd.DataFrame({
+                'reference_date': pd.to_datetime(
+                    [dates['reference_date__min'], dates['reference_date__max']],
+                    utc=True,
+                ),
+            })
+
+            result = run_etl(
+                df=df,
+                django_model=snapshot_model,
+                specific_etl_method=specific_etl_method,
+            )
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{snapshot_model._meta.db_table}: {result["created"]} created, '
+                f'{result["updated"]} updated, {result["unchanged"]} unchanged.'))
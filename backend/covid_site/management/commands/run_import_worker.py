@@ -0,0 +1,30 @@
+from covid_site.etl.jobs import run_workers
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Runs the pool of workers that process the queued CSV import jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.ETL_WORKER_PROCESSES,
+            help='The amount of worker processes.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.ETL_WORKER_POLL_INTERVAL,
+            help='The seconds to wait between checks for new jobs.',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Starting {options["processes"]} import worker(s)..')
+
+        run_workers(
+            processes=options['processes'],
+            poll_interval=options['poll_interval'],
+        )
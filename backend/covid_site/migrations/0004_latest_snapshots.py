@@ -0,0 +1,81 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covid_site', '0003_dataversion'),
+    ]
+
+    operations = [
+        # The initial state of the unmanaged County table has the dicofre as
+        # primary key, which would be the target of the new foreign keys
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.DeleteModel(
+                    name='County',
+                ),
+                migrations.CreateModel(
+                    name='County',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('dicofre', models.CharField(max_length=4, unique=True)),
+                        ('district', models.CharField(max_length=60)),
+                        ('county_name', models.CharField(max_length=60, unique=True)),
+                        ('region', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.region')),
+                        ('area', models.FloatField(blank=True, null=True)),
+                        ('population', models.IntegerField(blank=True, null=True)),
+                        ('population_density', models.FloatField(blank=True, null=True)),
+                        ('density_1', models.FloatField(blank=True, null=True)),
+                        ('density_2', models.FloatField(blank=True, null=True)),
+                        ('density_3', models.FloatField(blank=True, null=True)),
+                        ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                        ('updated_date', models.DateTimeField(auto_now=True)),
+                    ],
+                    options={
+                        'db_table': 'county',
+                        'managed': False,
+                    },
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LatestIncidence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_date', models.DateField()),
+                ('incidence', models.IntegerField(blank=True, null=True)),
+                ('cases_14', models.IntegerField(blank=True, null=True)),
+                ('confirmed_1', models.IntegerField(blank=True, null=True)),
+                ('confirmed_14', models.IntegerField(blank=True, null=True)),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('county', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.county')),
+                ('incidence_category', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.incidencecategory')),
+            ],
+            options={
+                'verbose_name_plural': 'Latest Incidence',
+                'db_table': 'latest_incidence',
+            },
+        ),
+        migrations.CreateModel(
+            name='LatestStatisticsByRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_date', models.DateField()),
+                ('confirmed', models.IntegerField(blank=True, null=True)),
+                ('deaths', models.IntegerField(blank=True, null=True)),
+                ('recovered', models.IntegerField(blank=True, null=True)),
+                ('source_inserted_date', models.DateTimeField()),
+                ('source_updated_date', models.DateTimeField()),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('region', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.region')),
+            ],
+            options={
+                'verbose_name_plural': 'Latest Statistics by Region',
+                'db_table': 'latest_statistics_by_region',
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covid_site', '0004_latest_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountyYearDeaths',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.SmallIntegerField()),
+                ('deaths', models.IntegerField()),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('county', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.county')),
+            ],
+            options={
+                'verbose_name_plural': 'County Year Deaths',
+                'db_table': 'county_year_deaths',
+                'unique_together': {('year', 'county')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RegionDeathsSince',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_start', models.DateField()),
+                ('deaths', models.IntegerField()),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('region', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.region')),
+            ],
+            options={
+                'verbose_name_plural': 'Region Deaths Since',
+                'db_table': 'region_deaths_since',
+            },
+        ),
+        migrations.CreateModel(
+            name='RegionYearDeaths',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.SmallIntegerField()),
+                ('deaths', models.IntegerField()),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.region')),
+            ],
+            options={
+                'verbose_name_plural': 'Region Year Deaths',
+                'db_table': 'region_year_deaths',
+                'unique_together': {('year', 'region')},
+            },
+        ),
+    ]
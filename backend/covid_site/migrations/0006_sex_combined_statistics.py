@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covid_site', '0005_deaths_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsByAgeAndSexCombined',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_date', models.DateField()),
+                ('male_confirmed', models.IntegerField(blank=True, null=True)),
+                ('male_deaths', models.IntegerField(blank=True, null=True)),
+                ('female_confirmed', models.IntegerField(blank=True, null=True)),
+                ('female_deaths', models.IntegerField(blank=True, null=True)),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('age', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='covid_site.age')),
+            ],
+            options={
+                'verbose_name_plural': 'Statistics by Age and Sex Combined',
+                'db_table': 'statistics_by_age_and_sex_combined',
+                'unique_together': {('reference_date', 'age')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatisticsBySexCombined',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_date', models.DateField(unique=True)),
+                ('male_confirmed', models.IntegerField(blank=True, null=True)),
+                ('male_confirmed_unknown', models.IntegerField(blank=True, null=True)),
+                ('male_deaths', models.IntegerField(blank=True, null=True)),
+                ('female_confirmed', models.IntegerField(blank=True, null=True)),
+                ('female_confirmed_unknown', models.IntegerField(blank=True, null=True)),
+                ('female_deaths', models.IntegerField(blank=True, null=True)),
+                ('inserted_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Statistics by Sex Combined',
+                'db_table': 'statistics_by_sex_combined',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# The indexes, with their tables and columns
+INDEXES = (
+    ('incidence_county_date_idx', 'incidence', ('county_id', 'reference_date')),
+    ('total_deaths_date_end_idx', 'total_deaths', ('date_end',)),
+    ('total_deaths_date_start_idx', 'total_deaths', ('date_start',)),
+)
+
+
+def get_index_names(schema_editor, table: str) -> set[str]:
+    with schema_editor.connection.cursor() as cursor:
+        return set(schema_editor.connection.introspection.get_constraints(cursor, table))
+
+
+def create_indexes(apps, schema_editor):
+    table_names = schema_editor.connection.introspection.table_names()
+
+    for name, table, columns in INDEXES:
+        # The unmanaged tables don't exist on the test databases, and the ones
+        # created from the models already have the indexes
+        if table in table_names and name not in get_index_names(schema_editor, table):
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ({", ".join(columns)});')
+
+
+def drop_indexes(apps, schema_editor):
+    table_names = schema_editor.connection.introspection.table_names()
+
+    for name, table, _ in INDEXES:
+        if table in table_names and name in get_index_names(schema_editor, table):
+            schema_editor.execute(schema_editor.sql_delete_index % {'name': name, 'table': table} + ';')
+
+
+class Migration(migrations.Migration):
+    '''The indexes of the queries of the unmanaged tables not covered by their
+        unique constraints, as proposed by the advise_indexes command: the
+        date filters of the Total Deaths endpoint and the latest Incidence of
+        a county.'''
+
+    dependencies = [
+        ('covid_site', '0006_sex_combined_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
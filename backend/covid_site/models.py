@@ -141,6 +141,46 @@ class County(models.Model):
         )
 
 
+class CountyYearDeaths(models.Model):
+    county = models.ForeignKey(County, models.DO_NOTHING)
+    year = models.SmallIntegerField()
+    deaths = models.IntegerField()
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'county_year_deaths'
+        verbose_name_plural = 'County Year Deaths'
+        unique_together = (('year', 'county'),)
+
+    def __str__(self):
+        return f'County Year Deaths: {self.year} - {self.county}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'year',
+            'county',
+        )
+
+
+class DataVersion(models.Model):
+    table_name = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'data_version'
+
+    def __str__(self):
+        return f'Data Version: {self.table_name} - {self.version}'
+
+
 class DjangoAdminLog(models.Model):
     action_time = models.DateTimeField()
     object_id = models.TextField(blank=True, null=True)
@@ -231,6 +271,45 @@ class GeneralData(models.Model):
         )
 
 
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    chunks_done = models.IntegerField(default=0)
+    rows_done = models.IntegerField(default=0)
+    table_stats = models.JSONField(default=dict)
+    message = models.TextField(blank=True)
+    started_date = models.DateTimeField(blank=True, null=True)
+    finished_date = models.DateTimeField(blank=True, null=True)
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'import_job'
+        ordering = ('-inserted_date',)
+
+    def __str__(self):
+        return f'Import Job: {self.id} - {self.file_name}'
+
+    def duration(self):
+        if self.started_date is None or self.finished_date is None:
+            return None
+        return self.finished_date - self.started_date
+
+
 class Incidence(models.Model):
     reference_date = models.DateField()
     county = models.ForeignKey(County, models.DO_NOTHING)
@@ -247,6 +326,10 @@ class Incidence(models.Model):
         managed = False
         db_table = 'incidence'
         unique_together = (('reference_date', 'county'),)
+        # Created by the 0007_api_indexes migration
+        indexes = (
+            models.Index(fields=('county', 'reference_date'), name='incidence_county_date_idx'),
+        )
 
     def __str__(self):
         only_date = f'{self.reference_date}'[:10]
@@ -281,6 +364,69 @@ class IncidenceCategory(models.Model):
         return self.incidence_risk
 
 
+class LatestIncidence(models.Model):
+    county = models.OneToOneField(County, models.DO_NOTHING)
+    reference_date = models.DateField()
+    incidence_category = models.ForeignKey(
+        'IncidenceCategory', models.DO_NOTHING)
+    incidence = models.IntegerField(blank=True, null=True)
+    cases_14 = models.IntegerField(blank=True, null=True)
+    confirmed_1 = models.IntegerField(blank=True, null=True)
+    confirmed_14 = models.IntegerField(blank=True, null=True)
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'latest_incidence'
+        verbose_name_plural = 'Latest Incidence'
+
+    def __str__(self):
+        only_date = f'{self.reference_date}'[:10]
+        return f'Latest Incidence: {only_date} - {self.county}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'county',
+        )
+
+
+class LatestStatisticsByRegion(models.Model):
+    region = models.OneToOneField('Region', models.DO_NOTHING)
+    reference_date = models.DateField()
+    confirmed = models.IntegerField(blank=True, null=True)
+    deaths = models.IntegerField(blank=True, null=True)
+    recovered = models.IntegerField(blank=True, null=True)
+    source_inserted_date = models.DateTimeField()
+    source_updated_date = models.DateTimeField()
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'latest_statistics_by_region'
+        verbose_name_plural = 'Latest Statistics by Region'
+
+    def __str__(self):
+        only_date = f'{self.reference_date}'[:10]
+        return f'Latest Statistics by Region: {only_date} - {self.region}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'region',
+        )
+
+
 class PopulationByAge(models.Model):
     age = models.ForeignKey(Age, models.DO_NOTHING)
     county: County = models.ForeignKey(County, models.DO_NOTHING)
@@ -334,6 +480,61 @@ class Region(models.Model):
         )
 
 
+class RegionDeathsSince(models.Model):
+    region = models.OneToOneField(Region, models.DO_NOTHING)
+    date_start = models.DateField()
+    deaths = models.IntegerField()
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'region_deaths_since'
+        verbose_name_plural = 'Region Deaths Since'
+
+    def __str__(self):
+        only_date = f'{self.date_start}'[:10]
+        return f'Region Deaths Since: {only_date} - {self.region}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'region',
+        )
+
+
+class RegionYearDeaths(models.Model):
+    region = models.ForeignKey(Region, models.DO_NOTHING)
+    year = models.SmallIntegerField()
+    deaths = models.IntegerField()
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'region_year_deaths'
+        verbose_name_plural = 'Region Year Deaths'
+        unique_together = (('year', 'region'),)
+
+    def __str__(self):
+        return f'Region Year Deaths: {self.year} - {self.region}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'year',
+            'region',
+        )
+
+
 class Reinforcement(models.Model):
     reference_date = models.DateField()
     age = models.ForeignKey(Age, models.DO_NOTHING)
@@ -429,6 +630,38 @@ class StatisticsByAgeAndSex(models.Model):
         )
 
 
+class StatisticsByAgeAndSexCombined(models.Model):
+    reference_date = models.DateField()
+    age = models.ForeignKey(Age, models.DO_NOTHING)
+    male_confirmed = models.IntegerField(blank=True, null=True)
+    male_deaths = models.IntegerField(blank=True, null=True)
+    female_confirmed = models.IntegerField(blank=True, null=True)
+    female_deaths = models.IntegerField(blank=True, null=True)
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'statistics_by_age_and_sex_combined'
+        verbose_name_plural = 'Statistics by Age and Sex Combined'
+        unique_together = (('reference_date', 'age'),)
+
+    def __str__(self):
+        only_date = f'{self.reference_date}'[:10]
+        return f'Statistics by Age and Sex Combined: {only_date} - {self.age}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'reference_date',
+            'age',
+        )
+
+
 class StatisticsByRegion(models.Model):
     reference_date = models.DateField()
     region = models.ForeignKey(Region, models.DO_NOTHING)
@@ -492,6 +725,37 @@ class StatisticsBySex(models.Model):
         )
 
 
+class StatisticsBySexCombined(models.Model):
+    reference_date = models.DateField(unique=True)
+    male_confirmed = models.IntegerField(blank=True, null=True)
+    male_confirmed_unknown = models.IntegerField(blank=True, null=True)
+    male_deaths = models.IntegerField(blank=True, null=True)
+    female_confirmed = models.IntegerField(blank=True, null=True)
+    female_confirmed_unknown = models.IntegerField(blank=True, null=True)
+    female_deaths = models.IntegerField(blank=True, null=True)
+    inserted_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'statistics_by_sex_combined'
+        verbose_name_plural = 'Statistics by Sex Combined'
+
+    def __str__(self):
+        only_date = f'{self.reference_date}'[:10]
+        return f'Statistics by Sex Combined: {only_date}'
+
+    @classmethod
+    def filter_columns(cls) -> tuple[str]:
+        '''The fields to use as filter on the ETL process.
+
+        Returns:
+            tuple[str]: the fields to use as filter
+        '''
+        return (
+            'reference_date',
+        )
+
+
 class Symptoms(models.Model):
     reference_date = models.DateField()
     quantity = models.FloatField(blank=True, null=True)
@@ -562,6 +826,11 @@ class TotalDeaths(models.Model):
             ('county', 'date_start',),
             ('county', 'date_end',),
         )
+        # Created by the 0007_api_indexes migration
+        indexes = (
+            models.Index(fields=('date_end',), name='total_deaths_date_end_idx'),
+            models.Index(fields=('date_start',), name='total_deaths_date_start_idx'),
+        )
 
     def __str__(self):
         date_start = f'{self.date_start}'[:10]
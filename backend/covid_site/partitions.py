@@ -0,0 +1,395 @@
+from datetime import date
+from typing import Iterable
+
+from covid_site.models import (Incidence, StatisticsByAgeAndSex,
+                               StatisticsByRegion, Symptoms, TotalDeaths)
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+# The partition of the dates after the last one, kept empty ahead of them
+FUTURE_PARTITION = 'p_future'
+
+PARTITIONING_VENDORS = ('mysql',)
+
+
+class PartitionScheme:
+    def __init__(self, django_model: models.Model, column: str, interval: str):
+        '''The range partitions of the table of a model by the months or the
+            years ("month" or "year" interval) of one of its date columns.'''
+
+        self.django_model = django_model
+        self.column = column
+        self.interval = interval
+
+    @property
+    def table(self) -> str:
+        return self.django_model._meta.db_table
+
+    def get_start(self, day: date) -> date:
+        '''Returns the first day of the interval of the date.'''
+
+        if self.interval == 'year':
+            return date(day.year, 1, 1)
+
+        return date(day.year, day.month, 1)
+
+    def shift(self, start: date, intervals: int) -> date:
+        '''Returns the first day of the interval the provided amount of
+            intervals after the one that starts on the date.'''
+
+        if self.interval == 'year':
+            return date(start.year + intervals, 1, 1)
+
+        months = start.year * 12 + start.month - 1 + intervals
+        return date(months // 12, months % 12 + 1, 1)
+
+    def get_name(self, start: date) -> str:
+        '''Returns the name of the partition of the interval, e.g. "p202201".'''
+
+        return start.strftime('p%Y' if self.interval == 'year' else 'p%Y%m')
+
+    def get_starts(self, first: date, last: date) -> list[date]:
+        '''Returns the first day of each interval from the one of the first
+            date to the one of the last date.'''
+
+        starts = [self.get_start(first)]
+        while starts[-1] < self.get_start(last):
+            starts.append(self.shift(starts[-1], 1))
+
+        return starts
+
+
+class Partition:
+    def __init__(self, name: str, upper_bound: date | None, rows: int):
+        '''A partition of a table, holding the dates before its upper bound,
+            or all the later dates if it has none (MAXVALUE).'''
+
+        self.name = name
+        self.upper_bound = upper_bound
+        self.rows = rows
+
+
+# The fact tables that grow with each day of data, whose queries and upserts
+# always filter their dates
+PARTITION_SCHEMES = {
+    Incidence: PartitionScheme(Incidence, 'reference_date', 'month'),
+    StatisticsByAgeAndSex: PartitionScheme(StatisticsByAgeAndSex, 'reference_date', 'year'),
+    StatisticsByRegion: PartitionScheme(StatisticsByRegion, 'reference_date', 'year'),
+    Symptoms: PartitionScheme(Symptoms, 'reference_date', 'year'),
+    TotalDeaths: PartitionScheme(TotalDeaths, 'date_start', 'year'),
+}
+
+
+def is_partitioning_supported() -> bool:
+    '''Checks if the database supports the partitioning of the tables.'''
+
+    return connection.vendor in PARTITIONING_VENDORS
+
+
+def get_partitions(scheme: PartitionScheme) -> list[Partition]:
+    '''Returns the partitions of the table, in order, or an empty list if the
+        table is not partitioned.'''
+
+    if not is_partitioning_supported():
+        return list()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            ''',
+            [scheme.table],
+        )
+
+        return [
+            Partition(
+                name=name,
+                upper_bound=None if description == 'MAXVALUE' else date.fromisoformat(description.strip("'")),
+                rows=rows or 0,
+            )
+            for name, description, rows in cursor.fetchall()
+        ]
+
+
+def get_partition_definitions(scheme: PartitionScheme, starts: list[date]) -> list[str]:
+    '''Returns the definitions of the partitions of the intervals, followed by
+        the one of the future partition.'''
+
+    definitions = [
+        f"PARTITION {scheme.get_name(s)} VALUES LESS THAN ('{scheme.shift(s, 1).isoformat()}')"
+        for s in starts
+    ]
+    definitions.append(f'PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)')
+
+    return definitions
+
+
+def get_last_start(scheme: PartitionScheme, ahead: int = None) -> date:
+    '''Returns the first day of the last interval to have a partition, the
+        provided amount of intervals after the current one.'''
+
+    ahead = settings.PARTITIONS_AHEAD if ahead is None else ahead
+
+    return scheme.shift(scheme.get_start(timezone.localdate()), ahead)
+
+
+def get_convert_sql(scheme: PartitionScheme, ahead: int = None) -> list[str]:
+    '''Returns the statements that partition the table, from the interval of
+        its first date to the ones ahead of the current date. MySQL requires
+        every unique key to include the partition column, which is appended to
+        the ones that don't, and doesn't support foreign keys on partitioned
+        tables, which are dropped.
+
+    Args:
+        scheme (PartitionScheme): the partitions of the table.
+        ahead (int, optional): the amount of intervals ahead of the current
+            one. Defaults to None - uses the PARTITIONS_AHEAD setting.
+
+    Raises:
+        ValueError: when other tables have foreign keys to the table.
+
+    Returns:
+        list[str]: the statements to run, in order.
+    '''
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT TABLE_NAME, CONSTRAINT_NAME
+            FROM information_schema.REFERENTIAL_CONSTRAINTS
+            WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)
+            ''',
+            [scheme.table, scheme.table],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(
+            '''
+            SELECT INDEX_NAME, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+            ''',
+            [scheme.table],
+        )
+        unique_keys = dict()
+        for index_name, column_name in cursor.fetchall():
+            unique_keys.setdefault(index_name, list()).append(column_name)
+
+    referencing_tables = [t for t, _ in foreign_keys if t != scheme.table]
+    if referencing_tables:
+        raise ValueError(
+            f'The {scheme.table} table can not be partitioned, it is referenced '
+            f'by the foreign keys of the {", ".join(referencing_tables)} tables.')
+
+    first_date = scheme.django_model.objects.aggregate(first=Min(scheme.column))['first']
+    starts = scheme.get_starts(first_date or timezone.localdate(), get_last_start(scheme, ahead))
+
+    statements = [
+        f'ALTER TABLE `{scheme.table}` DROP FOREIGN KEY `{constraint_name}`'
+        for _, constraint_name in foreign_keys
+    ]
+
+    key_changes = list()
+    for index_name, columns in unique_keys.items():
+        if scheme.column in columns:
+            continue
+
+        column_list = ', '.join(f'`{c}`' for c in columns + [scheme.column])
+        if index_name == 'PRIMARY':
+            key_changes.append(f'DROP PRIMARY KEY, ADD PRIMARY KEY ({column_list})')
+        else:
+            key_changes.append(f'DROP INDEX `{index_name}`, ADD UNIQUE INDEX `{index_name}` ({column_list})')
+
+    if key_changes:
+        statements.append(f'ALTER TABLE `{scheme.table}` {", ".join(key_changes)}')
+
+    definitions = ',\n    '.join(get_partition_definitions(scheme, starts))
+    statements.append(
+        f'ALTER TABLE `{scheme.table}` PARTITION BY RANGE COLUMNS(`{scheme.column}`) (\n    {definitions}\n)')
+
+    return statements
+
+
+def get_split_sql(scheme: PartitionScheme, partitions: list[Partition], ahead: int = None) -> list[str]:
+    '''Returns the statements that add the partitions of the intervals up to
+        the ones ahead of the current date, splitting them from the future
+        partition, which is empty while the partitions are kept ahead of the
+        data, so that no rows are moved.
+
+    Args:
+        scheme (PartitionScheme): the partitions of the table.
+        partitions (list[Partition]): the current partitions of the table.
+        ahead (int, optional): the amount of intervals ahead of the current
+            one. Defaults to None - uses the PARTITIONS_AHEAD setting.
+
+    Returns:
+        list[str]: the statements to run, none if the partitions exist.
+    '''
+
+    dated_partitions = [p for p in partitions if p.upper_bound is not None]
+    if not dated_partitions:
+        return list()
+
+    next_start = dated_partitions[-1].upper_bound
+    last_start = get_last_start(scheme, ahead)
+
+    if next_start > last_start:
+        return list()
+
+    starts = scheme.get_starts(next_start, last_start)
+    definitions = get_partition_definitions(scheme, starts)
+
+    if partitions[-1].upper_bound is not None:
+        return [f'ALTER TABLE `{scheme.table}` ADD PARTITION ({", ".join(definitions[:-1])})']
+
+    return [
+        f'ALTER TABLE `{scheme.table}` REORGANIZE PARTITION {FUTURE_PARTITION} '
+        f'INTO ({", ".join(definitions)})'
+    ]
+
+
+def get_archive_sql(scheme: PartitionScheme, partitions: list[Partition], before: date) -> list[str]:
+    '''Returns the statements that move the partitions whose dates are all
+        before the provided date to tables of their own, named after the table
+        and the partition, e.g. "incidence_p202001", which can be dumped and
+        dropped. The rows are moved by exchanging the partition with the empty
+        archive table, without copying them.
+
+    Args:
+        scheme (PartitionScheme): the partitions of the table.
+        partitions (list[Partition]): the current partitions of the table.
+        before (date): the date before which the partitions are archived.
+
+    Returns:
+        list[str]: the statements to run, in order.
+    '''
+
+    statements = list()
+    for partition in partitions:
+        if partition.upper_bound is None or partition.upper_bound > before:
+            break
+
+        archive_table = f'{scheme.table}_{partition.name}'
+        statements.extend((
+            f'CREATE TABLE `{archive_table}` LIKE `{scheme.table}`',
+            f'ALTER TABLE `{archive_table}` REMOVE PARTITIONING',
+            f'ALTER TABLE `{scheme.table}` EXCHANGE PARTITION {partition.name} WITH TABLE `{archive_table}`',
+            f'ALTER TABLE `{scheme.table}` DROP PARTITION {partition.name}',
+        ))
+
+    return statements
+
+
+def execute_statements(statements: list[str]) -> None:
+    '''Runs the statements on the database, each one committed on its own.'''
+
+    with connection.cursor() as cursor:
+        for statement in statements:
+            print(f'Running: {statement}')
+            cursor.execute(statement)
+
+
+def maintain_partitions(ahead: int = None, dry_run: bool = False) -> list[str]:
+    '''Adds the partitions of the intervals up to the ones ahead of the current
+        date to every partitioned table, so that the new rows never end up in
+        the future partition. Meant to be run before each import, outside of
+        any transaction, since the changes of the tables commit it.
+
+    Args:
+        ahead (int, optional): the amount of intervals ahead of the current
+            one. Defaults to None - uses the PARTITIONS_AHEAD setting.
+        dry_run (bool, optional): whether the statements are only returned.
+            Defaults to False.
+
+    Returns:
+        list[str]: the statements run.
+    '''
+
+    if not is_partitioning_supported():
+        return list()
+
+    if connection.in_atomic_block:
+        print('Skipping the maintenance of the partitions inside a transaction.')
+        return list()
+
+    statements = list()
+    for scheme in PARTITION_SCHEMES.values():
+        partitions = get_partitions(scheme)
+
+        # The tables are only partitioned by the manage_partitions command
+        if partitions:
+            statements.extend(get_split_sql(scheme, partitions, ahead))
+
+    if not dry_run:
+        execute_statements(statements)
+
+    return statements
+
+
+def get_partition_filter(django_model: models.Model, records: Iterable[dict]) -> Q:
+    '''Returns the filter of the range of dates of the records on the partition
+        column, so that a query of the records only reads their partitions, or
+        an empty filter if the table is not partitioned.
+
+    Args:
+        django_model (models.Model): the model of the records.
+        records (Iterable[dict]): the values of the records, by column.
+
+    Returns:
+        Q: the filter of the range of dates.
+    '''
+
+    scheme = PARTITION_SCHEMES.get(django_model)
+    if scheme is None:
+        return Q()
+
+    dates = [r.get(scheme.column) for r in records]
+    if not dates or None in dates:
+        return Q()
+
+    return Q(**{f'{scheme.column}__range': (min(dates), max(dates))})
+
+
+def get_latest_date(django_model: models.Model, **filters) -> date | None:
+    '''Returns the latest date of the partition column of the rows that match
+        the filters, reading the partitions from the latest one back and
+        stopping at the first with matching rows, instead of reading the
+        index of every partition.
+
+    Args:
+        django_model (models.Model): the model of the partitioned table.
+        **filters: the filters of the rows.
+
+    Returns:
+        date | None: the latest date, or None if no rows match.
+    '''
+
+    scheme = PARTITION_SCHEMES[django_model]
+    queryset = django_model.objects.filter(**filters)
+
+    partitions = get_partitions(scheme)
+    if not partitions:
+        return queryset.aggregate(latest=Max(scheme.column))['latest']
+
+    bounds = [None] + [p.upper_bound for p in partitions]
+    for lower_bound, upper_bound in reversed(list(zip(bounds, bounds[1:]))):
+        partition_filter = Q()
+        if lower_bound is not None:
+            partition_filter &= Q(**{f'{scheme.column}__gte': lower_bound})
+        if upper_bound is not None:
+            partition_filter &= Q(**{f'{scheme.column}__lt': upper_bound})
+
+        latest_date = queryset.\
+            filter(partition_filter).\
+            aggregate(latest=Max(scheme.column))['latest']
+
+        if latest_date is not None:
+            return latest_date
+
+    return None
@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from django.db import OperationalError
+
+# The pools of the current process, by database alias
+_pools_lock = threading.Lock()
+_pools = dict()
+
+
+class ConnectionPool:
+    '''A pool of the raw connections of a database, shared by the threads of a
+        process, so that a request reuses the connection of a previous one
+        instead of opening its own. Up to "size" connections are kept open,
+        and up to "max_overflow" more are opened when all of them are in use,
+        which are closed once returned if there are already "size" idle ones.
+        Beyond that, the threads wait for a connection to be returned.
+
+    Args:
+        connect (Callable[[], Any]): opens a new raw connection.
+        is_usable (Callable[[Any], bool]): whether a raw connection still
+            works, e.g. by pinging the server.
+        size (int): the amount of connections kept open.
+        max_overflow (int): the amount of connections opened beyond the size.
+        timeout (float): the seconds to wait for a connection before failing.
+        max_age (float | None): the seconds after which a connection is
+            replaced, e.g. to stay below the wait_timeout of the server. None
+            or 0 keep them forever, since a CONN_MAX_AGE of 0 would otherwise
+            replace the connection on every checkout.
+        health_checks (bool): whether the idle connections are checked before
+            being reused.
+    '''
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        is_usable: Callable[[Any], bool],
+        size: int,
+        max_overflow: int = 0,
+        timeout: float = 30,
+        max_age: float | None = None,
+        health_checks: bool = True,
+    ):
+        self.connect = connect
+        self.is_usable = is_usable
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_age = max_age or None
+        self.health_checks = health_checks
+
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.opened_at = dict()
+        self.slots = 0
+        self.in_use = 0
+        self.closed = False
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.reconnects = 0
+
+    def checkout(self) -> tuple[Any, bool]:
+        '''Takes a connection from the pool, opening a new one when there are
+            no idle connections and the limit was not reached, or waiting for
+            one to be returned otherwise.
+
+        Raises:
+            OperationalError: when no connection is returned within the
+                timeout.
+
+        Returns:
+            tuple[Any, bool]: the raw connection and whether it's a new one.
+        '''
+
+        limit = self.size + self.max_overflow
+
+        with self.condition:
+            self.checkouts += 1
+
+            if not self.idle and self.slots >= limit:
+                self.waits += 1
+                started = time.monotonic()
+
+                available = self.condition.wait_for(
+                    lambda: self.idle or self.slots < limit,
+                    timeout=self.timeout,
+                )
+                self.wait_time += time.monotonic() - started
+
+                if not available:
+                    self.timeouts += 1
+                    raise OperationalError(
+                        f'No database connection was available after {self.timeout} seconds, '
+                        f'all the {limit} connections of the pool are in use.'
+                    )
+
+            self.in_use += 1
+
+            # The slot of a new connection is taken before opening it, which
+            # is done without holding the lock
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                connection = None
+                self.slots += 1
+
+        if connection is None:
+            return self._open(), True
+
+        if self.max_age is not None and time.monotonic() - self.opened_at[id(connection)] >= self.max_age:
+            self._discard(connection)
+            return self._open(), True
+
+        if self.health_checks and not self.is_usable(connection):
+            self._discard(connection)
+            with self.condition:
+                self.reconnects += 1
+            return self._open(), True
+
+        return connection, False
+
+    def checkin(self, connection: Any, reusable: bool = True) -> None:
+        '''Returns a connection to the pool, closing it when it can't be
+            reused or when the pool already has as many idle connections as
+            its size.
+
+        Args:
+            connection (Any): the raw connection.
+            reusable (bool, optional): whether the connection is left in a
+                clean state, e.g. not in the middle of a transaction. Defaults
+                to True.
+        '''
+
+        with self.condition:
+            self.in_use -= 1
+
+            if reusable and not self.closed and len(self.idle) < self.size:
+                self.idle.append(connection)
+                self.condition.notify()
+                return
+
+        self._discard(connection)
+        self._release_slot()
+
+    def close(self) -> None:
+        '''Closes the idle connections, and the ones in use once returned.'''
+
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, deque()
+
+        for connection in idle:
+            self._discard(connection)
+            self._release_slot()
+
+    def _open(self) -> Any:
+        '''Opens a connection on a slot already taken, releasing it if the
+            connection fails.'''
+
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self.condition:
+                self.in_use -= 1
+            self._release_slot()
+            raise
+
+        with self.condition:
+            self.opened_at[id(connection)] = time.monotonic()
+            self.connects += 1
+
+        return connection
+
+    def _discard(self, connection: Any) -> None:
+        '''Closes a connection, keeping its slot.'''
+
+        with self.condition:
+            self.opened_at.pop(id(connection), None)
+
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _release_slot(self) -> None:
+        with self.condition:
+            self.slots -= 1
+            self.condition.notify()
+
+    def get_stats(self) -> dict[str, int | float]:
+        '''Returns the statistics of the pool since the process started.
+
+        Returns:
+            dict[str, int | float]: the size of the pool, the connections open,
+                idle and in use, the amount of checkouts, of the ones that
+                waited and timed out, the seconds spent waiting, and the
+                amount of connections opened and of the ones opened to replace
+                a broken one.
+        '''
+
+        with self.condition:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': len(self.opened_at),
+                'idle': len(self.idle),
+                'in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 3),
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'reconnects': self.reconnects,
+            }
+
+
+def get_pool(alias: str, conn_params: dict, create: Callable[[], ConnectionPool]) -> ConnectionPool:
+    '''Returns the pool of the database of the current process, creating it on
+        first use, and again when the parameters of the connections change,
+        e.g. to the test database. The connections of a forked process are
+        never reused, since their sockets are shared with the parent.
+
+    Args:
+        alias (str): the alias of the database.
+        conn_params (dict): the parameters of the connections.
+        create (Callable[[], ConnectionPool]): creates the pool.
+
+    Returns:
+        ConnectionPool: the pool of the database.
+    '''
+
+    with _pools_lock:
+        pid, params, pool = _pools.get(alias, (None, None, None))
+
+        if pid != os.getpid() or params != conn_params:
+            if pid == os.getpid():
+                pool.close()
+
+            pool = create()
+            _pools[alias] = (os.getpid(), conn_params, pool)
+
+        return pool
+
+
+def get_pools_stats() -> dict[str, dict[str, int | float]]:
+    '''Returns the statistics of the pools of the current process.
+
+    Returns:
+        dict[str, dict[str, int | float]]: the statistics of each database.
+    '''
+
+    with _pools_lock:
+        pools = {
+            alias: pool
+            for alias, (pid, _, pool) in _pools.items()
+            if pid == os.getpid()
+        }
+
+    return {alias: pool.get_stats() for alias, pool in pools.items()}
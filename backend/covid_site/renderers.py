@@ -0,0 +1,112 @@
+import json
+from typing import Iterator
+
+from rest_framework import negotiation, renderers
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.utils.encoders import JSONEncoder
+
+from covid_site.columnar import (ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE,
+                                 is_columnar_supported, table_from_records,
+                                 to_arrow_stream, to_parquet)
+
+
+def dumps(data: object) -> str:
+    '''Encodes the data as compact JSON, like the JSON renderer of DRF.'''
+
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    '''Encodes each row as a JSON document on its own line.'''
+
+    for row in rows:
+        yield dumps(row) + '\n'
+
+
+def iter_json_array(rows: Iterator[dict]) -> Iterator[str]:
+    '''Encodes the rows as a JSON array, one row at a time.'''
+
+    yield '['
+
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + dumps(row)
+
+    yield ']'
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    '''Renders a list as newline delimited JSON, i.e. one row per line.'''
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if not isinstance(data, list):
+            data = [data]
+
+        return ''.join(iter_ndjson(data)).encode(self.charset)
+
+
+class JSONStreamRenderer(renderers.JSONRenderer):
+    '''Renders JSON, like the JSON renderer. The raw API endpoints stream the
+        rows instead of using it.'''
+
+    format = 'json-stream'
+
+
+# The formats whose rows are streamed by the raw API endpoints
+STREAM_FORMATS = {
+    NDJSONRenderer.format: (NDJSONRenderer.media_type, iter_ndjson),
+    JSONStreamRenderer.format: (JSONStreamRenderer.media_type, iter_json_array),
+}
+
+
+class ArrowStreamRenderer(renderers.BaseRenderer):
+    '''Renders a list as a table in the Arrow IPC streaming format.'''
+
+    media_type = ARROW_STREAM_MEDIA_TYPE
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return to_arrow_stream(table_from_records(data))
+
+
+class ParquetRenderer(renderers.BaseRenderer):
+    '''Renders a list as a table in the Parquet format.'''
+
+    media_type = PARQUET_MEDIA_TYPE
+    format = 'parquet'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return to_parquet(table_from_records(data))
+
+
+# The formats whose tables are built from the columns by the raw API endpoints
+COLUMNAR_FORMATS = {
+    ArrowStreamRenderer.format: (ArrowStreamRenderer.media_type, to_arrow_stream),
+    ParquetRenderer.format: (ParquetRenderer.media_type, to_parquet),
+}
+
+
+class ContentNegotiation(negotiation.DefaultContentNegotiation):
+    '''Leaves the columnar formats out when pyarrow is not installed, so that
+        the requests for them get a 406 response.'''
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if not is_columnar_supported():
+            renderers = [r for r in renderers if r.format not in COLUMNAR_FORMATS]
+
+            requested_format = format_suffix or request.query_params.get(
+                self.settings.URL_FORMAT_OVERRIDE)
+            if requested_format in COLUMNAR_FORMATS:
+                raise NotAcceptable(f'The {requested_format} format needs pyarrow, which is not installed.')
+
+        return super().select_renderer(request, renderers, format_suffix)
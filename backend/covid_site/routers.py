@@ -0,0 +1,251 @@
+import contextlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Iterator
+
+from covid_site.cache import UNVERSIONED_MODELS, get_table_versions
+from covid_site.models import DataVersion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, models
+from django.db.models import Max
+from django.http import HttpResponse
+from django.urls import reverse
+from rest_framework.permissions import SAFE_METHODS
+
+# Whether the reads of the current context go to the primary database
+USE_PRIMARY = ContextVar('use_primary', default=False)
+
+# The tables of Django kept on the app by inspectdb, e.g. of the users
+DJANGO_TABLE_PREFIXES = ('auth_', 'django_')
+
+# The signed cookie of the clients that must read their own writes
+PRIMARY_COOKIE = 'use_primary'
+
+# The state of the replicas, checked at most once per interval
+_replicas_lock = threading.Lock()
+_replicas = dict()
+_replicas_checking = set()
+
+
+@contextlib.contextmanager
+def use_primary() -> Iterator[None]:
+    '''Makes the reads inside the block go to the primary database, e.g. of the
+        ETL processes, which compare the records with the ones they just
+        wrote.'''
+
+    token = USE_PRIMARY.set(True)
+    try:
+        yield
+    finally:
+        USE_PRIMARY.reset(token)
+
+
+def is_data_model(model: models.Model) -> bool:
+    '''Checks if the model is of a data table, read by the API.'''
+
+    return model._meta.app_label == 'covid_site' \
+        and model not in UNVERSIONED_MODELS \
+        and not model._meta.db_table.startswith(DJANGO_TABLE_PREFIXES)
+
+
+def get_replication_lag(alias: str) -> float | None:
+    '''Returns the seconds the replica is behind the primary, 0 when the
+        database is not a replica, e.g. a copy used in development, or None
+        when its replication is stopped. Needs the REPLICATION CLIENT
+        privilege on MySQL.'''
+
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except DatabaseError:
+            # MySQL before 8.0.22 and MariaDB before 10.5.1
+            cursor.execute('SHOW SLAVE STATUS')
+
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+
+        status = dict(zip([c[0] for c in cursor.description], row))
+
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+
+def check_replica(alias: str) -> dict[str, object]:
+    '''Reads the replication lag of the replica and the date of the last write
+        of the tables it has, through the versions of the tables.
+
+    Args:
+        alias (str): the alias of the replica.
+
+    Returns:
+        dict[str, object]: the "lag" in seconds, None if the replica is not
+            usable, and the "updated_date" of the last write.
+    '''
+
+    try:
+        lag = get_replication_lag(alias)
+        updated_date = DataVersion.objects.\
+            using(alias).\
+            aggregate(updated_date=Max('updated_date'))['updated_date']
+    except DatabaseError as e:
+        print(f'The {alias} database replica is not available: {e}')
+        connections[alias].close()
+        return {'lag': None, 'updated_date': None}
+
+    return {'lag': lag, 'updated_date': updated_date}
+
+
+def get_replica_state(alias: str) -> dict[str, object]:
+    '''Returns the state of the replica, checked again once it's older than
+        DATABASE_REPLICA_CHECK_INTERVAL seconds. Only one thread checks the
+        replica, outside of the lock, while the other ones keep using its last
+        state, or the state of an unusable replica before its first check.'''
+
+    with _replicas_lock:
+        state = _replicas.get(alias)
+
+        if state is not None and time.monotonic() < state['expires']:
+            return state
+
+        if alias in _replicas_checking:
+            return state or {'lag': None, 'updated_date': None}
+
+        _replicas_checking.add(alias)
+
+    try:
+        state = check_replica(alias)
+        state['expires'] = time.monotonic() + settings.DATABASE_REPLICA_CHECK_INTERVAL
+
+        with _replicas_lock:
+            _replicas[alias] = state
+    finally:
+        with _replicas_lock:
+            _replicas_checking.discard(alias)
+
+    return state
+
+
+def is_replica_usable(alias: str, primary_date: datetime | None) -> bool:
+    '''Checks if the replica is available, is not behind the primary by more
+        than DATABASE_REPLICA_MAX_LAG seconds and already has the last write of
+        the primary, since the cached responses are keyed by the versions of
+        the tables, which are read from the primary.
+
+    Args:
+        alias (str): the alias of the replica.
+        primary_date (datetime | None): the date of the last write of the
+            tables on the primary, None if they were never written.
+
+    Returns:
+        bool: whether the reads can be sent to the replica.
+    '''
+
+    state = get_replica_state(alias)
+
+    if state['lag'] is None or state['lag'] > settings.DATABASE_REPLICA_MAX_LAG:
+        return False
+
+    if primary_date is None:
+        return True
+
+    return state['updated_date'] is not None and state['updated_date'] >= primary_date
+
+
+def get_replica() -> str | None:
+    '''Returns the alias of one of the usable replicas, or None if there are
+        none, falling back to the primary.'''
+
+    if not settings.DATABASE_REPLICAS:
+        return None
+
+    versions = get_table_versions()
+    primary_date = max((d for _, d in versions.values()), default=None)
+
+    replicas = [a for a in settings.DATABASE_REPLICAS if is_replica_usable(a, primary_date)]
+    if not replicas:
+        return None
+
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    '''Sends the reads of the data tables to the read replicas, listed by the
+        DATABASE_REPLICAS setting, and everything else to the primary: the
+        writes, the reads of the Django tables and of the versions of the
+        tables, the reads inside transactions and the ones of the contexts
+        pinned to the primary, see use_primary.'''
+
+    def db_for_read(self, model: models.Model, **hints) -> str | None:
+        if not is_data_model(model):
+            return None
+
+        # The reads of a transaction must see its writes
+        if USE_PRIMARY.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+
+        return get_replica()
+
+    def db_for_write(self, model: models.Model, **hints) -> str:
+        # Also the instances read from a replica are saved on the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1: models.Model, obj2: models.Model, **hints) -> bool:
+        # The replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> bool | None:
+        # The replicas get the schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
+
+
+class PrimaryReadsMiddleware:
+    '''Sends the reads of the requests to the primary database when the client
+        may need to read its own writes: the requests of the admin site, the
+        writes, and the requests of the client in the
+        DATABASE_PRIMARY_PIN_SECONDS after its last write, e.g. to the API
+        right after uploading a file to import.'''
+
+    def __init__(self, get_response: Callable):
+        self.get_response = get_response
+
+    def __call__(self, request: object) -> HttpResponse:
+        if not settings.DATABASE_REPLICAS or not self.is_pinned(request):
+            return self.get_response(request)
+
+        with use_primary():
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response.set_signed_cookie(
+                PRIMARY_COOKIE,
+                '1',
+                salt=PRIMARY_COOKIE,
+                max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+
+        return response
+
+    def is_pinned(self, request: object) -> bool:
+        '''Checks if the reads of the request must go to the primary.'''
+
+        if request.method not in SAFE_METHODS or request.path.startswith(reverse('admin:index')):
+            return True
+
+        return request.get_signed_cookie(
+            PRIMARY_COOKIE,
+            default=None,
+            salt=PRIMARY_COOKIE,
+            max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+        ) is not None
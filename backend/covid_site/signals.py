@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by the ETL processes after changing the records of a table, with the
+# model as sender and the keyword arguments "result" (the amount of created,
+# updated, unchanged and deleted records) and "seconds" (the time spent on it).
+table_updated = Signal()
@@ -1,2 +1,1375 @@
-# from django.test import TestCase
-# Create your tests here.
+import datetime
+import functools
+import io
+import json
+import threading
+import time
+import zoneinfo
+from unittest import mock, skipUnless
+
+import pandas as pd
+from django.apps import apps
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, models, transaction
+from django.db.models.deletion import Collector
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from covid_site import cache, columnar, routers, serializers
+from covid_site.etl.amostras import generate_sample_records
+from covid_site.etl.bulk_load import (full_reload, get_load_fields,
+                                      merge_staging_table, staging_table,
+                                      write_tsv)
+from covid_site.etl.dados_sico import (generate_total_deaths_records,
+                                       get_weeks_dates)
+from covid_site.etl.data import (generate_statistics_by_age_and_sex_combined_records,
+                                 generate_symptoms_type_records, pivot_sexes)
+from covid_site.etl.data_concelhos_new import classify_incidence
+from covid_site.etl.dimensions import COUNTIES_BY_NAME, clear_dimension_caches
+from covid_site.etl.ingest import ingest_csv
+from covid_site.etl.jobs import claim_next_job, requeue_jobs
+from covid_site.etl.rollups import (generate_county_year_deaths_records,
+                                    generate_region_deaths_since_records,
+                                    generate_region_year_deaths_records)
+from covid_site.etl.snapshots import generate_latest_incidence_records
+from covid_site.etl.tools import (ETLStage, get_existing_records, run_etl,
+                                  run_etl_graph, split_empty_records,
+                                  unpivot_columns)
+from covid_site.fast_serializers import FastSerializer, get_fast_serializer
+from covid_site.filters import (EQUALITY_OPERATORS, RANGE_OPERATORS,
+                                FilterSchema, get_indexed_fields)
+from covid_site.indexes import get_predicate_columns, propose_index
+from covid_site.models import (Age, County, CountyYearDeaths, DataVersion,
+                               GeneralData, ImportJob, Incidence,
+                               IncidenceCategory, LatestIncidence, Region,
+                               RegionDeathsSince, RegionYearDeaths, Sample,
+                               StatisticsByAgeAndSex,
+                               StatisticsByAgeAndSexCombined,
+                               StatisticsByRegion, StatisticsBySex, Symptoms,
+                               SymptomsType, TotalDeaths)
+from covid_site.partitions import (PARTITION_SCHEMES, Partition, get_archive_sql,
+                                   get_partition_filter, get_split_sql)
+from covid_site.pool import ConnectionPool
+from covid_site.routers import ReplicaRouter, use_primary
+from covid_site.signals import table_updated
+from covid_site.views import (decode_cursor, encode_cursor, get_keyset_filter,
+                              get_ordering)
+
+# The serializers of the raw API endpoints
+MODEL_SERIALIZERS = (
+    serializers.AgeSerializer,
+    serializers.CountySerializer,
+    serializers.GeneralDataSerializer,
+    serializers.IncidenceSerializer,
+    serializers.IncidenceCategorySerializer,
+    serializers.PopulationByAgeSerializer,
+    serializers.RegionSerializer,
+    serializers.ReinforcementSerializer,
+    serializers.SampleSerializer,
+    serializers.StatisticsByAgeAndSexSerializer,
+    serializers.StatisticsByRegionSerializer,
+    serializers.StatisticsBySexSerializer,
+    serializers.SymptomsSerializer,
+    serializers.SymptomsTypeSerializer,
+    serializers.TotalDeathsSerializer,
+    serializers.TransmissionRiskSerializer,
+    serializers.VaccinesSerializer,
+)
+
+
+def build_instance(django_model: models.Model, seed: int, depth: int = 1) -> models.Model:
+    '''Builds an unsaved instance with a value on every field, changing with the
+        seed, and with the related instances also built.'''
+
+    lisbon = zoneinfo.ZoneInfo('Europe/Lisbon')
+    obj = django_model(id=seed + 1)
+
+    for i, field in enumerate(django_model._meta.concrete_fields):
+        if field.primary_key:
+            continue
+
+        # Some of the nullable values are left empty
+        if field.null and (seed + i) % 4 == 0:
+            value = None
+        elif field.is_relation:
+            if depth == 0:
+                continue
+            value = build_instance(field.related_model, seed + i, depth - 1)
+        elif isinstance(field, models.DateTimeField):
+            value = datetime.datetime(2021, 7, 1 + seed, 12, i, 30, 123456, tzinfo=lisbon)
+        elif isinstance(field, models.DateField):
+            value = datetime.date(2021, 1 + seed, 1 + i)
+        elif isinstance(field, models.FloatField):
+            value = (seed + i) / 3
+        elif isinstance(field, models.IntegerField):
+            value = seed * 100 + i
+        else:
+            value = f'Çé {seed} {i}'[:field.max_length]
+
+        setattr(obj, field.name, value)
+
+    return obj
+
+
+def get_data_models() -> list[models.Model]:
+    '''Returns the models of the unmanaged data tables, each one after the
+        ones it references.'''
+
+    pending = [
+        m for m in apps.get_app_config('covid_site').get_models()
+        if not m._meta.managed and routers.is_data_model(m)
+    ]
+
+    data_models = list()
+    while pending:
+        for django_model in pending:
+            references = {f.related_model for f in django_model._meta.concrete_fields if f.is_relation}
+            if not references & set(pending) - {django_model}:
+                pending.remove(django_model)
+                data_models.append(django_model)
+                break
+
+    return data_models
+
+
+class DataTablesTestCase(TransactionTestCase):
+    '''Creates the unmanaged data tables, which are not created by the
+        migrations, for the tests of the class.'''
+
+    data_models = get_data_models()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        with connection.schema_editor() as schema_editor:
+            for django_model in cls.data_models:
+                schema_editor.create_model(django_model)
+
+    @classmethod
+    def tearDownClass(cls):
+        with connection.schema_editor() as schema_editor:
+            for django_model in reversed(cls.data_models):
+                schema_editor.delete_model(django_model)
+
+        super().tearDownClass()
+
+    def tearDown(self):
+        # The unmanaged tables are not flushed between the tests, and must be
+        # emptied after the managed ones that reference them, e.g. the
+        # snapshots
+        for django_model in apps.get_app_config('covid_site').get_models():
+            if django_model._meta.managed and routers.is_data_model(django_model):
+                django_model.objects.all().delete()
+
+        for django_model in reversed(self.data_models):
+            django_model.objects.all().delete()
+
+    def create_county(self, name: str = 'Lisboa') -> County:
+        region, _ = Region.objects.get_or_create(name='LVT', short_name='lvt')
+
+        return County.objects.create(
+            dicofre=str(County.objects.count() + 1),
+            district=name,
+            county_name=name,
+            region=region,
+        )
+
+
+def values_list_row(obj: models.Model, lookups: tuple[str]) -> tuple:
+    '''Builds the tuple that values_list would read for the instance.'''
+
+    return tuple(functools.reduce(getattr, lookup.split('__'), obj) for lookup in lookups)
+
+
+class FastSerializerTests(SimpleTestCase):
+
+    def assert_same_output(self, serializer, fields=None):
+        objs = [build_instance(serializer.Meta.model, seed) for seed in range(4)]
+
+        drf_serializer = serializer(objs, many=True)
+        if fields is not None:
+            for field_name in set(drf_serializer.child.fields.keys()) - set(fields):
+                drf_serializer.child.fields.pop(field_name)
+
+        fast_serializer = FastSerializer(serializer=serializer, fields=fields)
+        rows = [values_list_row(obj, fast_serializer.lookups) for obj in objs]
+
+        self.assertEqual(
+            JSONRenderer().render(list(fast_serializer.iter_rows(rows))),
+            JSONRenderer().render(drf_serializer.data),
+        )
+
+    def test_same_output_as_drf(self):
+        for serializer in MODEL_SERIALIZERS:
+            if get_fast_serializer(serializer) is None:
+                continue
+
+            with self.subTest(serializer=serializer.__name__):
+                self.assert_same_output(serializer)
+
+    def test_same_output_as_drf_with_fields(self):
+        self.assert_same_output(
+            serializers.StatisticsByAgeAndSexSerializer,
+            fields=('updated_date', 'age_start', 'reference_date', 'age', 'confirmed'),
+        )
+        self.assert_same_output(
+            serializers.StatisticsByRegionSerializer,
+            fields=('region_name', 'inserted_date'),
+        )
+
+    def test_normalized_fields(self):
+        serializer = serializers.StatisticsByRegionSerializer
+
+        fast_serializer = get_fast_serializer(serializer, ('region_name', 'reference_date', 'region_name'))
+        self.assertEqual(fast_serializer.names, ('reference_date', 'region_name'))
+        self.assertIs(get_fast_serializer(serializer, ('reference_date', 'region_name')), fast_serializer)
+
+        all_fields = tuple(serializer().fields.keys())
+        self.assertIs(get_fast_serializer(serializer, all_fields[::-1]), get_fast_serializer(serializer))
+
+    def test_unsupported_source(self):
+        self.assertIsNone(get_fast_serializer(serializers.StatisticsByAgeAndSexSerializer))
+
+        with self.assertRaises(TypeError):
+            FastSerializer(serializers.StatisticsByAgeAndSexSerializer, fields=('age_range',))
+
+
+class FilterSchemaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.schema = FilterSchema(StatisticsByRegion, {
+            'reference_date': RANGE_OPERATORS,
+            'region': EQUALITY_OPERATORS,
+        })
+
+    def test_declared_filters(self):
+        self.assertEqual(
+            self.schema.get_filters({
+                'reference_date__gte': '2021-01-01',
+                'region__in': '1, 3',
+            }),
+            {
+                'reference_date__gte': datetime.date(2021, 1, 1),
+                'region__in': [1, 3],
+            },
+        )
+
+    def test_undeclared_filters(self):
+        for param in ('confirmed', 'region__name__icontains', 'region__gte', 'reference_date__year'):
+            with self.subTest(param=param), self.assertRaises(ValidationError):
+                self.schema.get_filters({param: '1'})
+
+    def test_invalid_values(self):
+        for param, value in (('reference_date', '2021-13-01'), ('region', 'north'), ('region__in', '')):
+            with self.subTest(param=param), self.assertRaises(ValidationError):
+                self.schema.get_filters({param: value})
+
+    def test_not_indexed_field(self):
+        with self.assertRaises(ImproperlyConfigured):
+            FilterSchema(GeneralData, {'confirmed': EQUALITY_OPERATORS})
+
+    def test_index_prefix(self):
+        schema = FilterSchema(StatisticsBySex, {'reference_date': RANGE_OPERATORS, 'sex': EQUALITY_OPERATORS})
+
+        # The second column of the (reference_date, sex) constraint needs the first one
+        with self.assertRaises(ValidationError):
+            schema.get_filters({'sex': 'M'})
+
+        self.assertEqual(
+            schema.get_filters({'reference_date__gte': '2021-03-01', 'sex': 'M'}),
+            {'reference_date__gte': datetime.date(2021, 3, 1), 'sex__exact': 'M'},
+        )
+
+        self.assertIn('date_end', get_indexed_fields(TotalDeaths))
+        self.assertNotIn('sex', get_indexed_fields(StatisticsBySex))
+
+
+class PivotSexesTests(SimpleTestCase):
+
+    def test_pivot_sexes(self):
+        statistics = pd.DataFrame({
+            'reference_date': ['2021-01-01', '2021-01-01', '2021-01-02', '2021-01-02', '2021-01-03'],
+            'sex': ['m', 'f', 'm', 'f', 'm'],
+            'confirmed': [1, 2, None, 4, 5],
+            'deaths': [6, 7, None, None, 8],
+        })
+
+        wide = pivot_sexes(statistics, id_columns=('reference_date',))
+
+        # The days without values for both sexes are left out, like on a join
+        self.assertEqual(
+            wide.to_dict(orient='records'),
+            [{
+                'reference_date': '2021-01-01',
+                'male_confirmed': 1.0,
+                'female_confirmed': 2.0,
+                'male_deaths': 6.0,
+                'female_deaths': 7.0,
+            }],
+        )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    class Connection:
+
+        def __init__(self):
+            self.usable = True
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    def setUp(self):
+        self.pool = ConnectionPool(
+            connect=self.Connection,
+            is_usable=lambda c: c.usable,
+            size=1,
+            max_overflow=1,
+            timeout=0.01,
+        )
+
+    def test_reuse(self):
+        connection, created = self.pool.checkout()
+        self.pool.checkin(connection)
+
+        self.assertEqual(self.pool.checkout(), (connection, False))
+
+    def test_overflow_and_timeout(self):
+        first, _ = self.pool.checkout()
+        second, _ = self.pool.checkout()
+
+        with self.assertRaises(OperationalError):
+            self.pool.checkout()
+
+        # The connection beyond the size is closed once there is an idle one
+        self.pool.checkin(first)
+        self.pool.checkin(second)
+        self.assertTrue(second.closed)
+
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['open'], stats['waits'], stats['timeouts']), (1, 1, 1))
+
+    def test_broken_connection(self):
+        connection, _ = self.pool.checkout()
+        connection.usable = False
+        self.pool.checkin(connection)
+
+        new_connection, created = self.pool.checkout()
+
+        self.assertTrue(created)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.get_stats()['reconnects'], 1)
+
+    def test_no_max_age(self):
+        pool = ConnectionPool(connect=self.Connection, is_usable=lambda c: c.usable, size=1, max_age=0)
+
+        # A CONN_MAX_AGE of 0 keeps the pooled connections
+        connection, _ = pool.checkout()
+        pool.checkin(connection)
+
+        self.assertEqual(pool.checkout(), (connection, False))
+        self.assertFalse(connection.closed)
+
+
+class IndexAdvisorTests(SimpleTestCase):
+
+    columns = {
+        'incidence': {'id', 'county_id', 'reference_date', 'incidence'},
+        'county': {'id', 'county_name'},
+    }
+
+    def test_orm_query(self):
+        sql = (
+            'SELECT `incidence`.`id`, `county`.`county_name` FROM `incidence` '
+            'INNER JOIN `county` ON (`incidence`.`county_id` = `county`.`id`) '
+            'WHERE `incidence`.`county_id` = %s '
+            'ORDER BY `incidence`.`reference_date` DESC, `incidence`.`id` DESC LIMIT 2'
+        )
+
+        predicates = get_predicate_columns(sql, self.columns)
+
+        self.assertEqual(predicates['county']['equality'], ['id'])
+        self.assertEqual(
+            propose_index(predicates['incidence'], limited=True),
+            ('county_id', 'reference_date', 'id'),
+        )
+
+    def test_raw_query(self):
+        sql = '''
+            SELECT i.incidence, c.county_name
+            FROM incidence AS i
+            JOIN county AS c ON i.county_id = c.id
+            WHERE i.reference_date = (SELECT MAX(reference_date) FROM incidence)
+                AND i.incidence >= 100
+            ORDER BY county_name;
+        '''
+
+        predicates = get_predicate_columns(sql, self.columns)
+
+        self.assertEqual(predicates['incidence']['equality'], ['reference_date'])
+        self.assertEqual(predicates['incidence']['range'], ['incidence'])
+        self.assertEqual(predicates['county']['order'], [('county_name', 'ASC')])
+        self.assertEqual(
+            propose_index(predicates['incidence'], limited=False),
+            ('reference_date', 'incidence'),
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DATABASE_REPLICA_MAX_LAG=30)
+class ReplicaRouterTests(SimpleTestCase):
+
+    primary_date = datetime.datetime(2022, 6, 1, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+        # The states are kept as if they were just read from the databases
+        expires = time.monotonic() + 60
+        cache._versions.update(
+            expires=expires,
+            versions={'general_data': (1, self.primary_date)},
+        )
+        routers._replicas['replica_0'] = {
+            'lag': 0,
+            'updated_date': self.primary_date,
+            'expires': expires,
+        }
+
+    def tearDown(self):
+        cache._versions['expires'] = 0
+        routers._replicas.clear()
+
+    def test_reads(self):
+        self.assertEqual(self.router.db_for_read(GeneralData), 'replica_0')
+        self.assertIsNone(self.router.db_for_read(DataVersion))
+        self.assertEqual(self.router.db_for_write(GeneralData), 'default')
+
+        with use_primary():
+            self.assertIsNone(self.router.db_for_read(GeneralData))
+
+    def test_fallback(self):
+        routers._replicas['replica_0']['lag'] = 60
+        self.assertIsNone(self.router.db_for_read(GeneralData))
+
+        # The replica is missing the last write of the primary
+        routers._replicas['replica_0'].update(
+            lag=0,
+            updated_date=self.primary_date - datetime.timedelta(seconds=1),
+        )
+        self.assertIsNone(self.router.db_for_read(GeneralData))
+
+    def test_check_in_flight(self):
+        routers._replicas['replica_0']['expires'] = 0
+        checking, release = threading.Event(), threading.Event()
+
+        def check_replica(alias: str) -> dict[str, object]:
+            checking.set()
+            release.wait(5)
+            return {'lag': 60, 'updated_date': self.primary_date}
+
+        with mock.patch.object(routers, 'check_replica', side_effect=check_replica):
+            thread = threading.Thread(target=routers.get_replica_state, args=('replica_0',))
+            thread.start()
+            checking.wait(5)
+
+            # The other threads keep using the last state while the replica is checked
+            self.assertEqual(self.router.db_for_read(GeneralData), 'replica_0')
+
+            release.set()
+            thread.join()
+
+        self.assertIsNone(self.router.db_for_read(GeneralData))
+
+
+class PartitionTests(SimpleTestCase):
+
+    scheme = PARTITION_SCHEMES[Incidence]
+
+    def test_intervals(self):
+        starts = self.scheme.get_starts(datetime.date(2021, 11, 15), datetime.date(2022, 2, 1))
+
+        self.assertEqual([self.scheme.get_name(s) for s in starts], ['p202111', 'p202112', 'p202201', 'p202202'])
+        self.assertEqual(self.scheme.shift(starts[-1], 1), datetime.date(2022, 3, 1))
+
+    def test_split_and_archive(self):
+        current_start = self.scheme.get_start(datetime.date.today())
+        partitions = [
+            Partition('p_old', self.scheme.shift(current_start, -1), 10),
+            Partition('p_current', current_start, 10),
+            Partition('p_future', None, 0),
+        ]
+
+        statements = get_split_sql(self.scheme, partitions, ahead=1)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('REORGANIZE PARTITION p_future INTO', statements[0])
+        self.assertEqual(statements[0].count('VALUES LESS THAN'), 3)
+
+        self.assertEqual(get_split_sql(self.scheme, partitions[:1] + partitions[2:], ahead=-2), [])
+
+        statements = get_archive_sql(self.scheme, partitions, before=current_start - datetime.timedelta(days=1))
+        self.assertEqual(statements[-1], 'ALTER TABLE `incidence` DROP PARTITION p_old')
+        self.assertEqual(len(statements), 4)
+
+    def test_partition_filter(self):
+        records = [
+            {'reference_date': datetime.date(2022, 1, 3)},
+            {'reference_date': datetime.date(2022, 1, 1)},
+        ]
+
+        self.assertEqual(
+            get_partition_filter(Incidence, records),
+            models.Q(reference_date__range=(datetime.date(2022, 1, 1), datetime.date(2022, 1, 3))),
+        )
+        self.assertEqual(get_partition_filter(GeneralData, records), models.Q())
+
+
+class SplitEmptyRecordsTests(SimpleTestCase):
+
+    def test_split(self):
+        day = datetime.date(2022, 1, 1)
+        records = [
+            Symptoms(reference_date=day, symptoms_type_id=1, quantity=0.5),
+            Symptoms(reference_date=day, symptoms_type_id=2, quantity=None),
+            # The last record of a key wins, even if it's empty
+            Symptoms(reference_date=day, symptoms_type_id=3, quantity=0.2),
+            Symptoms(reference_date=day, symptoms_type_id=3, quantity=None),
+        ]
+
+        records_with_values, empty_keys = split_empty_records(Symptoms, records)
+
+        self.assertEqual(records_with_values, records[:1])
+        self.assertEqual(
+            empty_keys,
+            [
+                {'reference_date': day, 'symptoms_type_id': 2},
+                {'reference_date': day, 'symptoms_type_id': 3},
+            ],
+        )
+
+
+class ExistingRecordsTests(DataTablesTestCase):
+
+    def test_composite_key(self):
+        county = self.create_county()
+        weeks = [datetime.date(2020, 1, 6) + datetime.timedelta(weeks=i) for i in range(10)]
+        for week in weeks:
+            TotalDeaths.objects.create(
+                county=county,
+                date_start=week,
+                date_end=week + datetime.timedelta(days=6),
+                deaths=1,
+            )
+
+        keys = {(county.id, weeks[-1], weeks[-1] + datetime.timedelta(days=6))}
+
+        with CaptureQueriesContext(connection) as queries:
+            index = get_existing_records(TotalDeaths, keys)
+
+        self.assertEqual(list(index.keys()), list(keys))
+        self.assertEqual(index[next(iter(keys))][1], (1,))
+
+        # The history of the county is not read
+        self.assertIn('BETWEEN', queries.captured_queries[0]['sql'])
+
+
+class UpsertTests(DataTablesTestCase):
+
+    def run_sample_etl(self, totals: list[int]) -> dict[str, int]:
+        df = pd.DataFrame({
+            'reference_date': pd.to_datetime(['01-03-2021', '02-03-2021'], format='%d-%m-%Y', utc=True),
+            'total': totals,
+            'new': [10, 20],
+        })
+
+        return run_etl(df=df, django_model=Sample, specific_etl_method=generate_sample_records)
+
+    def test_reimport(self):
+        signals = list()
+
+        def on_table_updated(sender, result, **kwargs):
+            signals.append(result)
+
+        table_updated.connect(on_table_updated, sender=Sample)
+        self.addCleanup(table_updated.disconnect, on_table_updated, sender=Sample)
+
+        result = self.run_sample_etl([100, 200])
+        self.assertEqual((result['created'], result['updated']), (2, 0))
+        self.assertEqual(len(signals), 1)
+
+        # The same data changes nothing and sends no signal
+        result = self.run_sample_etl([100, 200])
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 2))
+        self.assertEqual(len(signals), 1)
+
+        result = self.run_sample_etl([100, 250])
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 1, 1))
+        self.assertEqual(
+            list(Sample.objects.order_by('reference_date').values_list('total', flat=True)),
+            [100, 250],
+        )
+        self.assertEqual(len(signals), 2)
+
+
+class UnpivotColumnsTests(SimpleTestCase):
+
+    df = pd.DataFrame({
+        'reference_date': ['2021-03-01', '2021-03-02'],
+        'confirmed_m': [1, 2],
+        'confirmed_f': [3, None],
+        'deaths_m': [5, 6],
+        'deaths_f': [7, 8],
+        'ignored': [0, 0],
+    })
+
+    def test_measures(self):
+        long_df = unpivot_columns(
+            df=self.df,
+            id_columns=('reference_date',),
+            pattern=r'(?P<measure>confirmed|deaths)_(?P<sex>m|f)',
+        ).sort_values(['reference_date', 'sex'])
+
+        self.assertEqual(list(long_df.columns), ['reference_date', 'sex', 'confirmed', 'deaths'])
+        self.assertEqual(long_df['sex'].tolist(), ['f', 'm', 'f', 'm'])
+        self.assertEqual(long_df['deaths'].tolist(), [7, 5, 8, 6])
+
+        # The missing values are kept, as a row without values
+        self.assertTrue(pd.isna(long_df['confirmed'].iloc[2]))
+
+    def test_single_value(self):
+        long_df = unpivot_columns(
+            df=self.df,
+            id_columns=('reference_date',),
+            pattern=r'deaths_(?P<sex>m|f)',
+            value_name='deaths',
+        )
+
+        self.assertEqual(list(long_df.columns), ['reference_date', 'sex', 'deaths'])
+        self.assertEqual(sorted(long_df['deaths'].tolist()), [5, 6, 7, 8])
+
+
+class IngestCsvTests(DataTablesTestCase):
+
+    header = 'data,amostras,amostras_novas,amostras_pcr,amostras_pcr_novas,' \
+        'amostras_antigenio,amostras_antigenio_novas\n'
+
+    def get_csv(self, dates: list[str]) -> io.StringIO:
+        lines = [f'{d},{i},1,1,1,1,1\n' for i, d in enumerate(dates)]
+        return io.StringIO(self.header + ''.join(lines))
+
+    def test_failed_chunk(self):
+        chunks = list()
+
+        status = ingest_csv(
+            csv_file=self.get_csv(['01-03-2021', '02-03-2021', '03-03-2021', 'invalid']),
+            file_name='amostras.csv',
+            chunk_size=2,
+            on_chunk=lambda chunks_done, rows_done: chunks.append((chunks_done, rows_done)),
+        )
+
+        # The first chunk stays committed, and the whole second one is rolled back
+        self.assertFalse(status.succeeded)
+        self.assertEqual(chunks, [(1, 2)])
+        self.assertEqual(Sample.objects.count(), 2)
+
+        # The import resumes from the chunk that failed
+        status = ingest_csv(
+            csv_file=self.get_csv(['01-03-2021', '02-03-2021', '03-03-2021', '04-03-2021']),
+            file_name='amostras.csv',
+            chunk_size=2,
+            start_chunk=1,
+            start_rows=2,
+            on_chunk=lambda chunks_done, rows_done: chunks.append((chunks_done, rows_done)),
+        )
+
+        self.assertTrue(status.succeeded)
+        self.assertEqual(chunks, [(1, 2), (2, 4)])
+        self.assertEqual(Sample.objects.count(), 4)
+
+
+class ImportJobTests(TestCase):
+
+    def create_job(self, **kwargs) -> ImportJob:
+        return ImportJob.objects.create(file_name='data.csv', file_path='data.csv', **kwargs)
+
+    def test_claim(self):
+        first = self.create_job()
+        second = self.create_job()
+
+        self.assertEqual(claim_next_job(), first)
+        self.assertEqual(claim_next_job(), second)
+        self.assertIsNone(claim_next_job())
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImportJob.RUNNING)
+        self.assertIsNotNone(first.started_date)
+
+    @override_settings(ETL_JOB_TIMEOUT=60)
+    def test_requeue(self):
+        now = timezone.now()
+        failed = self.create_job(status=ImportJob.FAILED, message='Error', started_date=now, finished_date=now)
+        stale = self.create_job(status=ImportJob.RUNNING, started_date=now - datetime.timedelta(minutes=5))
+        running = self.create_job(status=ImportJob.RUNNING, started_date=now)
+        succeeded = self.create_job(status=ImportJob.SUCCEEDED, started_date=now, finished_date=now)
+
+        self.assertEqual(requeue_jobs(ImportJob.objects.all()), 2)
+
+        for job, status in ((failed, ImportJob.PENDING), (stale, ImportJob.PENDING),
+                            (running, ImportJob.RUNNING), (succeeded, ImportJob.SUCCEEDED)):
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+
+        self.assertEqual(failed.message, '')
+        self.assertIsNone(failed.started_date)
+        self.assertIsNone(failed.finished_date)
+        self.assertEqual(claim_next_job(), failed)
+
+
+class EtlGraphTests(DataTablesTestCase):
+
+    def test_failed_stage(self):
+        df = pd.DataFrame({
+            'reference_date': pd.to_datetime(['01-03-2021'], format='%d-%m-%Y', utc=True),
+            'total': [100],
+            'new': [10],
+            'symptoms_tosse': [0.5],
+        })
+
+        def generate_failed_records(df: pd.DataFrame) -> list[Symptoms]:
+            raise ValueError('Invalid symptoms')
+
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                run_etl_graph(
+                    df=df,
+                    stages=[
+                        ETLStage(
+                            django_model=Sample,
+                            specific_etl_method=lambda df: generate_sample_records(df=df[['reference_date', 'total', 'new']]),
+                        ),
+                        ETLStage(django_model=SymptomsType, specific_etl_method=generate_symptoms_type_records),
+                        ETLStage(
+                            django_model=Symptoms,
+                            specific_etl_method=generate_failed_records,
+                            depends_on=(SymptomsType,),
+                        ),
+                    ],
+                )
+
+        # The writes of the other stages are rolled back with the transaction
+        self.assertFalse(Sample.objects.exists())
+        self.assertFalse(SymptomsType.objects.exists())
+
+    def test_stage_order(self):
+        with self.assertRaises(ValueError):
+            run_etl_graph(
+                df=pd.DataFrame(),
+                stages=[
+                    ETLStage(django_model=Symptoms, specific_etl_method=list, depends_on=(SymptomsType,)),
+                    ETLStage(django_model=SymptomsType, specific_etl_method=list),
+                ],
+            )
+
+
+class DimensionCacheTests(DataTablesTestCase):
+
+    def setUp(self):
+        clear_dimension_caches()
+        self.addCleanup(clear_dimension_caches)
+
+    def test_lookup(self):
+        county = self.create_county('Póvoa de Varzim')
+
+        # The table is only read on the first lookup
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(COUNTIES_BY_NAME.get('POVOA DE VARZIM'), county)
+            self.assertEqual(COUNTIES_BY_NAME.get('Póvoa de Varzim '), county)
+            self.assertIsNone(COUNTIES_BY_NAME.get('Porto'))
+
+        self.assertEqual(len(queries), 1)
+
+    def test_invalidate(self):
+        self.create_county('Lisboa')
+        self.assertIsNone(COUNTIES_BY_NAME.get('Porto'))
+
+        # Writing the table drops its index
+        county = self.create_county('Porto')
+        self.assertEqual(COUNTIES_BY_NAME.get('Porto'), county)
+
+        County.objects.filter(id=county.id).update(county_name='Braga')
+        table_updated.send(sender=County, result=dict(), seconds=0)
+        self.assertIsNone(COUNTIES_BY_NAME.get('Porto'))
+        self.assertEqual(COUNTIES_BY_NAME.get('Braga').id, county.id)
+
+    def test_fast_delete(self):
+        # Only the dimension tables have receivers of their deletes, so the
+        # other ones are still deleted in bulk
+        collector = Collector(using=connection.alias)
+        self.assertTrue(collector.can_fast_delete(RegionYearDeaths.objects.all()))
+        self.assertFalse(collector.can_fast_delete(SymptomsType.objects.all()))
+
+
+class ClassifyIncidenceTests(DataTablesTestCase):
+
+    def setUp(self):
+        clear_dimension_caches()
+        self.addCleanup(clear_dimension_caches)
+
+    def test_categories(self):
+        IncidenceCategory.objects.bulk_create([
+            IncidenceCategory(category_lower_limit=0, category_upper_limit=120, incidence_risk='Moderado'),
+            IncidenceCategory(category_lower_limit=120, category_upper_limit=240, incidence_risk='Elevado'),
+        ])
+        low, high = IncidenceCategory.objects.order_by('category_lower_limit')
+
+        incidence = pd.Series([50, 120, 240, 1000, -1, None, 'invalid'])
+
+        # The values above the highest limit are kept in the highest category
+        self.assertEqual(
+            classify_incidence(incidence).tolist(),
+            [low.id, high.id, high.id, high.id, pd.NA, pd.NA, pd.NA],
+        )
+
+
+class DadosSicoTests(DataTablesTestCase):
+
+    def setUp(self):
+        clear_dimension_caches()
+        self.addCleanup(clear_dimension_caches)
+
+    def test_weeks_dates(self):
+        weeks_dates = get_weeks_dates(['Semana 53-2020', 'Semana 01-2021', 'Semana 52-2021'])
+
+        # The weeks are clipped to the year of the file
+        self.assertEqual(
+            weeks_dates['date_start'].dt.date.tolist(),
+            [datetime.date(2021, 1, 1), datetime.date(2021, 1, 4), datetime.date(2021, 12, 27)],
+        )
+        self.assertEqual(
+            weeks_dates['date_end'].dt.date.tolist(),
+            [datetime.date(2021, 1, 3), datetime.date(2021, 1, 10), datetime.date(2021, 12, 31)],
+        )
+
+    def test_total_deaths_records(self):
+        county = self.create_county('Lagoa (Faro)')
+
+        df = pd.DataFrame({
+            'county': ['Lagoa', 'Estrangeiro'],
+            'Semana 53-2020': [1, 5],
+            'Semana 01-2021': [2, 5],
+        })
+
+        records = generate_total_deaths_records(df=df)
+
+        self.assertEqual(
+            sorted((r.county_id, r.date_start, r.date_end, r.deaths) for r in records),
+            [
+                (county.id, pd.Timestamp(2021, 1, 1), pd.Timestamp(2021, 1, 3), 1),
+                (county.id, pd.Timestamp(2021, 1, 4), pd.Timestamp(2021, 1, 10), 2),
+            ],
+        )
+
+    def test_unknown_county(self):
+        df = pd.DataFrame({'county': ['Atlântida'], 'Semana 01-2021': [1]})
+
+        with self.assertRaises(ValueError):
+            generate_total_deaths_records(df=df)
+
+
+class BulkLoadTests(DataTablesTestCase):
+
+    def test_write_tsv(self):
+        records = [
+            Sample(reference_date=datetime.date(2021, 3, 1), total=100, new=None),
+            Sample(reference_date=datetime.date(2021, 3, 2), total=200, new=20),
+            Sample(reference_date=datetime.date(2021, 3, 1), total=150, new=50),
+        ]
+
+        file = io.StringIO()
+        rows = write_tsv(django_model=Sample, records=records, file=file)
+
+        # The last record of each key wins, and the empty values are NULL
+        self.assertEqual(rows, 2)
+        lines = [line.split('\t') for line in file.getvalue().splitlines()]
+        self.assertCountEqual(
+            [line[:7] for line in lines],
+            [
+                ['2021-03-01', '150', '50', '\\N', '\\N', '\\N', '\\N'],
+                ['2021-03-02', '200', '20', '\\N', '\\N', '\\N', '\\N'],
+            ],
+        )
+
+    def test_unsupported_database(self):
+        df = pd.DataFrame({
+            'reference_date': pd.to_datetime(['01-03-2021'], format='%d-%m-%Y', utc=True),
+            'total': [100],
+            'new': [10],
+        })
+
+        # The databases without a native bulk load fall back to the upsert
+        with full_reload():
+            result = run_etl(df=df, django_model=Sample, specific_etl_method=generate_sample_records)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(Sample.objects.get().total, 100)
+
+    def load_records(self, django_model: models.Model, records: list[object]) -> dict[str, int]:
+        '''Loads the TSV of the records into the staging table and merges it,
+            with INSERTs standing in for the native bulk load.'''
+
+        file = io.StringIO()
+        write_tsv(django_model=django_model, records=records, file=file)
+        rows = [
+            [None if v == '\\N' else v for v in line.split('\t')]
+            for line in file.getvalue().splitlines()
+        ]
+
+        columns = ', '.join(f.column for f in get_load_fields(django_model))
+        placeholders = ', '.join('%s' for _ in get_load_fields(django_model))
+
+        with transaction.atomic(), staging_table(django_model) as staging:
+            with connection.cursor() as cursor:
+                cursor.executemany(f'INSERT INTO {staging} ({columns}) VALUES ({placeholders})', rows)
+
+            return merge_staging_table(django_model=django_model, staging=staging)
+
+    def test_reload(self):
+        records = [Age(age_start=0, age_end=9), Age(age_start=80, age_end=None)]
+
+        result = self.load_records(Age, records)
+        self.assertEqual(result['created'], 2)
+
+        # The NULL age_end of the 80+ age matches the stored one
+        result = self.load_records(Age, records)
+        self.assertEqual((result['created'], result['updated']), (0, 2))
+        self.assertEqual(Age.objects.count(), 2)
+
+
+class ConditionalResponseTests(DataTablesTestCase):
+
+    def setUp(self):
+        cache._versions['expires'] = 0
+        Sample.objects.create(reference_date=datetime.date(2021, 3, 1), total=100)
+
+    def test_not_modified(self):
+        response = self.client.get('/api/sample/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.client.get('/api/sample/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+    def test_modified(self):
+        etag = self.client.get('/api/sample/')['ETag']
+
+        Sample.objects.create(reference_date=datetime.date(2021, 3, 2), total=200)
+
+        response = self.client.get('/api/sample/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_representations(self):
+        etag = self.client.get('/api/sample/')['ETag']
+
+        # Each query and media type is a representation of its own
+        for path, accept in (
+            ('/api/sample/?reference_date=2021-03-01', 'application/json'),
+            ('/api/sample/', 'application/x-ndjson'),
+            ('/api/sample/?format=ndjson', '*/*'),
+        ):
+            response = self.client.get(path, HTTP_ACCEPT=accept, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_version_bump(self):
+        Sample.objects.bulk_create(
+            Sample(reference_date=datetime.date(2020, 1, 1) + datetime.timedelta(days=d), total=d)
+            for d in range(300)
+        )
+        version = DataVersion.objects.get(table_name='sample').version
+
+        # The rows are deleted in bulk, bumping the version once
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            Sample.objects.filter(reference_date__year=2020).delete()
+
+        self.assertLess(len(queries), 10)
+        self.assertEqual(DataVersion.objects.get(table_name='sample').version, version + 1)
+
+    def test_cached(self):
+        caches['api'].clear()
+        self.addCleanup(caches['api'].clear)
+
+        self.client.get('/api/statistics_by_sex_combined/')
+
+        # The same query is served from the cache, each media type on its own
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/statistics_by_sex_combined/')
+        self.assertFalse(any('statistics_by_sex_combined' in q['sql'] for q in queries))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/statistics_by_sex_combined/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertTrue(any('statistics_by_sex_combined' in q['sql'] for q in queries))
+
+    def test_current_year(self):
+        caches['api'].clear()
+        self.addCleanup(caches['api'].clear)
+
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2021, 12, 31)):
+            response = self.client.get('/api/county_summary/')
+        self.assertEqual(response.status_code, 200)
+
+        # The totals of the new year are read on its first day
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2022, 1, 1)):
+            with CaptureQueriesContext(connection) as queries:
+                new_response = self.client.get('/api/county_summary/', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(new_response.status_code, 200)
+        self.assertNotEqual(new_response['ETag'], response['ETag'])
+        self.assertTrue(any('county_year_deaths' in q['sql'] for q in queries))
+
+
+class KeysetPaginationTests(DataTablesTestCase):
+
+    def setUp(self):
+        cache._versions['expires'] = 0
+
+        regions = [Region.objects.create(name=n, short_name=n.lower()) for n in ('Norte', 'Centro', 'Alentejo')]
+        for day in range(1, 4):
+            for region in regions:
+                StatisticsByRegion.objects.create(
+                    reference_date=datetime.date(2021, 3, day),
+                    region=region,
+                    confirmed=day,
+                )
+
+    def get_pages(self, url: str) -> list[list[tuple]]:
+        pages = list()
+
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            data = response.json()
+            pages.append([(r['reference_date'], r['region_name']) for r in data['results']])
+            url = data['next']
+
+        return pages
+
+    def test_pages(self):
+        expected = [
+            (r['reference_date'], r['region_name'])
+            for r in self.client.get('/api/statistics_by_region/').json()
+        ]
+
+        for fast_serializers in (True, False):
+            with self.subTest(fast_serializers=fast_serializers), \
+                    override_settings(API_FAST_SERIALIZERS=fast_serializers):
+                pages = self.get_pages('/api/statistics_by_region/?limit=2')
+
+                # The pages split the rows with equal dates, without overlaps nor gaps
+                self.assertEqual([len(p) for p in pages], [2, 2, 2, 2, 1])
+                self.assertEqual(sum(pages, []), expected)
+
+    def test_new_rows(self):
+        response = self.client.get('/api/statistics_by_region/?limit=4').json()
+
+        # The rows added before the cursor don't shift the next pages
+        region = Region.objects.create(name='Madeira', short_name='madeira')
+        StatisticsByRegion.objects.create(reference_date=datetime.date(2021, 3, 1), region=region)
+        StatisticsByRegion.objects.create(reference_date=datetime.date(2021, 3, 3), region=region)
+
+        pages = self.get_pages(response['next'])
+        self.assertEqual(
+            sum(pages, []),
+            [('2021-03-02', 'Centro'), ('2021-03-02', 'Norte'), ('2021-03-03', 'Alentejo'),
+             ('2021-03-03', 'Centro'), ('2021-03-03', 'Madeira'), ('2021-03-03', 'Norte')],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/statistics_by_region/?cursor=invalid')
+        self.assertEqual(response.status_code, 400)
+
+    def test_null_keys(self):
+        for day, sex in enumerate((None, 'F', None, 'M'), start=1):
+            StatisticsBySex.objects.create(reference_date=datetime.date(2021, 3, day), sex=sex, confirmed=day)
+
+        # The cursors of the rows with a NULL sex lead to the next rows
+        url, pages = '/api/statistics_by_sex/?limit=1', list()
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([r['confirmed'] for r in response.json()['results']])
+            url = response.json()['next']
+
+        self.assertEqual(pages, [[1], [2], [3], [4]])
+
+        # The NULLs come first in ascending order, and last in descending order
+        for order_keys in (('sex', 'id'), ('-sex', 'id')):
+            with self.subTest(order_keys=order_keys):
+                data = StatisticsBySex.objects.order_by(*get_ordering(StatisticsBySex, order_keys))
+                rows = list(data)
+                self.assertEqual(rows[0].sex is None, order_keys[0] == 'sex')
+
+                for row, next_row in zip(rows, rows[1:] + [None]):
+                    values = decode_cursor(encode_cursor([getattr(row, k.lstrip('-')) for k in order_keys]), order_keys)
+                    keyset_filter = get_keyset_filter(StatisticsBySex, order_keys, values)
+                    self.assertEqual(data.filter(keyset_filter).first(), next_row)
+
+    def test_sex_filter(self):
+        StatisticsBySex.objects.create(reference_date=datetime.date(2021, 3, 1), sex='F', confirmed=1)
+        StatisticsBySex.objects.create(reference_date=datetime.date(2021, 3, 2), sex='M', confirmed=2)
+
+        response = self.client.get('/api/statistics_by_sex/?reference_date__gte=2021-03-01&sex=F')
+        self.assertEqual([r['confirmed'] for r in response.json()], [1])
+
+        # The sex is the second column of its index
+        response = self.client.get('/api/statistics_by_sex/?sex=F')
+        self.assertEqual(response.status_code, 400)
+
+
+class StreamingTests(DataTablesTestCase):
+
+    def setUp(self):
+        cache._versions['expires'] = 0
+
+        for day in range(1, 4):
+            Sample.objects.create(reference_date=datetime.date(2021, 3, day), total=day * 100)
+
+    def test_formats(self):
+        expected = self.client.get('/api/sample/?fields=reference_date,total').json()
+
+        for fast_serializers in (True, False):
+            with self.subTest(fast_serializers=fast_serializers), \
+                    override_settings(API_FAST_SERIALIZERS=fast_serializers):
+                response = self.client.get('/api/sample/?fields=reference_date,total&format=ndjson')
+                self.assertTrue(response.streaming)
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+
+                content = b''.join(response.streaming_content).decode('utf-8')
+                self.assertEqual([json.loads(line) for line in content.splitlines()], expected)
+
+                response = self.client.get('/api/sample/?fields=reference_date,total&format=json-stream')
+                self.assertTrue(response.streaming)
+                self.assertEqual(json.loads(b''.join(response.streaming_content)), expected)
+
+    def test_pages(self):
+        response = self.client.get('/api/sample/?format=ndjson&limit=2')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(columnar.is_columnar_supported(), 'pyarrow is not installed')
+class ColumnarFormatsTests(DataTablesTestCase):
+
+    def setUp(self):
+        cache._versions['expires'] = 0
+
+        region = Region.objects.create(name='Norte', short_name='norte')
+        for day in range(1, 3):
+            StatisticsByRegion.objects.create(
+                reference_date=datetime.date(2021, 3, day),
+                region=region,
+                confirmed=day,
+            )
+
+    def assert_same_rows(self, table, fields: tuple[str]):
+        expected = self.client.get(f'/api/statistics_by_region/?fields={",".join(fields)}').json()
+
+        self.assertEqual(table.column_names, list(fields))
+        self.assertEqual(
+            [{k: str(v) if isinstance(v, datetime.date) else v for k, v in row.items()}
+             for row in table.to_pylist()],
+            expected,
+        )
+
+    def test_arrow(self):
+        fields = ('reference_date', 'confirmed', 'deaths', 'region_name')
+        response = self.client.get(f'/api/statistics_by_region/?fields={",".join(fields)}&format=arrow')
+
+        self.assertEqual(response['Content-Type'], columnar.ARROW_STREAM_MEDIA_TYPE)
+        table = columnar.pa.ipc.open_stream(response.content).read_all()
+
+        self.assertEqual(table.schema.field('reference_date').type, columnar.pa.date32())
+        self.assert_same_rows(table, fields)
+
+    def test_parquet(self):
+        fields = ('reference_date', 'confirmed', 'deaths', 'region_name')
+        response = self.client.get(f'/api/statistics_by_region/?fields={",".join(fields)}&format=parquet')
+
+        self.assertEqual(response['Content-Type'], columnar.PARQUET_MEDIA_TYPE)
+        self.assertIn('statistics_by_region.parquet', response['Content-Disposition'])
+        self.assert_same_rows(columnar.pq.read_table(io.BytesIO(response.content)), fields)
+
+    def test_unsupported(self):
+        with mock.patch('covid_site.renderers.is_columnar_supported', return_value=False):
+            response = self.client.get('/api/statistics_by_region/?format=parquet')
+
+        self.assertEqual(response.status_code, 406)
+
+
+class SnapshotsTests(DataTablesTestCase):
+
+    def setUp(self):
+        self.lisboa = self.create_county('Lisboa')
+        self.porto = self.create_county('Porto')
+        category = IncidenceCategory.objects.create(
+            category_lower_limit=0, category_upper_limit=None, incidence_risk='Moderado')
+
+        for county, day, incidence in ((self.lisboa, 1, 10), (self.lisboa, 2, 20), (self.porto, 1, 30)):
+            Incidence.objects.create(
+                reference_date=datetime.date(2021, 3, day),
+                county=county,
+                incidence_category=category,
+                incidence=incidence,
+            )
+
+    def refresh(self, days: list[int]) -> None:
+        df = pd.DataFrame({
+            'reference_date': pd.to_datetime([f'2021-03-{d:02}' for d in days], utc=True),
+        })
+
+        run_etl(df=df, django_model=LatestIncidence, specific_etl_method=generate_latest_incidence_records)
+
+    def get_snapshots(self) -> dict[str, tuple]:
+        return {
+            obj.county.county_name: (obj.reference_date, obj.incidence)
+            for obj in LatestIncidence.objects.select_related('county')
+        }
+
+    def test_latest_rows(self):
+        self.refresh([1, 2])
+
+        self.assertEqual(self.get_snapshots(), {
+            'Lisboa': (datetime.date(2021, 3, 2), 20),
+            'Porto': (datetime.date(2021, 3, 1), 30),
+        })
+
+        # An import of older dates keeps the newer snapshots
+        Incidence.objects.filter(county=self.lisboa, reference_date=datetime.date(2021, 3, 1)).update(incidence=15)
+        self.refresh([1])
+
+        self.assertEqual(self.get_snapshots()['Lisboa'], (datetime.date(2021, 3, 2), 20))
+
+    def test_removed_rows(self):
+        self.refresh([1, 2])
+
+        # The snapshot goes back to the latest row before the range
+        Incidence.objects.filter(county=self.lisboa, reference_date=datetime.date(2021, 3, 2)).delete()
+        self.refresh([2])
+
+        self.assertEqual(self.get_snapshots()['Lisboa'], (datetime.date(2021, 3, 1), 10))
+
+
+class RollupsTests(DataTablesTestCase):
+
+    def setUp(self):
+        self.lisboa = self.create_county('Lisboa')
+        self.sintra = self.create_county('Sintra')
+
+        for county, date_start, deaths in (
+            (self.lisboa, datetime.date(2020, 2, 24), 1),
+            (self.lisboa, datetime.date(2020, 3, 2), 2),
+            (self.sintra, datetime.date(2020, 3, 2), 4),
+            (self.lisboa, datetime.date(2021, 1, 4), 8),
+        ):
+            TotalDeaths.objects.create(
+                county=county,
+                date_start=date_start,
+                date_end=date_start + datetime.timedelta(days=6),
+                deaths=deaths,
+            )
+
+        StatisticsByRegion.objects.create(reference_date=datetime.date(2020, 3, 1), region=self.lisboa.region)
+
+    def refresh(self, years: list[int]) -> None:
+        for django_model, specific_etl_method in (
+            (CountyYearDeaths, functools.partial(generate_county_year_deaths_records, years=years)),
+            (RegionYearDeaths, functools.partial(generate_region_year_deaths_records, years=years)),
+            (RegionDeathsSince, generate_region_deaths_since_records),
+        ):
+            run_etl(
+                df=pd.DataFrame(),
+                django_model=django_model,
+                specific_etl_method=specific_etl_method,
+                drop_if_all_none=True,
+            )
+
+    def test_totals(self):
+        self.refresh([2020, 2021])
+
+        self.assertEqual(
+            sorted(CountyYearDeaths.objects.values_list('county__county_name', 'year', 'deaths')),
+            [('Lisboa', 2020, 3), ('Lisboa', 2021, 8), ('Sintra', 2020, 4)],
+        )
+        self.assertEqual(
+            sorted(RegionYearDeaths.objects.values_list('year', 'deaths')),
+            [(2020, 7), (2021, 8)],
+        )
+
+        # Only the weeks since the first day of the statistics by region
+        self.assertEqual(
+            list(RegionDeathsSince.objects.values_list('date_start', 'deaths')),
+            [(datetime.date(2020, 3, 1), 14)],
+        )
+
+    def test_removed_rows(self):
+        self.refresh([2020, 2021])
+
+        TotalDeaths.objects.filter(county=self.sintra).delete()
+        TotalDeaths.objects.filter(date_start__year=2021).delete()
+        self.refresh([2020, 2021])
+
+        # The totals that are no longer produced are deleted
+        self.assertEqual(
+            list(CountyYearDeaths.objects.values_list('county__county_name', 'year', 'deaths')),
+            [('Lisboa', 2020, 3)],
+        )
+        self.assertEqual(list(RegionYearDeaths.objects.values_list('year', 'deaths')), [(2020, 3)])
+        self.assertEqual(RegionDeathsSince.objects.get().deaths, 2)
+
+        StatisticsByRegion.objects.all().delete()
+        self.refresh([2020])
+
+        self.assertFalse(RegionDeathsSince.objects.exists())
+
+
+class CombinedStatisticsTests(DataTablesTestCase):
+
+    def setUp(self):
+        clear_dimension_caches()
+        self.addCleanup(clear_dimension_caches)
+
+        Age.objects.create(age_start=0, age_end=9)
+        Age.objects.create(age_start=10, age_end=19)
+
+    def refresh(self, days: list[int], ages: list[str]) -> dict[str, int]:
+        df = pd.DataFrame({
+            'reference_date': pd.to_datetime([f'2021-03-{d:02}' for d in days], utc=True),
+            **{f'{measure}_{age}_{sex}': 1 for measure in ('confirmed', 'deaths') for age in ages for sex in 'mf'},
+        })
+
+        return run_etl(
+            df=df,
+            django_model=StatisticsByAgeAndSexCombined,
+            specific_etl_method=generate_statistics_by_age_and_sex_combined_records,
+            drop_if_all_none=True,
+        )
+
+    def test_removed_keys(self):
+        self.refresh([1, 2, 3], ['0_9', '10_19'])
+        self.assertEqual(StatisticsByAgeAndSexCombined.objects.count(), 6)
+
+        # The age group removed from the file is deleted, only in its range
+        result = self.refresh([2, 3], ['0_9'])
+
+        self.assertEqual(result['deleted'], 2)
+        self.assertEqual(
+            sorted(StatisticsByAgeAndSexCombined.objects.values_list('reference_date__day', 'age__age_start')),
+            [(1, 0), (1, 10), (2, 0), (3, 0)],
+        )
@@ -1,36 +1,46 @@
-import numpy as np
-import pandas as pd
+import base64
+import functools
+import json
+import operator
+import os
+
+from django.conf import settings
 from django.contrib import messages
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from rest_framework.decorators import api_view
+from django.db.models import F, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-
-from covid_site.etl.amostras import amostras_csv_etl
-from covid_site.etl.dados_sico import dados_sico_csv_etl
-from covid_site.etl.data import data_csv_etl
-from covid_site.etl.data_concelhos_new import data_concelhos_new_csv_etl
-from covid_site.etl.rt import rt_csv_etl
-from covid_site.etl.vacinas import vacinas_csv_etl
+from rest_framework.utils.urls import replace_query_param
+
+from covid_site.cache import cached_response, conditional_response
+from covid_site.columnar import build_table, get_columns
+from covid_site.etl.ingest import is_acceptable_file
+from covid_site.etl.jobs import enqueue_import
+from covid_site.fast_serializers import FastSerializer, get_fast_serializer
+from covid_site.filters import EQUALITY_OPERATORS, RANGE_OPERATORS, FilterSchema
 from covid_site.forms import CsvUploadForm
-from covid_site.models import StatisticsByAgeAndSex
+from covid_site.models import (CountyYearDeaths, LatestIncidence,
+                               LatestStatisticsByRegion, RegionDeathsSince,
+                               StatisticsByAgeAndSex,
+                               StatisticsByAgeAndSexCombined,
+                               StatisticsBySexCombined)
+from covid_site.pool import get_pools_stats
+from covid_site.renderers import COLUMNAR_FORMATS, STREAM_FORMATS
 from covid_site.serializers import *
 
-# The list of acceptable files on the CSV import functionality
-ACCEPTABLE_FILES = [
-    'amostras.csv',
-    'data_concelhos_new.csv',
-    'data.csv',
-    'rt.csv',
-    'vacinas.csv',
-    # Actually for SICO files the pattern needs to match, not the whole name
-    'Dados_SICO.csv'
-]
-
 # Import functionality
 
 
 def import_csv(request: object) -> dict:
-    '''Functionality to import all the acceptable files.
+    '''Functionality to import all the acceptable files. The files are saved
+        and queued as import jobs, one per file, which are run by the import
+        workers.
 
     Args:
         request (object): the request from django admin.
@@ -39,47 +49,23 @@ def import_csv(request: object) -> dict:
         dict: the payload with the form.
     '''
 
-    if request.method == 'POST':
-        csv_file = request.FILES['csv_file']
-        file_name = csv_file.name
-        print(f'File inserted: {file_name}')
+    if request.method == 'POST' and 'csv_file' in request.FILES:
+        for csv_file in request.FILES.getlist('csv_file'):
+            file_name = csv_file.name
+            print(f'File inserted: {file_name}')
 
-        if file_name not in ACCEPTABLE_FILES and 'Dados_SICO' not in file_name:
-            messages.warning(
-                request=request,
-                message=f'The {file_name} file does not match any mapped source file!',
-            )
-
-        else:
-            df = pd.read_csv(csv_file, delimiter=',').fillna(
-                np.nan).replace([np.nan], [None])
-            messages.success(
-                request, f'The {file_name} file was uploaded with success!')
-
-            file_name = file_name.split('.')[0]
-
-            if file_name == 'amostras':
-                status = amostras_csv_etl(df=df)
-            elif file_name == 'data_concelhos_new':
-                status = data_concelhos_new_csv_etl(df=df)
-            elif file_name == 'data':
-                status = data_csv_etl(df=df)
-            elif file_name == 'rt':
-                status = rt_csv_etl(df=df)
-            elif file_name == 'vacinas':
-                status = vacinas_csv_etl(df=df)
-            elif 'Dados_SICO' in file_name:
-                status = dados_sico_csv_etl(df=df)
-
-            if status.succeeded:
-                messages.success(
+            if not is_acceptable_file(file_name):
+                messages.warning(
                     request=request,
-                    message='ETL finished with success!',
+                    message=f'The {file_name} file does not match any mapped source file!',
                 )
+
             else:
-                messages.error(
+                job = enqueue_import(csv_file)
+                messages.success(
                     request=request,
-                    message=str(status.exception),
+                    message=f'The {file_name} file was uploaded with success! '
+                    f'Its ETL was queued as import job {job.id}.',
                 )
 
     form = CsvUploadForm()
@@ -88,6 +74,105 @@ def import_csv(request: object) -> dict:
 
 # Raw API endpoints
 
+# The query parameters of the raw API endpoints that are not filters
+RESERVED_PARAMS = (
+    'cursor',
+    'fields',
+    'format',
+    'limit',
+)
+
+
+def encode_cursor(values: list) -> str:
+    '''Encodes the values of the ordering keys of a row as a cursor.'''
+
+    raw_cursor = json.dumps(values, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(raw_cursor.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, order_keys: tuple[str]) -> list:
+    '''Decodes the values of the ordering keys from a cursor.'''
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    if not isinstance(values, list) or len(values) != len(order_keys):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    return values
+
+
+def is_nullable_key(django_model: models.Model, key: str) -> bool:
+    '''Checks if an ordering key can be NULL, i.e. if any field of its path
+        is nullable, e.g. "sex" or "-age__age_end".'''
+
+    for field_name in key.lstrip('-').split('__'):
+        field = django_model._meta.get_field(field_name)
+        if field.null:
+            return True
+
+        if field.is_relation:
+            django_model = field.related_model
+
+    return False
+
+
+def get_ordering(django_model: models.Model, order_keys: tuple[str]) -> list:
+    '''Returns the ordering of the query by the ordering keys, where the NULLs
+        of the nullable keys are ordered as their smallest value on every
+        database, which is what get_keyset_filter expects.'''
+
+    ordering = list()
+    for key in order_keys:
+        if not is_nullable_key(django_model, key):
+            ordering.append(key)
+        elif key.startswith('-'):
+            ordering.append(F(key.lstrip('-')).desc(nulls_last=True))
+        else:
+            ordering.append(F(key).asc(nulls_first=True))
+
+    return ordering
+
+
+def get_keyset_filter(django_model: models.Model, order_keys: tuple[str], values: list) -> Q:
+    '''Builds the filter of the rows that come after the row with the provided
+        values of the ordering keys, e.g. for the keys (a, -b, id) the filter
+        is a > x or (a = x and b < y) or (a = x and b = y and id > z). The NULLs
+        of the nullable keys come before their other values, see get_ordering.'''
+
+    conditions = list()
+    for i, key in enumerate(order_keys):
+        field_name = key.lstrip('-')
+        descending = key.startswith('-')
+
+        previous_keys = Q()
+        for previous_key, value in zip(order_keys[:i], values[:i]):
+            previous_field_name = previous_key.lstrip('-')
+            if value is None:
+                previous_keys &= Q(**{f'{previous_field_name}__isnull': True})
+            else:
+                previous_keys &= Q(**{previous_field_name: value})
+
+        if values[i] is None:
+            # Nothing comes after the NULLs of a descending key
+            if descending:
+                continue
+
+            condition = Q(**{f'{field_name}__isnull': False})
+        else:
+            lookup = 'lt' if descending else 'gt'
+            condition = Q(**{f'{field_name}__{lookup}': values[i]})
+
+            if descending and is_nullable_key(django_model, key):
+                condition |= Q(**{f'{field_name}__isnull': True})
+
+        conditions.append(previous_keys & condition)
+
+    return functools.reduce(operator.or_, conditions)
+
+
 class APIModelQuery:
     '''Generalized class to execute the ORM queries to the database.'''
 
@@ -95,23 +180,137 @@ class APIModelQuery:
         self,
         django_model: models.Model,
         serializer: serializers.ModelSerializer,
+        filter_fields: dict[str, tuple[str]] = None,
     ) -> None:
         '''The constructor of the class.
 
         Args:
             django_model (models.Model): the model to execute the ORM queries.
             serializer (serializers.ModelSerializer): the serializer of the data.
+            filter_fields (dict[str, tuple[str]], optional): the operators of
+                each field that can be filtered. Defaults to None - no filters.
         '''
 
         self.django_model = django_model
         self.serializer = serializer
+        self.filter_schema = FilterSchema(django_model, filter_fields or dict())
+
+    def get_filters(self, request: object) -> dict[str, object]:
+        '''Returns the filters of the query, i.e. the query parameters that are
+            not reserved, validated by the filter schema of the endpoint.'''
+
+        return self.filter_schema.get_filters({
+            k: v for k, v in request.query_params.items()
+            if k not in RESERVED_PARAMS
+        })
+
+    def get_fields(self, request: object) -> tuple[str]:
+        '''Returns the fields requested with the "fields" query parameter, a
+            comma separated list, or None if all the fields were requested.'''
+
+        fields = request.query_params.get('fields')
+        if not fields:
+            return None
+
+        fields = tuple(f.strip() for f in fields.split(',') if f.strip())
+        available_fields = self.serializer().fields.keys()
+
+        unknown_fields = [f for f in fields if f not in available_fields]
+        if unknown_fields:
+            raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown_fields)}.'})
+
+        return fields
+
+    def get_limit(self, request: object) -> int:
+        '''Returns the amount of rows of the page requested with the "limit"
+            and "cursor" query parameters, or None if no page was requested.'''
+
+        limit = request.query_params.get('limit')
+
+        if limit is None:
+            if 'cursor' in request.query_params:
+                return settings.API_PAGE_SIZE
+            return None
+
+        if not limit.isdigit() or not 0 < int(limit) <= settings.API_MAX_PAGE_SIZE:
+            raise ValidationError(
+                {'limit': f'The limit must be between 1 and {settings.API_MAX_PAGE_SIZE}.'})
+
+        return int(limit)
+
+    def project_queryset(
+        self,
+        queryset: models.QuerySet,
+        fields: tuple[str],
+        order_keys: tuple[str],
+    ) -> models.QuerySet:
+        '''Loads only the columns needed by the requested fields and by the
+            ordering, joining only the needed related tables.'''
+
+        serializer_fields = self.serializer().fields
+
+        paths = [serializer_fields[f].source.split('.') for f in fields]
+        paths += [k.lstrip('-').split('__') for k in order_keys]
+
+        only_fields = {'id'} | {p[0] for p in paths}
+        related_fields = {p[0] for p in paths if len(p) > 1}
+
+        return queryset.\
+            select_related(*related_fields).\
+            only(*only_fields)
+
+    def get_queryset(
+        self,
+        request: object,
+        fields: tuple[str],
+        order_keys: tuple[str],
+    ) -> models.QuerySet:
+        '''Builds the query to the provided model, filtered by the query
+            parameters and loading only the requested fields.'''
+
+        data = self.django_model.objects.\
+            filter(**self.get_filters(request)).\
+            all().\
+            order_by(*get_ordering(self.django_model, order_keys))
+
+        if fields is None:
+            return data.select_related()
+
+        return self.project_queryset(data, fields, order_keys)
+
+    def get_serializer(self, request: object, data: object, fields: tuple[str]) -> object:
+        '''Builds the serializer of the rows, with only the requested fields.'''
+
+        object_serializer = self.serializer(
+            data,
+            context={'request': request},
+            many=True,
+        )
+
+        if fields is not None:
+            for field_name in set(object_serializer.child.fields.keys()) - set(fields):
+                object_serializer.child.fields.pop(field_name)
+
+        return object_serializer
+
+    def get_fast_serializer(self, fields: tuple[str]) -> FastSerializer:
+        '''Returns the compiled version of the serializer, which reads the rows
+            with values_list, or None if it can't be used.'''
+
+        if not settings.API_FAST_SERIALIZERS:
+            return None
+
+        return get_fast_serializer(self.serializer, fields)
 
     def query_model(
         self,
         request: object,
         order_fields: tuple[str] = tuple(),
-    ) -> list[dict]:
+    ) -> list[dict] | dict:
         '''Executes the automatically generated query to the provided model.
+            The "fields" query parameter limits the fields of each row. The
+            "limit" and "cursor" query parameters return a page of the rows,
+            which starts after the row the cursor points to.
 
         Args:
             request (object): the request from django admin.
@@ -119,24 +318,177 @@ class APIModelQuery:
                 dataset. Defaults to tuple().
 
         Returns:
-            list[dict]: the array with all the rows of the dataset.
+            list[dict] | dict: the array with all the rows of the dataset or,
+                if a page was requested, the rows of the page and the URL of
+                the next page.
         '''
 
-        data = self.django_model.objects.\
-            select_related().\
-            filter(**{k: v for k, v in request.query_params.items()}).\
-            all().\
-            order_by(*order_fields)
+        fields = self.get_fields(request)
+        limit = self.get_limit(request)
 
-        object_serializer = self.serializer(
-            data,
-            context={'request': request},
-            many=True,
+        # The id makes the ordering keys unique, so the pages never overlap
+        order_keys = tuple(order_fields)
+        if limit is not None and 'id' not in order_keys:
+            order_keys += ('id',)
+
+        data = self.get_queryset(request, fields, order_keys)
+        fast_serializer = self.get_fast_serializer(fields)
+
+        if limit is None:
+            if fast_serializer is not None:
+                return list(fast_serializer.iter_rows(data.values_list(*fast_serializer.lookups)))
+
+            return self.get_serializer(request, data, fields).data
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            data = data.filter(get_keyset_filter(self.django_model, order_keys, decode_cursor(cursor, order_keys)))
+
+        # The values of the ordering keys come after the ones of the fields
+        if fast_serializer is not None:
+            data = data.values_list(
+                *fast_serializer.lookups,
+                *(k.lstrip('-') for k in order_keys),
+            )
+
+        data = list(data[:limit + 1])
+
+        next_url = None
+        if len(data) > limit:
+            data = data[:limit]
+
+            if fast_serializer is not None:
+                last_values = list(data[-1][len(fast_serializer.lookups):])
+            else:
+                last_values = [
+                    functools.reduce(getattr, k.lstrip('-').split('__'), data[-1])
+                    for k in order_keys
+                ]
+
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor',
+                encode_cursor(last_values),
+            )
+
+        if fast_serializer is not None:
+            results = list(fast_serializer.iter_rows(data))
+        else:
+            results = self.get_serializer(request, data, fields).data
+
+        return {
+            'next': next_url,
+            'results': results,
+        }
+
+    def stream_model(
+        self,
+        request: object,
+        order_fields: tuple[str] = tuple(),
+    ) -> StreamingHttpResponse:
+        '''Executes the automatically generated query to the provided model,
+            streaming the rows as they are read from the database, so that
+            the memory used doesn't depend on the amount of rows.
+
+        Args:
+            request (object): the request from django admin.
+            order_fields (tuple[str], optional): the fields to order the
+                dataset. Defaults to tuple().
+
+        Returns:
+            StreamingHttpResponse: the response streaming the rows.
+        '''
+
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            raise ValidationError('The streamed formats return all the rows, without pages.')
+
+        fields = self.get_fields(request)
+        data = self.get_queryset(request, fields, tuple(order_fields))
+        fast_serializer = self.get_fast_serializer(fields)
+
+        if fast_serializer is not None:
+            rows = fast_serializer.iter_rows(
+                data.values_list(*fast_serializer.lookups).iterator(
+                    chunk_size=settings.API_STREAM_CHUNK_SIZE)
+            )
+        else:
+            child = self.get_serializer(request, data, fields).child
+            rows = (
+                child.to_representation(obj)
+                for obj in data.iterator(chunk_size=settings.API_STREAM_CHUNK_SIZE)
+            )
+
+        content_type, iter_content = STREAM_FORMATS[request.accepted_renderer.format]
+
+        return StreamingHttpResponse(
+            iter_content(rows),
+            content_type=f'{content_type}; charset=utf-8',
         )
 
-        return object_serializer.data
+    def table_model(
+        self,
+        request: object,
+        order_fields: tuple[str] = tuple(),
+    ) -> HttpResponse:
+        '''Executes the automatically generated query to the provided model,
+            returning the columns in a columnar format, e.g. Arrow or Parquet.
+            Only the fields that are columns of the database are returned.
+
+        Args:
+            request (object): the request from django admin.
+            order_fields (tuple[str], optional): the fields to order the
+                dataset. Defaults to tuple().
 
+        Returns:
+            HttpResponse: the response with the table.
+        '''
+
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            raise ValidationError('The columnar formats return all the rows, without pages.')
+
+        fields = self.get_fields(request)
+        data = self.get_queryset(request, fields, tuple(order_fields))
+        table = build_table(data, get_columns(self.serializer, fields))
+
+        file_format = request.accepted_renderer.format
+        content_type, encode_table = COLUMNAR_FORMATS[file_format]
+
+        response = HttpResponse(encode_table(table), content_type=content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="{self.django_model._meta.db_table}.{file_format}"'
+
+        return response
+
+    def get_response(
+        self,
+        request: object,
+        order_fields: tuple[str] = tuple(),
+    ) -> HttpResponseBase:
+        '''Executes the automatically generated query to the provided model,
+            streaming the rows if a streamed format was requested, or building
+            the table if a columnar format was requested.
 
+        Args:
+            request (object): the request from django admin.
+            order_fields (tuple[str], optional): the fields to order the
+                dataset. Defaults to tuple().
+
+        Returns:
+            HttpResponseBase: the response containing the dataset.
+        '''
+
+        if request.accepted_renderer.format in STREAM_FORMATS:
+            return self.stream_model(request=request, order_fields=order_fields)
+
+        if request.accepted_renderer.format in COLUMNAR_FORMATS:
+            return self.table_model(request=request, order_fields=order_fields)
+
+        result = self.query_model(request=request, order_fields=order_fields)
+
+        return Response(result)
+
+
+@conditional_response(tables=(Age,))
 @api_view(['GET'])
 def age_list(request: object) -> Response:
     '''Executes a query to the Age model, using the provided fields, if any.
@@ -151,13 +503,16 @@ def age_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Age,
         serializer=AgeSerializer,
+        filter_fields={
+            'age_start': RANGE_OPERATORS,
+            'age_end': RANGE_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(County, Region))
 @api_view(['GET'])
 def county_list(request: object) -> Response:
     '''Executes a query to the County model, using the provided fields, if any.
@@ -172,13 +527,17 @@ def county_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=County,
         serializer=CountySerializer,
+        filter_fields={
+            'dicofre': EQUALITY_OPERATORS,
+            'county_name': EQUALITY_OPERATORS,
+            'region': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(GeneralData,))
 @api_view(['GET'])
 def general_data_list(request: object) -> Response:
     '''Executes a query to the GeneralData model, using the provided fields, if
@@ -194,20 +553,22 @@ def general_data_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=GeneralData,
         serializer=GeneralDataSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+        },
     )
 
     order_fields = (
         'reference_date',
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
         order_fields=order_fields,
     )
 
-    return Response(result)
-
 
+@conditional_response(tables=(Incidence, County, IncidenceCategory))
 @api_view(['GET'])
 def incidence_list(request: object) -> Response:
     '''Executes a query to the Incidence model, using the provided fields, if
@@ -223,13 +584,17 @@ def incidence_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Incidence,
         serializer=IncidenceSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'county': EQUALITY_OPERATORS,
+            'incidence_category': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(IncidenceCategory,))
 @api_view(['GET'])
 def incidence_category_list(request: object) -> Response:
     '''Executes a query to the IncidenceCategory model, using the provided
@@ -245,13 +610,15 @@ def incidence_category_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=IncidenceCategory,
         serializer=IncidenceCategorySerializer,
+        filter_fields={
+            'incidence_risk': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(PopulationByAge, Age, County))
 @api_view(['GET'])
 def population_by_age_list(request: object) -> Response:
     '''Executes a query to the PopulationByAge model, using the provided fields,
@@ -267,13 +634,16 @@ def population_by_age_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=PopulationByAge,
         serializer=PopulationByAgeSerializer,
+        filter_fields={
+            'age': EQUALITY_OPERATORS,
+            'county': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(Region,))
 @api_view(['GET'])
 def region_list(request: object) -> Response:
     '''Executes a query to the Region model, using the provided fields, if any.
@@ -288,13 +658,16 @@ def region_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Region,
         serializer=RegionSerializer,
+        filter_fields={
+            'name': EQUALITY_OPERATORS,
+            'short_name': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(Reinforcement, Age))
 @api_view(['GET'])
 def reinforcement_list(request: object) -> Response:
     '''Executes a query to the Reinforcement model, using the provided fields,
@@ -310,13 +683,16 @@ def reinforcement_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Reinforcement,
         serializer=ReinforcementSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'age': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(Sample,))
 @api_view(['GET'])
 def sample_list(request: object) -> Response:
     '''Executes a query to the Sample model, using the provided fields, if any.
@@ -331,20 +707,22 @@ def sample_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Sample,
         serializer=SampleSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+        },
     )
 
     order_fields = (
         'reference_date',
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
         order_fields=order_fields,
     )
 
-    return Response(result)
-
 
+@conditional_response(tables=(StatisticsByAgeAndSex, Age))
 @api_view(['GET'])
 def statistics_by_age_and_sex_list(request: object) -> Response:
     '''Executes a query to the StatisticsByAgeAndSex model, using the provided
@@ -361,6 +739,11 @@ def statistics_by_age_and_sex_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=StatisticsByAgeAndSex,
         serializer=StatisticsByAgeAndSexSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'sex': EQUALITY_OPERATORS,
+            'age': EQUALITY_OPERATORS,
+        },
     )
 
     order_fields = (
@@ -368,14 +751,13 @@ def statistics_by_age_and_sex_list(request: object) -> Response:
         'age__age_start',
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
         order_fields=order_fields,
     )
 
-    return Response(result)
-
 
+@conditional_response(tables=(StatisticsByRegion, Region))
 @api_view(['GET'])
 def statistics_by_region_list(request: object) -> Response:
     '''Executes a query to the StatisticsByRegion model, using the provided
@@ -391,6 +773,10 @@ def statistics_by_region_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=StatisticsByRegion,
         serializer=StatisticsByRegionSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'region': EQUALITY_OPERATORS,
+        },
     )
 
     order_fields = (
@@ -398,14 +784,13 @@ def statistics_by_region_list(request: object) -> Response:
         'region__name',
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
         order_fields=order_fields,
     )
 
-    return Response(result)
-
 
+@conditional_response(tables=(StatisticsBySex,))
 @api_view(['GET'])
 def statistics_by_sex_list(request: object) -> Response:
     '''Executes a query to the StatisticsBySex model, using the provided fields,
@@ -421,6 +806,10 @@ def statistics_by_sex_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=StatisticsBySex,
         serializer=StatisticsBySexSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'sex': EQUALITY_OPERATORS,
+        },
     )
 
     order_fields = (
@@ -428,14 +817,13 @@ def statistics_by_sex_list(request: object) -> Response:
         'sex'
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
-        order_fields=order_fields
+        order_fields=order_fields,
     )
 
-    return Response(result)
-
 
+@conditional_response(tables=(Symptoms, SymptomsType))
 @api_view(['GET'])
 def symptoms_list(request: object) -> Response:
     '''Executes a query to the Symptoms model, using the provided fields, if any.
@@ -450,13 +838,16 @@ def symptoms_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Symptoms,
         serializer=SymptomsSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'symptoms_type': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(SymptomsType,))
 @api_view(['GET'])
 def symptoms_type_list(request: object) -> Response:
     '''Executes a query to the SymptomsType model, using the provided fields, if
@@ -472,13 +863,15 @@ def symptoms_type_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=SymptomsType,
         serializer=SymptomsTypeSerializer,
+        filter_fields={
+            'type': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(TotalDeaths, County))
 @api_view(['GET'])
 def total_deaths_list(request: object) -> Response:
     '''Executes a query to the TotalDeaths model, using the provided fields, if
@@ -494,13 +887,17 @@ def total_deaths_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=TotalDeaths,
         serializer=TotalDeathsSerializer,
+        filter_fields={
+            'county': EQUALITY_OPERATORS,
+            'date_start': RANGE_OPERATORS,
+            'date_end': RANGE_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(TransmissionRisk, Region))
 @api_view(['GET'])
 def transmission_risk_list(request: object) -> Response:
     '''Executes a query to the TransmissionRisk model, using the provided
@@ -516,13 +913,16 @@ def transmission_risk_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=TransmissionRisk,
         serializer=TransmissionRiskSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+            'region': EQUALITY_OPERATORS,
+        },
     )
 
-    result = query_engine.query_model(request=request)
-
-    return Response(result)
+    return query_engine.get_response(request=request)
 
 
+@conditional_response(tables=(Vaccines,))
 @api_view(['GET'])
 def vaccines_list(request: object) -> Response:
     '''Executes a query to the Vaccines model, using the provided fields, if any.
@@ -537,22 +937,38 @@ def vaccines_list(request: object) -> Response:
     query_engine = APIModelQuery(
         django_model=Vaccines,
         serializer=VaccinesSerializer,
+        filter_fields={
+            'reference_date': RANGE_OPERATORS,
+        },
     )
 
     order_fields = (
         'reference_date',
     )
 
-    result = query_engine.query_model(
+    return query_engine.get_response(
         request=request,
         order_fields=order_fields,
     )
 
-    return Response(result)
+
+def get_current_year(request: object) -> int:
+    '''Returns the current year, on which the yearly totals of the front-end
+        endpoints depend.'''
+
+    return timezone.localdate().year
 
 
 # Additional endpoints to be specifically used by the front-end
+@conditional_response(
+    tables=(County, CountyYearDeaths, IncidenceCategory, LatestIncidence),
+    variant=get_current_year,
+)
 @api_view(['GET'])
+@cached_response(
+    tables=(County, CountyYearDeaths, IncidenceCategory, LatestIncidence),
+    variant=get_current_year,
+)
 def county_summary_dict(request: object) -> Response:
     '''Executes a query to the County model, with a specific query to return the
         needed data structured to be used by the front-end.
@@ -565,12 +981,6 @@ def county_summary_dict(request: object) -> Response:
     '''
 
     query = '''
-        WITH ranked_incidence AS (
-            SELECT
-                i.*,
-                (ROW_NUMBER() OVER (PARTITION BY county_id ORDER BY reference_date DESC)) AS rn
-            FROM incidence AS i
-        )
         SELECT
             1                       AS id,
             c.county_name           AS county_name,
@@ -578,31 +988,21 @@ def county_summary_dict(request: object) -> Response:
             c.population            AS population,
             c.population_density    AS population_density,
             td.`year`               AS `year`,
-            td.year_total_deaths    AS year_total_deaths,
+            td.deaths               AS year_total_deaths,
             ri.reference_date       AS reference_date,
             ic.incidence_risk       AS incidence_risk,
             ri.incidence            AS incidence,
             ri.confirmed_1          AS confirmed_1,
             ri.cases_14             AS cases_14
-        FROM (
-            SELECT
-                county_id,
-                EXTRACT(YEAR FROM date_start) AS `year`,
-                SUM(deaths) AS year_total_deaths
-            FROM total_deaths
-            WHERE EXTRACT(YEAR FROM date_start) = YEAR(CURDATE())
-            GROUP BY
-                county_id,
-                EXTRACT(YEAR FROM date_start)
-        ) AS td
-        INNER JOIN ranked_incidence AS ri ON td.county_id = ri.county_id
+        FROM county_year_deaths AS td
+        INNER JOIN latest_incidence AS ri ON td.county_id = ri.county_id
         INNER JOIN county AS c ON td.county_id = c.id
         INNER JOIN incidence_category ic ON ri.incidence_category_id = ic.id
-        WHERE rn = 1
+        WHERE td.`year` = %s
         ORDER BY c.county_name;
     '''
 
-    data = TotalDeaths.objects.raw(raw_query=query)
+    data = TotalDeaths.objects.raw(raw_query=query, params=[get_current_year(request)])
 
     object_serializer = CountySummarySerializer(
         data,
@@ -617,7 +1017,9 @@ def county_summary_dict(request: object) -> Response:
     return Response(dict_data)
 
 
+@conditional_response(tables=(Age, StatisticsByAgeAndSexCombined))
 @api_view(['GET'])
+@cached_response(tables=(Age, StatisticsByAgeAndSexCombined))
 def statistics_by_age_list(request: object) -> Response:
     '''Executes a query to the StatisticsByAgeAndSex model, with a specific
         query to return the needed data structured to be used by the front-end.
@@ -636,22 +1038,18 @@ def statistics_by_age_list(request: object) -> Response:
                 WHEN age.age_end IS NULL THEN CONCAT(age.age_start, '+')
                 ELSE CONCAT(age.age_start, '-', age.age_end)
             END                         AS age_range,
-            m.confirmed + f.confirmed   AS cases,
-            m.deaths + f.deaths         AS deaths,
-            m.reference_date            AS reference_date,
-            m.inserted_date             AS inserted_date,
-            m.updated_date              AS updated_date
-        FROM statistics_by_age_and_sex  AS m
-        JOIN statistics_by_age_and_sex  AS f
-            ON m.reference_date = f.reference_date
-            AND m.sex = 'm' and f.sex = 'f'
-            AND m.age_id = f.age_id
-        JOIN age ON m.age_id = age.id
-        WHERE m.reference_date = (SELECT MAX(reference_date) FROM statistics_by_age_and_sex)
+            s.male_confirmed + s.female_confirmed   AS cases,
+            s.male_deaths + s.female_deaths         AS deaths,
+            s.reference_date            AS reference_date,
+            s.inserted_date             AS inserted_date,
+            s.updated_date              AS updated_date
+        FROM statistics_by_age_and_sex_combined AS s
+        JOIN age ON s.age_id = age.id
+        WHERE s.reference_date = (SELECT MAX(reference_date) FROM statistics_by_age_and_sex_combined)
         ORDER BY age_range;
     '''
 
-    data = StatisticsByAgeAndSex.objects.raw(raw_query=query)
+    data = StatisticsByAgeAndSexCombined.objects.raw(raw_query=query)
 
     object_serializer = StatisticsByAgeSerializer(
         data,
@@ -694,7 +1092,9 @@ def statistics_by_age_list(request: object) -> Response:
     return Response(all_data)
 
 
+@conditional_response(tables=(Age, StatisticsByAgeAndSexCombined))
 @api_view(['GET'])
+@cached_response(tables=(Age, StatisticsByAgeAndSexCombined))
 def statistics_by_age_and_sex_combined_list(request: object) -> Response:
     '''Executes a query to the StatisticsByAgeAndSex model, with a specific
         query to return the needed data structured to be used by the front-end.
@@ -713,24 +1113,20 @@ def statistics_by_age_and_sex_combined_list(request: object) -> Response:
                 WHEN age.age_end IS NULL THEN CONCAT(age.age_start, '+')
                 ELSE CONCAT(age.age_start, '-', age.age_end)
             END                 AS age_range,
-            m.confirmed         AS male_confirmed,
-            m.deaths            AS male_deaths,
-            f.confirmed         AS female_confirmed,
-            f.deaths            AS female_deaths,
-            m.reference_date    AS reference_date,
-            m.inserted_date     AS inserted_date,
-            m.updated_date      AS updated_date
-        FROM statistics_by_age_and_sex AS m
-        JOIN statistics_by_age_and_sex AS f
-            ON m.reference_date = f.reference_date
-            AND m.sex = 'm' and f.sex = 'f'
-            AND m.age_id = f.age_id
-        JOIN age ON m.age_id = age.id
-        WHERE m.reference_date = (SELECT MAX(reference_date) FROM statistics_by_age_and_sex)
+            s.male_confirmed    AS male_confirmed,
+            s.male_deaths       AS male_deaths,
+            s.female_confirmed  AS female_confirmed,
+            s.female_deaths     AS female_deaths,
+            s.reference_date    AS reference_date,
+            s.inserted_date     AS inserted_date,
+            s.updated_date      AS updated_date
+        FROM statistics_by_age_and_sex_combined AS s
+        JOIN age ON s.age_id = age.id
+        WHERE s.reference_date = (SELECT MAX(reference_date) FROM statistics_by_age_and_sex_combined)
         ORDER BY age_range;
     '''
 
-    data = StatisticsByAgeAndSex.objects.raw(raw_query=query)
+    data = StatisticsByAgeAndSexCombined.objects.raw(raw_query=query)
 
     object_serializer = StatisticsByAgeAndSexCombinedSerializer(
         data,
@@ -741,7 +1137,9 @@ def statistics_by_age_and_sex_combined_list(request: object) -> Response:
     return Response(object_serializer.data)
 
 
+@conditional_response(tables=(LatestStatisticsByRegion, Region, RegionDeathsSince))
 @api_view(['GET'])
+@cached_response(tables=(LatestStatisticsByRegion, Region, RegionDeathsSince))
 def statistics_by_region_total_list(request: object) -> Response:
     '''Executes a query to the StatisticsByRegion model, with a specific
         query to return the needed data structured to be used by the front-end.
@@ -754,12 +1152,6 @@ def statistics_by_region_total_list(request: object) -> Response:
     '''
 
     query = '''
-        WITH ranked_statistics_by_region AS (
-            SELECT
-                sbr.*,
-                (ROW_NUMBER() OVER (PARTITION BY sbr.region_id ORDER BY sbr.reference_date DESC)) AS rn
-            FROM statistics_by_region AS sbr
-        )
         SELECT
             1					AS id,
             r.name				AS region_name,
@@ -767,21 +1159,13 @@ def statistics_by_region_total_list(request: object) -> Response:
             s.confirmed			AS cases,
             s.recovered			AS recovered,
             s.deaths			AS total_covid_deaths,
-            gtd.total_deaths	AS total_deaths,
-            s.inserted_date		AS inserted_date,
-            s.updated_date		AS updated_date
-        FROM ranked_statistics_by_region AS s
+            gtd.deaths			AS total_deaths,
+            s.source_inserted_date	AS inserted_date,
+            s.source_updated_date	AS updated_date
+        FROM latest_statistics_by_region AS s
         JOIN region AS r ON s.region_id = r.id
-        JOIN (
-            SELECT
-                c.region_id,
-                SUM(td.deaths) AS total_deaths
-            FROM (SELECT * FROM total_deaths WHERE date_start >= (SELECT MIN(reference_date) FROM statistics_by_region)) AS td
-            JOIN county AS c ON td.county_id = c.id
-            GROUP BY c.region_id
-            ) AS gtd ON s.region_id = gtd.region_id
-        WHERE rn = 1
-            AND r.name != 'Foreign'
+        JOIN region_deaths_since AS gtd ON s.region_id = gtd.region_id
+        WHERE r.name != 'Foreign'
         ORDER BY region_name;
     '''
 
@@ -796,7 +1180,9 @@ def statistics_by_region_total_list(request: object) -> Response:
     return Response(object_serializer.data)
 
 
+@conditional_response(tables=(StatisticsBySexCombined,))
 @api_view(['GET'])
+@cached_response(tables=(StatisticsBySexCombined,))
 def statistics_by_sex_combined_list(request: object) -> Response:
     '''Executes a query to the StatisticsBySex model, with a specific
         query to return the needed data structured to be used by the front-end.
@@ -811,21 +1197,19 @@ def statistics_by_sex_combined_list(request: object) -> Response:
     query = '''
         SELECT
             1                   AS id,
-            m.reference_date    AS reference_date,
-            m.confirmed         AS male_confirmed,
-            m.deaths            AS male_deaths,
-            f.confirmed         AS female_confirmed,
-            f.deaths            AS female_deaths,
-            m.confirmed_unknown AS confirmed_unknown,
-            m.inserted_date     AS inserted_date,
-            m.updated_date      AS updated_date
-        FROM statistics_by_sex AS m
-        JOIN statistics_by_sex AS f
-            ON m.reference_date = f.reference_date and m.sex = 'm' and f.sex = 'f'
-        ORDER BY m.reference_date;
+            reference_date          AS reference_date,
+            male_confirmed          AS male_confirmed,
+            male_deaths             AS male_deaths,
+            female_confirmed        AS female_confirmed,
+            female_deaths           AS female_deaths,
+            male_confirmed_unknown  AS confirmed_unknown,
+            inserted_date           AS inserted_date,
+            updated_date            AS updated_date
+        FROM statistics_by_sex_combined
+        ORDER BY reference_date;
     '''
 
-    data = StatisticsBySex.objects.raw(raw_query=query)
+    data = StatisticsBySexCombined.objects.raw(raw_query=query)
 
     object_serializer = StatisticsBySexCombinedSerializer(
         data,
@@ -834,3 +1218,25 @@ def statistics_by_sex_combined_list(request: object) -> Response:
     )
 
     return Response(object_serializer.data)
+
+
+# Monitoring endpoints
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def database_pool_stats(request: object) -> Response:
+    '''Returns the statistics of the database connection pools of the process
+        that handled the request. Each process has its own pools, so the
+        statistics change with the process that answers.
+
+    Args:
+        request (object): the request from django admin.
+
+    Returns:
+        Response: the Response containing the statistics of each database.
+    '''
+
+    return Response({
+        'pid': os.getpid(),
+        'pools': get_pools_stats(),
+    })
@@ -174,6 +174,7 @@ JAZZMIN_UI_TWEAKS = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'covid_site.routers.PrimaryReadsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -217,15 +218,67 @@ SECRET_KEY = env("SECRET_KEY", default="unsafe-secret-key")
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # The MySQL backend of Django, with health checks and pooling
+        'ENGINE': 'covid_site.backends.mysql',
         'NAME': env("DATABASE_NAME"),
         'USER': env("DATABASE_USER"),
         'PASSWORD': env("MYSQL_UALDBUSER_PASSWORD"),
         'HOST': env("DATABASE_HOST"),
         'PORT': env("DATABASE_PORT"),
+        # Needed by the LOAD DATA LOCAL INFILE of the full reloads
+        'OPTIONS': {'local_infile': 1},
+        # The seconds a connection is reused for, instead of opening one per
+        # request, which must stay below the wait_timeout of the server. With
+        # the pool, 0 keeps the connections open until they break
+        'CONN_MAX_AGE': env.int('DATABASE_CONN_MAX_AGE', default=300),
+        # Whether a reused connection is checked before its first query of
+        # each request, being replaced if the server closed it
+        'CONN_HEALTH_CHECKS': env.bool('DATABASE_CONN_HEALTH_CHECKS', default=True),
+        # The connections shared by the threads of each process, e.g. of the
+        # development server, which runs each request on a new thread. The
+        # size is per process, so the connections of the server must allow
+        # for (SIZE + MAX_OVERFLOW) times the processes. A size of 0 disables
+        # the pool, leaving a persistent connection per thread
+        'POOL': {
+            'SIZE': env.int('DATABASE_POOL_SIZE', default=0),
+            'MAX_OVERFLOW': env.int('DATABASE_POOL_MAX_OVERFLOW', default=10),
+            'TIMEOUT': env.float('DATABASE_POOL_TIMEOUT', default=30),
+        },
     },
 }
 
+# The read replicas of the database, as a list of "host" or "host:port", which
+# serve the reads of the API while the primary serves the writes of the
+# imports. They use the credentials and settings of the primary
+DATABASE_REPLICA_HOSTS = env.list('DATABASE_REPLICA_HOSTS', default=[])
+
+# The seconds to wait for the connection to a replica, so that the checks of
+# an unreachable replica fall back to the primary quickly
+DATABASE_REPLICA_CONNECT_TIMEOUT = env.int('DATABASE_REPLICA_CONNECT_TIMEOUT', default=2)
+
+for i, replica_host in enumerate(DATABASE_REPLICA_HOSTS):
+    host, _, port = replica_host.partition(':')
+    DATABASES[f'replica_{i}'] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=port or DATABASES['default']['PORT'],
+        OPTIONS=dict(DATABASES['default']['OPTIONS'], connect_timeout=DATABASE_REPLICA_CONNECT_TIMEOUT),
+        # The tests read the test database of the primary
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['covid_site.routers.ReplicaRouter']
+
+# The seconds a replica can be behind the primary before its reads fall back
+# to the primary, and the seconds each process keeps the state of a replica
+# before checking it again
+DATABASE_REPLICA_MAX_LAG = env.int('DATABASE_REPLICA_MAX_LAG', default=30)
+DATABASE_REPLICA_CHECK_INTERVAL = env.float('DATABASE_REPLICA_CHECK_INTERVAL', default=5)
+
+# The seconds the reads of a client go to the primary after its last write
+DATABASE_PRIMARY_PIN_SECONDS = env.int('DATABASE_PRIMARY_PIN_SECONDS', default=60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -269,3 +322,75 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ORIGIN_ALLOW_ALL = True
+
+# CSV import
+# The amount of rows read and committed at a time by the ETL processes
+ETL_CHUNK_SIZE = env.int('ETL_CHUNK_SIZE', default=5000)
+
+# Where the uploaded files are kept until their import jobs succeed
+ETL_UPLOAD_DIR = BASE_DIR / 'uploads'
+
+# The amount of processes of the import worker and the seconds they wait
+# between checks for new jobs
+ETL_WORKER_PROCESSES = env.int('ETL_WORKER_PROCESSES', default=2)
+ETL_WORKER_POLL_INTERVAL = env.float('ETL_WORKER_POLL_INTERVAL', default=5)
+
+# The seconds after which a running import job can be requeued, since its
+# worker is assumed to have died
+ETL_JOB_TIMEOUT = env.int('ETL_JOB_TIMEOUT', default=6 * 60 * 60)
+
+# The amount of months or years, by table, whose partitions are created ahead
+# of the current date by the imports and the manage_partitions command
+PARTITIONS_AHEAD = env.int('PARTITIONS_AHEAD', default=2)
+
+
+# API response cache
+# The backend of the cache of the front-end endpoints: "locmem", "file" (with
+# the directory as location) or "redis" (with the URL as location)
+API_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': API_CACHE_BACKENDS[env('API_CACHE_BACKEND', default='locmem')],
+        'LOCATION': env('API_CACHE_LOCATION', default='api'),
+        # The versions of the tables already invalidate the responses, this
+        # only bounds the ones that depend on the current date
+        'TIMEOUT': env.int('API_CACHE_TIMEOUT', default=60 * 60 * 24),
+    },
+}
+
+# The seconds each process keeps the versions of the tables before reading
+# them again, i.e. how long an import takes to show up on the endpoints
+API_CACHE_VERSION_TTL = env.int('API_CACHE_VERSION_TTL', default=5)
+
+# Raw API endpoints
+# The amount of rows of each page, when the "cursor" query parameter is used
+# without "limit", and the maximum amount of rows of a page
+API_PAGE_SIZE = env.int('API_PAGE_SIZE', default=1000)
+API_MAX_PAGE_SIZE = env.int('API_MAX_PAGE_SIZE', default=10000)
+
+# The amount of rows read from the database at a time by the streamed formats
+API_STREAM_CHUNK_SIZE = env.int('API_STREAM_CHUNK_SIZE', default=2000)
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'covid_site.renderers.NDJSONRenderer',
+        'covid_site.renderers.JSONStreamRenderer',
+        'covid_site.renderers.ArrowStreamRenderer',
+        'covid_site.renderers.ParquetRenderer',
+    ),
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'covid_site.renderers.ContentNegotiation',
+}
+
+# Whether the raw API endpoints read the rows with values_list and represent
+# them with the compiled version of their serializers, instead of DRF's
+API_FAST_SERIALIZERS = env.bool('API_FAST_SERIALIZERS', default=True)
@@ -43,6 +43,9 @@ api_urls = {
     'statistics_by_age_and_sex_combined': views.statistics_by_age_and_sex_combined_list,
     'statistics_by_region_total': views.statistics_by_region_total_list,
     'statistics_by_sex_combined': views.statistics_by_sex_combined_list,
+
+    # Monitoring endpoints, only for the staff users
+    'database_pool_stats': views.database_pool_stats,
 }
 
 urlpatterns = [